@@ -0,0 +1,291 @@
+import argparse
+import datetime
+import json
+import logging
+import platform
+import sys
+import timeit
+
+from openpyxl import Workbook
+
+from benchmarks.stub_connector import StubConnector
+from validator.formula import Formula
+from validator.main_validator import PGSMetadataValidator, populate_object
+from validator.parsers import parse_demographic, parse_metric
+from validator.sample import Sample, SampleValidator
+from validator.score import Score, ScoreValidator
+from validator.spreadsheet import RowSource, get_column_name_index
+
+# A benchmark is slower (or faster) than the previous run above this relative difference
+DEFAULT_THRESHOLD = 0.10
+
+
+#==================#
+#  Input fixtures  #
+#==================#
+
+def make_validator():
+    """ Validator with its template schema loaded, without workbook. """
+    validator = PGSMetadataValidator(None, False, connector=StubConnector())
+    validator.parse_template_schema()
+    return validator
+
+
+def make_row_source(rows, title='Sheet'):
+    """ In-memory spreadsheet (RowSource) containing the given rows. """
+    workbook = Workbook()
+    worksheet = workbook.active
+    worksheet.title = title
+    for row in rows:
+        worksheet.append(row)
+    return RowSource(worksheet)
+
+
+def long_metric_list(count):
+    return ';'.join(f'Metric {i} = 0.{i % 90 + 10} [0.05 - 0.95]' for i in range(count))
+
+
+def nested_sum_rows(depth):
+    """ Rows where each cell of the column A sums the 2 cells of the row above (i.e. formulas nested 'depth' times). """
+    rows = [[1, 1]]
+    for row_id in range(2, depth + 1):
+        rows.append([f'=SUM(A{row_id - 1}:B{row_id - 1})', 1])
+    return rows
+
+
+#==============#
+#  Benchmarks  #
+#==============#
+# Each benchmark prepares its inputs and returns the function to time (called without parameter)
+
+def bench_str2metric(value, field, repeated=False):
+    """ Parsing of a metric value, memoized across the calls only for the repeated values (see validator.parsers). """
+    def setup():
+        validator = make_validator()
+        spreadsheet = make_row_source([])
+        def run():
+            if not repeated:
+                parse_metric.cache_clear()
+            # Same loop as the parsing of the Performance Metrics spreadsheet
+            for x in str(value).split(';'):
+                validator.str2metric(x, 3, 'Performance Metrics', spreadsheet, field)
+        return run
+    return setup
+
+
+def bench_str2demographic(value, field='sample_age', repeated=False):
+    """ Parsing of a sample age or follow-up value, memoized across the calls only for the repeated values (see validator.parsers). """
+    def setup():
+        validator = make_validator()
+        spreadsheet = make_row_source([])
+        def run():
+            if not repeated:
+                parse_demographic.cache_clear()
+            validator.str2demographic(value, 3, 'Sample Descriptions', spreadsheet, field, 'Age of Study Participants\n(if known)')
+        return run
+    return setup
+
+
+def bench_check_and_remove_whitespaces(value):
+    def setup():
+        validator = make_validator()
+        def run():
+            validator.check_and_remove_whitespaces('Score(s)', 3, 'Reported Trait \n(phenotype that the polygenic score predicts)', value)
+        return run
+    return setup
+
+
+def bench_check_format(object_class, validator_class, sheet_name, data):
+    def setup():
+        validator = make_validator()
+        fields_infos = validator.fields_infos[sheet_name]
+        mandatory_fields = validator.mandatory_fields[sheet_name]
+        plan = validator.schema.check_plans[sheet_name]
+        checked_object = object_class()
+        for field, value in data.items():
+            setattr(checked_object, field, value)
+        def run():
+            validator_class(checked_object, fields_infos, mandatory_fields, plan=plan).check_format()
+        return run
+    return setup
+
+
+def bench_populate_object(object_class, sheet_name, data, rows=()):
+    def setup():
+        validator = make_validator()
+        fields_infos = validator.fields_infos[sheet_name]
+        spreadsheet = make_row_source(rows)
+        def run():
+            populate_object(spreadsheet, object_class(), data, fields_infos)
+        return run
+    return setup
+
+
+def bench_formula(formula, rows=()):
+    def setup():
+        spreadsheet = make_row_source(rows)
+        # Build the cell index of the spreadsheet outside of the timed function
+        spreadsheet.get_cell_value('A1')
+        def run():
+            # New formula evaluator at each call: its cached results would be returned otherwise
+            spreadsheet.formula_evaluator = None
+            Formula(spreadsheet, formula).formula2number()
+        return run
+    return setup
+
+
+def bench_get_column_name_index(rows, row_index=1):
+    def setup():
+        spreadsheet = make_row_source(rows)
+        def run():
+            get_column_name_index(spreadsheet, row_index)
+        return run
+    return setup
+
+
+SCORE_DATA = {
+    'name': 'PGS_1', 'trait_reported': 'Coronary artery disease', 'trait_efo': 'EFO_0001645', 'method_name': 'LDpred',
+    'method_params': 'p < 5e-8; r2 < 0.2', 'variants_genomebuild': 'GRCh37', 'variants_number': 6630150
+}
+SAMPLE_DATA = {
+    'sample_number': 10500, 'sample_cases': 500, 'sample_controls': 10000, 'sample_percent_male': 47.5,
+    'ancestry_broad': 'European', 'ancestry_country': 'United Kingdom', 'cohorts': ['UKB']
+}
+SAMPLE_HEADER = [
+    'Associated Score Name(s)', 'Study Stage', 'Sample Set ID', 'Source GWAS Catalog', 'PMID or DOI', 'Number \nof Individuals',
+    'Number of Cases\n(if applicable)', 'Number of Controls\n(if applicable)', 'Percent of participants who are Male\n(if known)'
+]
+
+BENCHMARKS = {
+    'str2metric/estimate_se': bench_str2metric('0.65 (0.02)', 'metric_class_AUROC'),
+    'str2metric/estimate_ci': bench_str2metric('1.23 [1.10 - 1.40]', 'metric_beta_OR'),
+    'str2metric/other_metrics_10': bench_str2metric(long_metric_list(10), 'metric_other_other'),
+    'str2metric/other_metrics_200': bench_str2metric(long_metric_list(200), 'metric_other_other'),
+    'str2metric/repeated_estimate_ci': bench_str2metric('1.23 [1.10 - 1.40]', 'metric_beta_OR', repeated=True),
+    'str2demographic/median_iqr': bench_str2demographic('median=55.2 years;IQR=[40 - 65]'),
+    'str2demographic/float': bench_str2demographic(55.2),
+    'str2demographic/items_100': bench_str2demographic(';'.join(f'mean={i}.5 years' for i in range(100))),
+    'str2demographic/repeated_median_iqr': bench_str2demographic('median=55.2 years;IQR=[40 - 65]', repeated=True),
+    'check_and_remove_whitespaces/clean': bench_check_and_remove_whitespaces('Coronary artery disease'),
+    'check_and_remove_whitespaces/whitespaces': bench_check_and_remove_whitespaces(' Coronary artery disease\t'),
+    'check_and_remove_whitespaces/number': bench_check_and_remove_whitespaces(6630150),
+    'check_and_remove_whitespaces/long_text': bench_check_and_remove_whitespaces('x' * 10000 + ' '),
+    'check_format/score': bench_check_format(Score, ScoreValidator, 'Score(s)', SCORE_DATA),
+    'check_format/score_errors': bench_check_format(Score, ScoreValidator, 'Score(s)', dict(SCORE_DATA, variants_number='1x0', trait_reported='CAD ')),
+    'check_format/sample': bench_check_format(Sample, SampleValidator, 'Sample Descriptions', SAMPLE_DATA),
+    'populate_object/score': bench_populate_object(Score, 'Score(s)', SCORE_DATA),
+    'populate_object/sample_formula': bench_populate_object(Sample, 'Sample Descriptions', dict(SAMPLE_DATA, sample_number='=B1+C1'), rows=[[None, 500, 10000]]),
+    'formula2number/numeric': bench_formula('=' + '+'.join(str(i) for i in range(1, 51))),
+    'formula2number/cells': bench_formula('=A1+B1+C1', rows=[[1, 2, 3]]),
+    'formula2number/sum_range': bench_formula('=SUM(A1:C20)', rows=[[1, 2, 3]] * 20),
+    'formula2number/nested_sum_30': bench_formula('=SUM(A30:B30)', rows=nested_sum_rows(30)),
+    'formula2number/nested_sum_2000': bench_formula('=SUM(A2000:B2000)', rows=nested_sum_rows(2000)),
+    'formula2number/multi_letter_columns': bench_formula('=SUM(Z1:AC3)+AD1', rows=[[1] * 30] * 3),
+    'formula2number/circular_reference': bench_formula('=SUM(A1:B1)', rows=[['=B1', '=A1']]),
+    'get_column_name_index/sample_header': bench_get_column_name_index([SAMPLE_HEADER]),
+    'get_column_name_index/two_rows_header': bench_get_column_name_index([['Score(s) information'], SAMPLE_HEADER], row_index=2),
+    'get_column_name_index/wide_500': bench_get_column_name_index([[ f'Column {i}' for i in range(500) ]])
+}
+
+
+#==========#
+#  Runner  #
+#==========#
+
+def time_benchmark(setup, repeat=5, min_time=0.2):
+    """
+    Time a benchmark: the number of calls per measure is calibrated to last at least 'min_time' seconds.
+    > Return: best time per call (in seconds) and number of calls per measure
+    """
+    function = setup()
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    number = max(number, int(number * min_time / 0.2))
+    times = timer.repeat(repeat=repeat, number=number)
+    return min(times) / number, number
+
+
+def run_micro_benchmarks(names=None, repeat=5, min_time=0.2, progress=None):
+    """ Run the micro-benchmarks (all of them, or the given names). Return the results, as a dictionary. """
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if names and not any(name.startswith(prefix) for prefix in names):
+            continue
+        time_per_call, number = time_benchmark(setup, repeat=repeat, min_time=min_time)
+        results[name] = {'time': time_per_call, 'number': number}
+        if progress:
+            progress(name, results[name])
+    return {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'repeat': repeat,
+        'results': results
+    }
+
+
+def compare_results(previous, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare the results of 2 runs.
+    > Return: list of (benchmark name, previous time, current time, relative change, status), status being 'regression', 'improvement' or ''
+    """
+    comparison = []
+    for name, result in current['results'].items():
+        if name not in previous['results']:
+            continue
+        previous_time = previous['results'][name]['time']
+        change = (result['time'] - previous_time) / previous_time
+        status = ''
+        if change > threshold:
+            status = 'regression'
+        elif change < -threshold:
+            status = 'improvement'
+        comparison.append((name, previous_time, result['time'], change, status))
+    return comparison
+
+
+def print_result(name, result):
+    print(f'{name:<50} {result["time"] * 1e6:>12.2f} µs')
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='Micro-benchmarks of the functions called for each row or cell of the spreadsheets')
+    argparser.add_argument("names", help='Benchmarks to run (name prefixes, e.g. str2metric), default: all', nargs='*')
+    argparser.add_argument("--repeat", help='Number of measures of each benchmark (the best one is kept)', type=int, default=5)
+    argparser.add_argument("--min-time", help='Minimum duration of each measure (in seconds)', type=float, default=0.2)
+    argparser.add_argument("--output", help='Path of the JSON report', metavar='REPORT_FILE')
+    argparser.add_argument("--compare", help='JSON report of a previous run, to compare with', metavar='PREVIOUS_REPORT_FILE')
+    argparser.add_argument("--threshold", help=f'Relative change reported as regression/improvement (default: {DEFAULT_THRESHOLD})', type=float, default=DEFAULT_THRESHOLD)
+    argparser.add_argument("--list", help='List the benchmarks', default=False, action='store_true')
+
+    args = argparser.parse_args()
+
+    # The invalid inputs (e.g. circular references) are logged at each call
+    logging.basicConfig(level=logging.ERROR)
+
+    if args.list:
+        for name in BENCHMARKS:
+            print(name)
+        return
+
+    report = run_micro_benchmarks(args.names, repeat=args.repeat, min_time=args.min_time, progress=print_result)
+
+    if args.output:
+        with open(args.output, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+        print(f'\nReport written in {args.output}')
+
+    if args.compare:
+        with open(args.compare) as previous_file:
+            previous = json.load(previous_file)
+        comparison = compare_results(previous, report, threshold=args.threshold)
+        print(f'\n#### Comparison with {args.compare} ({previous["date"]}) ####')
+        for name, previous_time, current_time, change, status in comparison:
+            print(f'{name:<50} {previous_time * 1e6:>12.2f} µs -> {current_time * 1e6:>12.2f} µs {change:>+8.1%} {status}')
+        regressions = [ name for name, _, _, _, status in comparison if status == 'regression' ]
+        if regressions:
+            print(f'\n{len(regressions)} regression(s): {", ".join(regressions)}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.stub_connector import StubConnector
+from benchmarks.workbook_generator import WorkbookGenerator
+from validator.main_validator import PGSMetadataValidator
+from validator.storage import LocalStorage
+
+# Sizes of the generated workbooks
+PRESETS = {
+    'small': {'scores': 10, 'performances': 20, 'samples': 5, 'cohorts': 5, 'formulas': 2},
+    'medium': {'scores': 100, 'performances': 1000, 'samples': 50, 'cohorts': 20, 'formulas': 20},
+    'large': {'scores': 500, 'performances': 10000, 'samples': 200, 'cohorts': 50, 'formulas': 100},
+    'xlarge': {'scores': 2000, 'performances': 50000, 'samples': 1000, 'cohorts': 100, 'formulas': 500}
+}
+
+
+def validate(filepath, connector, streaming=True, uploaded=True):
+    """
+    Run a full validation of the file. Return the validator and its duration (in seconds).
+    The uploaded files are downloaded from their directory, standing in for the Google Cloud Storage (same code path as the REST API).
+    """
+    start_time = time.perf_counter()
+    if uploaded:
+        storage = LocalStorage(os.path.dirname(os.path.abspath(filepath)))
+        metadata_validator = PGSMetadataValidator(os.path.basename(filepath), True, connector=connector, streaming=streaming, storage=storage)
+    else:
+        metadata_validator = PGSMetadataValidator(filepath, False, connector=connector, streaming=streaming)
+    metadata_validator.validate()
+    return metadata_validator, time.perf_counter() - start_time
+
+
+def benchmark_workbook(filepath, repeat=3, latency=0, streaming=True, uploaded=True):
+    """
+    Benchmark the validation of a workbook: duration of each run and per phase (fastest run), and peak memory allocated by Python.
+    The peak memory is measured in an extra run, as tracemalloc slows down the validation.
+    """
+    runs = []
+    for _ in range(repeat):
+        runs.append(validate(filepath, StubConnector(latency), streaming, uploaded))
+    durations = [ duration for _, duration in runs ]
+    fastest_validator = min(runs, key=lambda run: run[1])[0]
+
+    tracemalloc.start()
+    try:
+        validate(filepath, StubConnector(latency), streaming, uploaded)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    report = fastest_validator.report
+    return {
+        'wall_time': {'min': min(durations), 'median': statistics.median(durations), 'max': max(durations)},
+        'phase_timings': fastest_validator.phase_timings,
+        'peak_memory': peak_memory,
+        'errors': sum(len(messages) for messages in report['error'].values()),
+        'warnings': sum(len(messages) for messages in report['warning'].values())
+    }
+
+
+def run_benchmarks(sizes, repeat=3, broken=False, latency=0, streaming=True, uploaded=True, workbook_dir=None, progress=None):
+    """
+    Generate a workbook for each size and benchmark its validation.
+    The formulas of the presets are only generated for the uploaded workbooks: openpyxl doesn't write the values of the formulas,
+    and the local files are read with the cached values of their formulas (a valid workbook would be reported with errors).
+    > Return: benchmark report (dictionary)
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            params = PRESETS[size]
+            if not uploaded:
+                params = dict(params, formulas=0)
+            filepath = os.path.join(workbook_dir or tmp_dir, f'benchmark_{size}{"_broken" if broken else ""}.xlsx')
+            WorkbookGenerator(broken=broken, **params).write(filepath)
+            result = {'size': size, 'workbook': params, 'file_size': os.path.getsize(filepath)}
+            result.update(benchmark_workbook(filepath, repeat=repeat, latency=latency, streaming=streaming, uploaded=uploaded))
+            results.append(result)
+            if progress:
+                progress(result)
+    return {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'settings': {'repeat': repeat, 'broken': broken, 'latency': latency, 'streaming': streaming, 'uploaded': uploaded},
+        'results': results
+    }
+
+
+def print_result(result):
+    phases = ', '.join(f'{phase} {duration:.3f}s' for phase, duration in result['phase_timings'].items())
+    print(f'# {result["size"]} ({result["workbook"]["scores"]} scores, {result["workbook"]["performances"]} performances, {result["file_size"] / 1024:.0f} KB)')
+    print(f'- Wall time: {result["wall_time"]["min"]:.3f}s (median {result["wall_time"]["median"]:.3f}s)')
+    print(f'- Phases: {phases}')
+    print(f'- Peak memory: {result["peak_memory"] / 1024 / 1024:.1f} MB')
+    print(f'- Reported: {result["errors"]} error(s), {result["warnings"]} warning(s)')
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='End-to-end benchmarks of the validator, on generated workbooks')
+    argparser.add_argument("--sizes", help='Sizes of the generated workbooks', nargs='+', choices=PRESETS.keys(), default=['small', 'medium', 'large'])
+    argparser.add_argument("--repeat", help='Number of validations of each workbook', type=int, default=3)
+    argparser.add_argument("--broken", help='Inject errors in the generated workbooks', default=False, action=argparse.BooleanOptionalAction)
+    argparser.add_argument("--latency", help='Simulated duration of each external lookup (in seconds)', type=float, default=0)
+    argparser.add_argument("--streaming", help='Stream the rows of the workbooks (read-only mode)', default=True, action=argparse.BooleanOptionalAction)
+    argparser.add_argument("--uploaded", help='Read the workbooks like uploaded files (REST API code path, formulas evaluated by the validator)', default=True, action=argparse.BooleanOptionalAction)
+    argparser.add_argument("--workbook-dir", help='Directory where the generated workbooks are kept (default: temporary directory)', metavar='DIR')
+    argparser.add_argument("--output", help='Path of the JSON report', metavar='REPORT_FILE')
+
+    args = argparser.parse_args()
+
+    report = run_benchmarks(args.sizes, repeat=args.repeat, broken=args.broken, latency=args.latency, streaming=args.streaming,
+                            uploaded=args.uploaded, workbook_dir=args.workbook_dir, progress=print_result)
+
+    if args.output:
+        with open(args.output, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+        print(f'\nReport written in {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+import time
+
+from validator.request.connector import Connector, NotFound
+
+from benchmarks.workbook_generator import DOI, EFO_IDS, GCST_IDS, PMID
+
+
+class StubConnector(Connector):
+    """Connector answering the lookups of the generated workbooks from canned responses, without any network access.
+    - latency: simulated duration of each lookup (in seconds), to include the cost of the external services in the benchmarks"""
+
+    def __init__(self, latency=0):
+        super().__init__()
+        self.latency = latency
+        self.lookups = 0
+
+    def wait(self):
+        self.lookups += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def request(self, url, params=None) -> dict:
+        raise NotFound(message="The stub connector can't send HTTP requests (%s)" % url, url=url)
+
+    def get_publication(self, doi=None, pmid=None) -> dict:
+        self.wait()
+        if doi == DOI or str(pmid) == str(PMID):
+            return {'doi': DOI, 'pmid': str(PMID), 'pubType': 'journal article', 'journalTitle': 'Nature Genetics',
+                    'authorString': 'Doe J, Smith A', 'title': 'A benchmark publication', 'firstPublicationDate': '2021-06-01'}
+        raise NotFound(message="No result found for DOI:{} or PMID:{}".format(doi, pmid), service='europepmc')
+
+    def get_efo_trait(self, efo_id) -> dict:
+        self.wait()
+        if efo_id in EFO_IDS:
+            return {'label': f'trait {efo_id}', 'short_form': efo_id}
+        raise NotFound(message="No result found for the trait %s" % efo_id, service='ols_efo')
+
+    def get_gwas(self, gcst_id) -> dict:
+        self.wait()
+        if gcst_id in GCST_IDS:
+            return {
+                'publicationInfo': {'pubmedId': str(PMID)},
+                'ancestries': [{
+                    'type': 'initial', 'numberOfIndividuals': 120000,
+                    'ancestralGroups': [{'ancestralGroup': 'European'}],
+                    'countryOfOrigin': [{'countryName': 'NR'}],
+                    'countryOfRecruitment': [{'countryName': 'United Kingdom'}]
+                }]
+            }
+        raise NotFound(message="No result found for the GWAS Study %s" % gcst_id, service='gwas')
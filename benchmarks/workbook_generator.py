@@ -0,0 +1,215 @@
+import argparse
+import random
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.utils import get_column_letter
+
+from validator.schema import template_columns_schema_file
+
+# Identifiers known by the StubConnector (see stub_connector.py)
+EFO_IDS = ['EFO_0001645', 'EFO_0000305', 'EFO_0001360', 'MONDO_0005148', 'HP_0003124']
+UNKNOWN_EFO_ID = 'EFO_9999999'
+GCST_IDS = ['GCST000998', 'GCST004787', 'GCST90132222']
+DOI = '10.1000/pgs.benchmark'
+PMID = 31234567
+
+# Title row above the column headers (the headers of these spreadsheets are on the 2nd row)
+TITLE_ROWS = {
+    'Score(s)': 'Score(s) information',
+    'Performance Metrics': 'Performance Metrics information'
+}
+
+ANCESTRIES = ['European', 'African', 'East Asian', 'South Asian', 'Hispanic or Latin American']
+METHODS = ['LDpred', 'PRS-CS', 'P+T', 'lassosum']
+
+
+def template_columns(schema_file=template_columns_schema_file):
+    """
+    Read the column layout of the template from the template2model schema (Curation sheet).
+    > Return: dictionary {spreadsheet name: list of (column label, field name)}, in the order of the template
+    """
+    workbook = load_workbook(schema_file, read_only=True)
+    rows = workbook['Curation'].iter_rows(values_only=True)
+    header = next(rows)
+    schema_columns = { col_name: idx for idx, col_name in enumerate(header) if col_name }
+    columns = {}
+    for row in rows:
+        sheet_name = row[schema_columns['Sheet']]
+        if sheet_name:
+            columns.setdefault(sheet_name, []).append((row[schema_columns['Column']], row[schema_columns['Field']]))
+    workbook.close()
+    # The DOI is the first column of the Publication spreadsheet, followed by the PubMed ID (read by position)
+    columns['Publication Information'].sort(key=lambda column: 0 if column[1] == 'doi' else 1)
+    return columns
+
+
+class WorkbookGenerator():
+    """
+    Generate synthetic PGS metadata workbooks following the layout of the template.
+    - scores: number of rows of the Score(s) spreadsheet
+    - performances: number of rows of the Performance Metrics spreadsheet
+    - samples: number of Testing sample sets (Sample Descriptions spreadsheet)
+    - cohorts: number of rows of the Cohort Refr. spreadsheet
+    - formulas: number of Testing samples with a formula as number of individuals (e.g. "=G5+H5").
+      The formulas are written without their value (not supported by openpyxl): they are only evaluated by the validator for the uploaded files,
+      the other files are read with the cached values of the formulas, so these cells are empty.
+    - broken: if True, errors are injected in about 1 row out of 'error_rate' of each spreadsheet
+    """
+
+    def __init__(self, scores=10, performances=20, samples=5, cohorts=5, formulas=0, broken=False, error_rate=10, seed=0, schema_file=template_columns_schema_file):
+        self.scores = scores
+        self.performances = performances
+        self.samples = samples
+        self.cohorts = cohorts
+        self.formulas = formulas
+        self.broken = broken
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.columns = template_columns(schema_file)
+
+
+    def is_broken(self, index):
+        """ Whether an error must be injected in the row of the given index. """
+        return self.broken and index % self.error_rate == self.error_rate - 1
+
+
+    def write(self, path):
+        """ Write the workbook in the given file. """
+        workbook = Workbook()
+        workbook.remove(workbook.active)
+        self.add_sheet(workbook, 'Publication Information', [self.publication_row()])
+        self.add_sheet(workbook, 'Score(s)', (self.score_row(i) for i in range(self.scores)))
+        self.add_sheet(workbook, 'Sample Descriptions', self.sample_rows())
+        self.add_sheet(workbook, 'Performance Metrics', (self.performance_row(i) for i in range(self.performances)))
+        self.add_sheet(workbook, 'Cohort Refr.', (self.cohort_row(i) for i in range(self.cohorts)))
+        workbook.save(path)
+        return path
+
+
+    def add_sheet(self, workbook, sheet_name, rows):
+        """ Write a spreadsheet: column headers and data rows (dictionaries indexed by field name, or by column label for the columns without field). """
+        worksheet = workbook.create_sheet(sheet_name)
+        columns = self.columns[sheet_name]
+        if sheet_name in TITLE_ROWS:
+            worksheet.append([TITLE_ROWS[sheet_name]])
+        worksheet.append([ column_label for column_label, _ in columns ])
+        for row in rows:
+            worksheet.append([ row.get(field or column_label) for column_label, field in columns ])
+
+
+    def column_letter(self, sheet_name, field):
+        """ Letter of the column of a field (e.g. 'G'), used to write formulas. """
+        fields = [ field_name for _, field_name in self.columns[sheet_name] ]
+        return get_column_letter(fields.index(field) + 1)
+
+
+    def publication_row(self):
+        if self.broken:
+            return {'doi': 'https://doi.org/' + DOI, 'PMID': 'PMID31234567', 'journal': None, 'firstauthor': 'Doe '}
+        return {'doi': DOI, 'PMID': PMID, 'journal': 'Nature Genetics', 'date_publication': '01-06-2021', 'firstauthor': 'Doe'}
+
+
+    def score_row(self, index):
+        row = {
+            'name': f'PGS_{index}',
+            'trait_reported': 'Coronary artery disease',
+            'trait_efo': ','.join(self.random.sample(EFO_IDS, self.random.randint(1, 2))),
+            'method_name': self.random.choice(METHODS),
+            'method_params': 'p < 5e-8; r2 < 0.2',
+            'variants_genomebuild': self.random.choice(['GRCh37', 'GRCh38']),
+            'variants_number': self.random.randint(10, 6000000)
+        }
+        if self.is_broken(index):
+            error = index // self.error_rate % 4
+            if error == 0:
+                row['variants_genomebuild'] = 'hg99'
+            elif error == 1:
+                row['variants_number'] = '1x0'
+            elif error == 2:
+                row['trait_efo'] = UNKNOWN_EFO_ID
+            else:
+                row['trait_reported'] += ' '
+        return row
+
+
+    def sample_rows(self):
+        """ Rows of the Sample Descriptions spreadsheet: a GWAS sample, a score development sample and the Testing sample sets. """
+        score_names = ','.join(f'PGS_{i}' for i in range(self.scores))
+        cohort_ids = [ f'COHORT{i}' for i in range(self.cohorts) ] or ['COHORT0']
+        yield {'__score_name': score_names, '__study_stage': 'Variant associations', 'source_GWAS_catalog': self.random.choice(GCST_IDS)}
+        yield {
+            '__score_name': score_names, '__study_stage': 'Score development', 'sample_number': 50000, 'sample_cases': 5000, 'sample_controls': 45000,
+            'sample_percent_male': 47.5, 'sample_age': 'median=55.2 years;IQR=[40 - 65]', 'ancestry_broad': 'European', 'cohorts': cohort_ids[0]
+        }
+        # First row of the Testing samples (after the header and the 2 rows above)
+        first_row = 4
+        cases_column = self.column_letter('Sample Descriptions', 'sample_cases')
+        controls_column = self.column_letter('Sample Descriptions', 'sample_controls')
+        for index in range(self.samples):
+            cases = self.random.randint(100, 5000)
+            controls = self.random.randint(1000, 50000)
+            row = {
+                '__study_stage': 'Testing', '__sampleset': f'SS_{index}', 'sample_number': cases + controls, 'sample_cases': cases, 'sample_controls': controls,
+                'sample_percent_male': round(self.random.uniform(30, 70), 1), 'sample_age': f'mean={self.random.randint(40, 70)}.1 years;sd=10.2 years',
+                'ancestry_broad': self.random.choice(ANCESTRIES), 'ancestry_country': 'United Kingdom', 'followup_time': 'median=8 years',
+                'cohorts': ','.join(self.random.sample(cohort_ids, min(2, len(cohort_ids))))
+            }
+            if index < self.formulas:
+                row['sample_number'] = f'={cases_column}{first_row + index}+{controls_column}{first_row + index}'
+            if self.is_broken(index):
+                error = index // self.error_rate % 3
+                if error == 0:
+                    row['sample_percent_male'] = 101
+                elif error == 1:
+                    row['cohorts'] = 'UNKNOWN_COHORT'
+                else:
+                    row['sample_age'] = 'mean=50.1 (SD=10) years'
+            yield row
+
+
+    def performance_row(self, index):
+        row = {
+            'Score Name/ID\n(must be unique, or already present in the PGS Catalog)': f'PGS_{index % max(self.scores, 1)}',
+            'Sample Set ID\n(must be linked to the Sample Descriptions sheet)': f'SS_{index % max(self.samples, 1)}',
+            'phenotyping_reported': 'Incident coronary artery disease',
+            'metric_beta_HR': f'1.{self.random.randint(10, 99)} [1.05 - 2.10]',
+            'metric_class_AUROC': f'0.{self.random.randint(55, 85)} (0.01)',
+            'metric_other_other': 'Harrell C = 0.71 [0.69 - 0.73];Nagelkerke R2 = 0.12',
+            'covariates': 'age, sex, PC1-10'
+        }
+        if self.is_broken(index):
+            error = index // self.error_rate % 3
+            if error == 0:
+                row['Score Name/ID\n(must be unique, or already present in the PGS Catalog)'] = 'UNKNOWN_SCORE'
+            elif error == 1:
+                row['metric_other_other'] = 'Harrell C: 0.71'
+            else:
+                row['covariates'] += ' '
+        return row
+
+
+    def cohort_row(self, index):
+        return {'name_short': f'COHORT{index}', 'name_full': f'Benchmark cohort {index}'}
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='Generate a synthetic PGS metadata workbook (for the benchmarks)')
+    argparser.add_argument("-o", help='Path of the generated workbook', required=True, metavar='XLSX_FILE')
+    argparser.add_argument("--scores", help='Number of scores', type=int, default=10)
+    argparser.add_argument("--performances", help='Number of performance metrics rows', type=int, default=20)
+    argparser.add_argument("--samples", help='Number of Testing sample sets', type=int, default=5)
+    argparser.add_argument("--cohorts", help='Number of cohorts', type=int, default=5)
+    argparser.add_argument("--formulas", help='Number of Testing samples with a formula as number of individuals (values only computed when the workbook is validated as an uploaded file)', type=int, default=0)
+    argparser.add_argument("--broken", help='Inject errors in the workbook', default=False, action=argparse.BooleanOptionalAction)
+    argparser.add_argument("--seed", help='Seed of the random values', type=int, default=0)
+
+    args = argparser.parse_args()
+
+    generator = WorkbookGenerator(scores=args.scores, performances=args.performances, samples=args.samples, cohorts=args.cohorts,
+                                  formulas=args.formulas, broken=args.broken, seed=args.seed)
+    generator.write(args.o)
+    print(f'Workbook written in {args.o}')
+
+
+if __name__ == '__main__':
+    main()
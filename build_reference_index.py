@@ -0,0 +1,39 @@
+import argparse
+import os
+
+from validator.request.offline import INDEX_FILES, OfflineConnector, build_efo_index, build_gwas_index, build_publication_index
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='Build the local reference indexes used by the offline validation (OfflineConnector)')
+    argparser.add_argument("-o", help='Directory of the reference indexes', required=True, metavar='INDEX_DIR')
+    argparser.add_argument("--efo", help='EFO ontology dump, in OBO format (e.g. efo.obo)', metavar='EFO_OBO_FILE')
+    argparser.add_argument("--gwas", help='GWAS Catalog "All ancestry data" export (TSV)', metavar='GWAS_ANCESTRY_FILE')
+    argparser.add_argument("--publications", help='EuropePMC search results, in JSON Lines format (1 result per line)', metavar='EUROPEPMC_JSONL_FILE')
+
+    args = argparser.parse_args()
+
+    builders = [
+        (args.efo, build_efo_index, 'EFO'),
+        (args.gwas, build_gwas_index, 'GWAS Catalog'),
+        (args.publications, build_publication_index, 'EuropePMC')
+    ]
+    if not any(source_file for source_file, _, _ in builders):
+        argparser.error('at least one source file (--efo, --gwas or --publications) is required')
+
+    for source_file, builder, label in builders:
+        if source_file:
+            if not os.path.isfile(source_file):
+                print("File '"+source_file+"' can't be found")
+                exit(1)
+            count = builder(source_file, args.o)
+            print(f'{label} index: {count} entries')
+
+    # Summary of the indexes available in the directory
+    print("\n#### Reference indexes ####")
+    for source, versions in OfflineConnector(args.o).index_versions().items():
+        print(f'- {INDEX_FILES[source]}: {versions["entries"]} entries, built on {versions["built"]} from {versions["source_file"]} (format v{versions["format_version"]})')
+
+
+if __name__ == '__main__':
+    main()
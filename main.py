@@ -1,8 +1,18 @@
 #!flask/bin/python
 import os
-from flask import Flask, request, jsonify
+import time
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+from validator.jobs import JobManager, JobQueueFull
 from validator.main_validator import PGSMetadataValidator
+from validator.metrics import MetricsRegistry
+from validator.profiler import Profiler
+from validator.result_cache import open_result_cache
+from validator.request import connector as connector_module
+from validator.request.cache import CachedConnector
+from validator.request.factory import create_connector
+from validator.request.health import HealthChecker, create_probe_connector, health_check_ttl
+from validator.row_cache import open_row_cache
 
 app = Flask(__name__, static_url_path='/')
 
@@ -22,6 +32,67 @@ if not os.getenv('GAE_APPLICATION', None):
         print("Error: missing app.yaml file")
         exit(1)
 
+# Connector shared by all the validations: local reference indexes (offline mode),
+# or pooled connections and persistent cache of the external lookups
+connector = create_connector(offline_index_dir=os.getenv('PGS_OFFLINE_INDEX_DIR'))
+
+# Status of the external services, refreshed in the background once the service is started (see start_health_checker):
+# the lookups of the services which are down are not attempted
+health_checker = None
+if not os.getenv('PGS_OFFLINE_INDEX_DIR'):
+    health_checker = HealthChecker(create_probe_connector(), ttl=health_check_ttl())
+
+# Results of the rows already validated, reused when the same file is uploaded again with a few changes (incremental validation)
+row_cache = open_row_cache()
+# Results of the files already validated, returned directly when the same file is submitted again
+result_cache = open_result_cache()
+
+# Validation jobs, run on a bounded pool of worker threads
+job_manager = JobManager(
+    max_workers=int(os.getenv('VALIDATION_WORKERS', 2)),
+    max_jobs=int(os.getenv('VALIDATION_MAX_JOBS', 20)),
+    result_ttl=int(os.getenv('VALIDATION_RESULT_TTL', 3600))
+)
+# Maximum number of seconds the synchronous endpoint (/validate) waits for the end of the validation
+validate_sync_timeout = float(os.getenv('VALIDATION_SYNC_TIMEOUT', 50))
+
+# Service metrics, exposed in the Prometheus text format by /metrics (the values are specific to each instance/process)
+metrics = MetricsRegistry()
+http_requests = metrics.counter('pgs_validator_http_requests_total', 'Number of HTTP requests, by endpoint and status code', ('endpoint', 'code'))
+validations = metrics.counter('pgs_validator_validations_total', 'Number of validations, by outcome (success, failed, crashed or rejected)', ('outcome',))
+validation_duration = metrics.histogram('pgs_validator_validation_duration_seconds', 'Duration of the validations (in seconds)',
+                                        buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 45, 60, 120, 300))
+workbook_bytes = metrics.histogram('pgs_validator_workbook_bytes', 'Size of the validated workbooks (in bytes)',
+                                   buckets=(10e3, 50e3, 100e3, 250e3, 500e3, 1e6, 2.5e6, 5e6, 10e6, 25e6, 50e6))
+workbook_rows = metrics.histogram('pgs_validator_workbook_rows_read', 'Number of spreadsheet rows read per validation',
+                                  buckets=(10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000))
+external_requests = metrics.counter('pgs_validator_external_requests_total', 'Number of requests sent to the external services, by outcome', ('service', 'outcome'))
+external_request_duration = metrics.histogram('pgs_validator_external_request_duration_seconds', 'Duration of the requests sent to the external services (in seconds)', ('service',))
+validations_in_progress = metrics.gauge('pgs_validator_validations_in_progress', 'Number of validations running')
+metrics.gauge('pgs_validator_validations_queued', 'Number of validations waiting for a worker', function=lambda: job_manager.count('queued'))
+
+
+def observe_external_request(service, duration, outcome):
+    external_requests.inc(service=service, outcome=outcome)
+    if outcome != 'unavailable':
+        external_request_duration.observe(duration, service=service)
+
+connector_module.request_hooks.append(observe_external_request)
+
+
+@app.before_request
+def start_health_checker():
+    """ Start the background probes of the external services with the first request, in the process serving it (not on import). """
+    if health_checker:
+        health_checker.start()
+
+
+@app.after_request
+def count_request(response):
+    endpoint = request.url_rule.rule if request.url_rule else 'unknown'
+    http_requests.inc(endpoint=endpoint, code=response.status_code)
+    return response
+
 
 @app.route("/robots.txt")
 def robots_dot_txt():
@@ -33,16 +104,21 @@ def home():
     return "<h1>PGS Catalog metadata validator</h1><p>This service validates the Metadata files schema and content.</p>"
 
 
-@app.route('/validate', methods=['POST'])
-def post_file():
+@app.route('/health', methods=['GET'])
+def get_health():
+    """ Status of the external services at the last probe (the related checks are skipped when they are down). """
+    if not health_checker:
+        return jsonify({'offline': True})
+    return jsonify(health_checker.to_dict())
 
-    response = {}
-    post_json = request.get_json()
-    #print("post_json: "+str(post_json))
 
-    filename = post_json['filename']
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), content_type=metrics.content_type)
 
-    # Check file extension
+
+def check_file_extension(filename):
+    """ Return the error response if the file doesn't have the expected extension, otherwise None. """
     expected_file_extension = 'xlsx'
     filename_only = os.path.basename(filename)
     extension = filename_only.split('.')[-1]
@@ -50,46 +126,117 @@ def post_file():
         error_msg = { 'message': f'The expected file extension is [.{expected_file_extension}] but the given file name is "{filename_only}".'}
         response = {'status': 'failed', 'error': {} }
         response['error']['General'] = [ error_msg ]
-        return jsonify(response)
-
-    metadata_validator = PGSMetadataValidator(filename, 1)
-    loaded_spreadsheets = metadata_validator.parse_spreadsheets()
-    if loaded_spreadsheets:
-        metadata_validator.parse_publication()
-        metadata_validator.parse_scores()
-        metadata_validator.parse_cohorts()
-        metadata_validator.parse_performances()
-        metadata_validator.parse_samples()
-        metadata_validator.post_parsing_checks()
-
-    status = 'success'
-    if metadata_validator.report['error']:
-        status = 'failed'
-        response['error'] = {}
-        error_report = metadata_validator.report['error']
-        for error_spreadsheet in error_report:
-            response['error'][error_spreadsheet] = []
-            for error_msg in error_report[error_spreadsheet]:
-                error_entry = { 'message': error_msg }
-                if error_report[error_spreadsheet][error_msg][0] != None:
-                    error_entry['lines'] = error_report[error_spreadsheet][error_msg]
-                response['error'][error_spreadsheet].append(error_entry)
-
-    if metadata_validator.report['warning']:
-        response['warning'] = {}
-        warning_report = metadata_validator.report['warning']
-        for warning_spreadsheet in warning_report:
-            response['warning'][warning_spreadsheet] = []
-            for warning_msg in warning_report[warning_spreadsheet]:
-                warning_entry = { 'message': warning_msg }
-                if warning_report[warning_spreadsheet][warning_msg][0] != None:
-                    warning_entry['lines'] = warning_report[warning_spreadsheet][warning_msg]
-                response['warning'][warning_spreadsheet].append(warning_entry)
-
-    response['status'] = status
-    #os.remove(metadata_filename)
-
-    return jsonify(response)
+        return response
+    return None
+
+
+def validate_file(filename, with_timings=False, reuse_result=True, max_errors=None, fail_fast=False):
+    """ Validate the uploaded file and build the response (run by the job workers). """
+    # The profiler also provides the workbook size and number of rows to the service metrics
+    profiler = Profiler()
+    skipped_services = health_checker.unavailable_services() if health_checker else ()
+    metadata_validator = PGSMetadataValidator(filename, 1, connector=connector, profiler=profiler, row_cache=row_cache,
+                                              result_cache=result_cache, reuse_result=reuse_result, max_errors=max_errors, fail_fast=fail_fast,
+                                              skipped_services=skipped_services)
+    start_time = time.perf_counter()
+    validations_in_progress.inc()
+    try:
+        metadata_validator.validate()
+    except Exception:
+        validations.inc(outcome='crashed')
+        raise
+    finally:
+        validations_in_progress.dec()
+        validation_duration.observe(time.perf_counter() - start_time)
+    if isinstance(connector, CachedConnector):
+        app.logger.debug(f'Lookup cache: {connector.stats()}')
+
+    response = metadata_validator.report.to_dict()
+    response['status'] = 'failed' if metadata_validator.report.has_errors() else 'success'
+    validations.inc(outcome=response['status'])
+    if metadata_validator.cached_result:
+        response['cached'] = True
+    counters = profiler.to_dict()['counters']
+    if 'workbook_bytes' in counters:
+        workbook_bytes.observe(counters['workbook_bytes'])
+    # Only the workbooks actually read (not the cached results, nor the files rejected before reading them)
+    rows_read = [ value for name, value in counters.items() if name.startswith('rows_read.') ]
+    if rows_read:
+        workbook_rows.observe(sum(rows_read))
+    if with_timings:
+        response['timings'] = metadata_validator.timings()
+
+    return response
+
+
+def submit_validation():
+    """ Submit the validation job of the posted file. Return the job ID, or an error response (with its HTTP status code). """
+    post_json = request.get_json()
+    filename = post_json['filename']
+    # Optional instrumentation data (durations, calls and counters) in the response
+    with_timings = bool(post_json.get('timings', False))
+    # The result of a file already validated is reused, unless "cache" is false (e.g. after an update of the external resources)
+    reuse_result = bool(post_json.get('cache', True))
+    # Early stop of the validation (partial report, with "truncated": true): after a number of errors, or after the first critical error
+    max_errors = post_json.get('max_errors')
+    fail_fast = bool(post_json.get('fail_fast', False))
+    if max_errors is not None and (type(max_errors) is not int or max_errors < 1):
+        error_msg = { 'message': f'"max_errors" must be a positive integer (found: {max_errors})' }
+        return None, (jsonify({'status': 'failed', 'error': {'General': [ error_msg ]}}), 400)
+
+    # Check file extension
+    extension_error = check_file_extension(filename)
+    if extension_error:
+        return None, (jsonify(extension_error), 200)
+
+    try:
+        return job_manager.submit(validate_file, filename, with_timings, reuse_result, max_errors, fail_fast), None
+    except JobQueueFull as e:
+        validations.inc(outcome='rejected')
+        error_msg = { 'message': str(e) }
+        return None, (jsonify({'status': 'failed', 'error': {'General': [ error_msg ]}}), 503)
+
+
+def job_response(job):
+    """ Response describing a validation job (with the validation result once the job is done). """
+    response = {'job_id': job['job_id'], 'status': job['status']}
+    if job['status'] == 'done':
+        return job['result']
+    if job['status'] == 'error':
+        error_msg = { 'message': f'Unexpected error during the validation: {job["error"]}' }
+        return {'job_id': job['job_id'], 'status': 'failed', 'error': {'General': [ error_msg ]}}
+    response['url'] = f'/validate/jobs/{job["job_id"]}'
+    return response
+
+
+@app.route('/validate', methods=['POST'])
+def post_file():
+    """ Synchronous validation: wait for the end of the validation job (if it takes too long, the job ID is returned to poll the result). """
+    job_id, error_response = submit_validation()
+    if error_response:
+        return error_response
+
+    job = job_manager.wait(job_id, validate_sync_timeout)
+    if job['status'] in ('queued', 'running'):
+        return jsonify(job_response(job)), 202
+    return jsonify(job_response(job))
+
+
+@app.route('/validate/jobs', methods=['POST'])
+def post_job():
+    """ Asynchronous validation: return the job ID immediately, the result is then polled with GET /validate/jobs/<job_id>. """
+    job_id, error_response = submit_validation()
+    if error_response:
+        return error_response
+    return jsonify(job_response(job_manager.get(job_id))), 202
+
+
+@app.route('/validate/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({'job_id': job_id, 'status': 'failed', 'error': {'General': [ {'message': 'Unknown or expired validation job'} ]}}), 404
+    return jsonify(job_response(job))
 
 if __name__ == '__main__':
     app.run(debug=False)#, port=5000)
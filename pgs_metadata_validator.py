@@ -1,18 +1,48 @@
 import os
 import argparse
+import json
 import logging
 import sys
 
+from validator.batch import collect_files, run_batch
 from validator.main_validator import PGSMetadataValidator
+from validator.phases import PHASE_WORKERS
+from validator.profiler import Profiler, format_profile
+from validator.request.cache import CachedConnector
+from validator.request.connector import DefaultConnector
+from validator.request.factory import create_connector
+from validator.request.health import HealthChecker, create_probe_connector, health_cache_path, health_check_ttl
+from validator.row_cache import open_row_cache
 
 def main():
     argparser = argparse.ArgumentParser()
-    argparser.add_argument("-f", help='The path to the PGS Catalog metadata file to be validated', required=True, metavar='PGS_METADATA_FILE_NAME')
+    input_group = argparser.add_mutually_exclusive_group(required=True)
+    input_group.add_argument("-f", help='The path to the PGS Catalog metadata file to be validated', metavar='PGS_METADATA_FILE_NAME')
+    input_group.add_argument("--batch", help='Batch mode: directories, glob patterns (quoted) and/or files to be validated in parallel', nargs='+', metavar='PATH')
+    input_group.add_argument("--manifest", help='Batch mode: text file listing the paths of the files to be validated in parallel (1 per line)', metavar='MANIFEST_FILE')
+    argparser.add_argument("-j", "--jobs", help='Batch mode: number of worker processes (default: number of CPUs)', type=int, metavar='JOBS')
+    argparser.add_argument("--report", help='Batch mode: path of the aggregated JSON report (default: standard output)', metavar='REPORT_FILE')
     argparser.add_argument("-r", help='Flag to indicate if the file is remote (accessible via the Google Cloud Storage)')
     argparser.add_argument("--debug", help='Toggle debugging mode', default=False, action=argparse.BooleanOptionalAction)
+    argparser.add_argument("--offline", help='Directory of the local reference indexes (see build_reference_index.py): the external lookups are done offline', metavar='INDEX_DIR')
+    argparser.add_argument("--lookup-cache", help='Cache the external lookups (EuropePMC, OLS, GWAS Catalog) on disk, see PGS_LOOKUP_CACHE', default=True, action=argparse.BooleanOptionalAction)
+    argparser.add_argument("--row-cache", help='Incremental validation: reuse the results of the unchanged rows validated previously, see PGS_ROW_CACHE', default=False, action=argparse.BooleanOptionalAction)
+    argparser.add_argument("--profile", help='Print the duration of each validation phase, the timed calls (workbook loading, external lookups, formulas) and the counters', default=False, action='store_true')
+    argparser.add_argument("--phase-workers", help=f'Maximum number of independent validation phases run at the same time (default: {PHASE_WORKERS}, 1 in batch mode; 1 to run them sequentially)', type=int, metavar='WORKERS')
+    argparser.add_argument("--max-errors", help='Stop the validation after this number of errors (partial report)', type=int, metavar='N')
+    argparser.add_argument("--fail-fast", help='Stop the validation after the first critical error, e.g. empty spreadsheet (partial report)', default=False, action='store_true')
+    argparser.add_argument("--streaming", help='Stream the rows of the workbook (read-only mode) instead of loading it fully in memory', default=True, action=argparse.BooleanOptionalAction)
 
     args = argparser.parse_args()
 
+    if args.offline and not os.path.isdir(args.offline):
+        print("Directory '"+args.offline+"' can't be found")
+        exit(1)
+
+    if args.batch or args.manifest:
+        batch_validation(args)
+        return
+
     # Check study file exists
     metadata_filename = args.f
     metadata_is_remote = False
@@ -45,50 +75,80 @@ def main():
             print("Error: missing app.yaml file")
             exit(1)
 
-    metadata_validator = PGSMetadataValidator(metadata_filename, metadata_is_remote)
+    connector = create_connector(offline_index_dir=args.offline, lookup_cache=args.lookup_cache)
+    http_connector = connector.connector if isinstance(connector, CachedConnector) else connector
+
+    skipped_services = set()
+    if args.offline:
+        print("#### Offline reference indexes ####")
+        for source, versions in connector.index_versions().items():
+            print(f' - {source}: built on {versions["built"]} from {versions["source_file"]}')
+    else:
+        skipped_services = check_services()
+
+    profiler = Profiler() if args.profile else None
+    row_cache = open_row_cache() if args.row_cache else None
+    metadata_validator = PGSMetadataValidator(metadata_filename, metadata_is_remote, connector=connector, streaming=args.streaming, profiler=profiler, row_cache=row_cache, phase_workers=args.phase_workers or PHASE_WORKERS,
+                                              max_errors=args.max_errors, fail_fast=args.fail_fast, skipped_services=skipped_services)
+
+    metadata_validator.validate()
+
+    if args.debug and isinstance(http_connector, DefaultConnector):
+        for host, host_stats in http_connector.connection_stats().items():
+            logging.debug(f'Connections to {host}: {host_stats["requests"]} request(s), {host_stats["connections"]} connection(s) opened, {host_stats["reused"]} reused')
+        if isinstance(connector, CachedConnector):
+            logging.debug(f'Lookup cache: {connector.stats()}')
+
+    report_text = metadata_validator.report.to_text()
+    if report_text:
+        print(report_text)
+
+    if args.profile:
+        print("\n\n#### Profile ####")
+        print(format_profile(metadata_validator.timings()))
+
 
-    pre_warnings = metadata_validator.test_external_services()
+
+def check_services(output=sys.stdout):
+    """
+    Probe the external services and print the warnings about the ones which are down.
+    The status of the services is shared by the successive runs for a while (see PGS_HEALTH_CHECK_TTL).
+    > Return: set of the unavailable services, whose lookups are not attempted
+    """
+    health_checker = HealthChecker(create_probe_connector(), ttl=health_check_ttl(), cache_file=health_cache_path())
+    pre_warnings = health_checker.warnings()
     if len(pre_warnings) > 0:
-        print("#### Warning(s) ####")
+        print("#### Warning(s) ####", file=output)
         for warning in pre_warnings:
-            print(' - {}'.format(warning))
-
-    metadata_validator.parse_spreadsheets()
-    metadata_validator.parse_publication()
-    metadata_validator.parse_scores()
-    metadata_validator.parse_cohorts()
-    metadata_validator.parse_performances()
-    metadata_validator.parse_samples()
-    metadata_validator.post_parsing_checks()
-
-    if metadata_validator.report['error']:
-        print("\n#### Reported error(s) ####\n")
-        error_report = metadata_validator.report['error']
-        for error_spreadsheet in error_report:
-            print("# Spreadsheet '"+error_spreadsheet+"'")
-            for error_msg in error_report[error_spreadsheet]:
-                if error_report[error_spreadsheet][error_msg][0] == None:
-                    print('- Global error: '+error_msg)
-                else:
-                    plural = ''
-                    if len(error_report[error_spreadsheet][error_msg]) > 1:
-                        plural = 's'
-                    print('- Line'+plural+' '+','.join(str(l) for l in error_report[error_spreadsheet][error_msg])+": "+error_msg)
-
-    if metadata_validator.report['warning']:
-        print("\n\n#### Reported warning(s) ####")
-        warning_report = metadata_validator.report['warning']
-        for warning_spreadsheet in warning_report:
-            print("\n# Spreadsheet '"+warning_spreadsheet+"'")
-            for warning_msg in warning_report[warning_spreadsheet]:
-                plural = ''
-                if warning_report[warning_spreadsheet][warning_msg][0] == None:
-                    print('- Global warning: '+warning_msg)
-                else:
-                    plural = ''
-                    if len(warning_report[warning_spreadsheet][warning_msg]) > 1:
-                        plural = 's'
-                    print('- Line'+plural+' '+','.join(str(l) for l in warning_report[warning_spreadsheet][warning_msg])+": "+warning_msg)
+            print(' - {}'.format(warning), file=output)
+    return health_checker.unavailable_services()
+
+
+def batch_validation(args):
+    """ Validate a batch of files in parallel and write the aggregated report. """
+    files = collect_files(args.batch or [], [args.manifest] if args.manifest else [])
+    if not files:
+        print("No file to validate")
+        exit(1)
+
+    def progress(done, total, result):
+        print(f'[{done}/{total}] {result["status"]}: {result["file"]} ({result["time"]:.2f}s)', file=sys.stderr)
+
+    # The services are probed once for the whole batch (the report is printed on the standard output)
+    skipped_services = check_services(sys.stderr) if not args.offline else set()
+
+    report = run_batch(files, jobs=args.jobs, streaming=args.streaming, offline_index_dir=args.offline, lookup_cache=args.lookup_cache,
+                       skipped_services=skipped_services, row_cache=args.row_cache, max_errors=args.max_errors, fail_fast=args.fail_fast,
+                       phase_workers=args.phase_workers or 1, progress=progress)
+
+    if args.report:
+        with open(args.report, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    summary = report['summary']
+    print(f'\n{summary["files"]} file(s) validated in {summary["wall_time"]:.1f}s: {summary["success"]} success, {summary["failed"]} failed, {summary["crashed"]} crashed', file=sys.stderr)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,151 @@
+import logging
+import unittest
+
+from openpyxl import Workbook
+
+from validator.formula import Formula, FormulaError, FormulaEvaluator, MAX_FORMULA_CELLS
+from validator.spreadsheet import RowSource
+
+
+def make_spreadsheet(rows):
+    """ In-memory spreadsheet (RowSource) containing the given rows. """
+    workbook = Workbook()
+    worksheet = workbook.active
+    worksheet.title = 'Sample Descriptions'
+    for row in rows:
+        worksheet.append(row)
+    return RowSource(worksheet)
+
+
+def evaluate(rows, formula, **kwargs):
+    return FormulaEvaluator(make_spreadsheet(rows), **kwargs).evaluate(formula)
+
+
+class FormulaTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # The formulas which can't be calculated are logged as warnings
+        logging.disable(logging.WARNING)
+
+    @classmethod
+    def tearDownClass(cls):
+        logging.disable(logging.NOTSET)
+
+
+    def test_numbers(self):
+        self.assertEqual(evaluate([], '=251+42-25'), 268)
+        self.assertEqual(evaluate([], '=-5+10'), 5)
+
+    def test_cells(self):
+        rows = [[100, 20, 3]]
+        self.assertEqual(evaluate(rows, '=A1+B1-C1'), 117)
+        self.assertEqual(evaluate(rows, '=$A$1+B1'), 120)
+        self.assertEqual(evaluate(rows, '=SUM(A1-B1)'), 80)
+
+    def test_whole_number_results_are_integers(self):
+        result = evaluate([[100.0, 5]], '=A1+B1')
+        self.assertEqual(result, 105)
+        self.assertIsInstance(result, int)
+
+    def test_decimal_values_are_kept(self):
+        self.assertEqual(evaluate([[2.5, 1]], '=A1+B1'), 3.5)
+
+    def test_numeric_text_cells(self):
+        self.assertEqual(evaluate([['12', '0.5']], '=A1+B1'), 12.5)
+
+    def test_empty_cell(self):
+        with self.assertRaises(FormulaError):
+            evaluate([[1, None, 3]], '=A1+B1')
+        with self.assertRaises(FormulaError):
+            evaluate([[1]], '=A1+A2')
+
+    def test_non_numeric_cell(self):
+        with self.assertRaises(FormulaError):
+            evaluate([[1, 'NR']], '=A1+B1')
+
+    def test_range_on_one_column(self):
+        self.assertEqual(evaluate([[1], [2], [3]], '=SUM(A1:A3)'), 6)
+
+    def test_range_across_columns(self):
+        rows = [[1, 2, 3], [4, 5, 6], [7, 8, 9]]
+        self.assertEqual(evaluate(rows, '=SUM(A1:C2)'), 21)
+        self.assertEqual(evaluate(rows, '=SUM(B2:C3)'), 28)
+        # Reversed corners
+        self.assertEqual(evaluate(rows, '=SUM(C3:A1)'), 45)
+
+    def test_range_with_multi_letter_columns(self):
+        row = [None] * 26 + [10, 20, 30]
+        self.assertEqual(evaluate([row], '=SUM(AA1:AC1)'), 60)
+
+    def test_range_skips_empty_cells(self):
+        self.assertEqual(evaluate([[1, None, 3], [None, 5]], '=SUM(A1:C2)'), 9)
+
+    def test_sum_of_several_arguments(self):
+        rows = [[1, 2, 3], [4, 5, 6]]
+        self.assertEqual(evaluate(rows, '=SUM(A1,B1:C2)+A2'), 21)
+        self.assertEqual(evaluate(rows, '=SUM(A1;C1)'), 4)
+
+    def test_nested_formulas(self):
+        rows = [[1, '=A1+1'], ['=B1+A1', '=SUM(A1:B1)+A2']]
+        self.assertEqual(evaluate(rows, '=A2'), 3)
+        self.assertEqual(evaluate(rows, '=B2'), 6)
+
+    def test_nested_chain(self):
+        # Each cell of the column A sums the 2 cells of the row above: A1 = 1, A2 = 2, ... (no recursion limit)
+        depth = 5000
+        rows = [[1, 1]] + [ [f'=SUM(A{row_id - 1}:B{row_id - 1})', 1] for row_id in range(2, depth + 1) ]
+        self.assertEqual(evaluate(rows, f'=A{depth}'), depth)
+        self.assertEqual(evaluate(rows, f'=SUM(A{depth}:B{depth})'), depth + 1)
+
+    def test_nested_formula_error(self):
+        with self.assertRaises(FormulaError):
+            evaluate([[1, '=A1+C1']], '=B1+1')
+
+    def test_circular_reference(self):
+        with self.assertRaises(FormulaError):
+            evaluate([['=B1+1', '=A1+1']], '=A1')
+        with self.assertRaises(FormulaError):
+            evaluate([['=A1+1']], '=A1+2')
+
+    def test_circular_reference_in_chain(self):
+        depth = 100
+        rows = [[f'=A{depth}+1']] + [ [f'=A{row_id - 1}+1'] for row_id in range(2, depth + 1) ]
+        with self.assertRaises(FormulaError):
+            evaluate(rows, f'=A{depth}')
+
+    def test_max_cells_of_a_range(self):
+        self.assertEqual(evaluate([[1]], '=SUM(A1:A10)', max_cells=10), 1)
+        with self.assertRaises(FormulaError):
+            evaluate([[1]], '=SUM(A1:A11)', max_cells=10)
+        with self.assertRaises(FormulaError):
+            evaluate([[1]], f'=SUM(A1:A{MAX_FORMULA_CELLS + 1})')
+
+    def test_max_cells_of_nested_formulas(self):
+        rows = [[1]] + [ [f'=A{row_id - 1}+1'] for row_id in range(2, 21) ]
+        self.assertEqual(evaluate(rows, '=A20', max_cells=20), 20)
+        with self.assertRaises(FormulaError):
+            evaluate(rows, '=A20', max_cells=19)
+
+    def test_unsupported_syntax(self):
+        for formula in ['=AVERAGE(A1:A2)', '=A1:A2', '=A1*2', '=SUM(A1', '=']:
+            with self.assertRaises(FormulaError, msg=formula):
+                evaluate([[1], [2]], formula)
+
+    def test_errors_are_cached(self):
+        evaluator = FormulaEvaluator(make_spreadsheet([[1, 'NR']]))
+        for _ in range(2):
+            with self.assertRaises(FormulaError):
+                evaluator.evaluate('=A1+B1')
+
+    def test_formula2number(self):
+        spreadsheet = make_spreadsheet([[10, 20, None]])
+        self.assertEqual(Formula(spreadsheet, '=A1+B1').formula2number(), 30)
+        # The formulas which can't be calculated are returned unchanged
+        formula = Formula(spreadsheet, '=A1+C1')
+        self.assertEqual(formula.formula2number(), '=A1+C1')
+        self.assertFalse(formula.is_parsed)
+
+
+if __name__ == '__main__':
+    unittest.main()
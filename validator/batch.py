@@ -0,0 +1,231 @@
+import datetime
+import glob
+import os
+import re
+import time
+import traceback
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from validator.main_validator import PGSMetadataValidator
+from validator.report import count_lines
+from validator.request.factory import create_connector
+from validator.row_cache import open_row_cache
+
+# Number of most frequent errors listed in the aggregated report
+top_errors_count = 20
+
+# Connector and row cache of the worker process, created once by init_worker()
+_worker_connector = None
+_worker_row_cache = None
+
+
+def collect_files(paths, manifests=()):
+    """
+    Collect the metadata files to validate:
+    - paths: list of files, directories (searched recursively) and/or glob patterns
+    - manifests: list of text files, with one file path per line (relative paths are relative to the manifest directory)
+    > Return: sorted list of unique file paths
+    """
+    files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            files.update(glob.glob(os.path.join(path, '**', '*.xlsx'), recursive=True))
+        elif glob.has_magic(path):
+            files.update(glob.glob(path, recursive=True))
+        else:
+            files.add(path)
+    for manifest in manifests:
+        manifest_dir = os.path.dirname(manifest)
+        with open(manifest) as manifest_file:
+            for line in manifest_file:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    files.add(os.path.join(manifest_dir, line))
+    # Skip the Excel lock files (e.g. "~$metadata.xlsx")
+    return sorted(f for f in files if not os.path.basename(f).startswith('~$'))
+
+
+def init_worker(offline_index_dir, lookup_cache, row_cache=False):
+    """ Create the connector (and the row cache if 'row_cache' is True) of the worker process, shared by all the validations of this process. """
+    global _worker_connector, _worker_row_cache
+    _worker_connector = create_connector(offline_index_dir=offline_index_dir, lookup_cache=lookup_cache)
+    _worker_row_cache = open_row_cache() if row_cache else None
+
+
+def validate_file(filepath, streaming=True, skipped_services=(), max_errors=None, fail_fast=False, phase_workers=1):
+    """
+    Validate a metadata file in the worker process and return its result (JSON serialisable).
+    - skipped_services: external services found unavailable before the batch, whose lookups are not attempted
+    - max_errors, fail_fast: stop the validation of the file early (partial report, see PGSMetadataValidator)
+    - phase_workers: maximum number of validation phases of the file run at the same time
+    """
+    start_time = time.perf_counter()
+    result = {'file': filepath}
+    try:
+        if not os.path.isfile(filepath):
+            raise FileNotFoundError(f"File '{filepath}' can't be found")
+        metadata_validator = PGSMetadataValidator(filepath, False, connector=_worker_connector, streaming=streaming, row_cache=_worker_row_cache,
+                                                  phase_workers=phase_workers, max_errors=max_errors, fail_fast=fail_fast, skipped_services=skipped_services)
+        metadata_validator.validate()
+        result['status'] = 'failed' if metadata_validator.report.has_errors() else 'success'
+        result['phase_timings'] = metadata_validator.phase_timings
+        result['error'] = report_entries(metadata_validator.report, 'error')
+        result['warning'] = report_entries(metadata_validator.report, 'warning')
+    except Exception as e:
+        result['status'] = 'crashed'
+        result['exception'] = f'{e.__class__.__name__}: {e}'
+        result['traceback'] = traceback.format_exc()
+    result['time'] = time.perf_counter() - start_time
+    return result
+
+
+def report_entries(report, category):
+    """ Convert the errors/warnings of a report into a list of entries. """
+    entries = []
+    for spreadsheet, message, lines in report.entries(category):
+        entry = {'spreadsheet': spreadsheet, 'message': message}
+        if lines:
+            entry['lines'] = lines
+        entries.append(entry)
+    return entries
+
+
+def run_batch(files, jobs=None, streaming=True, offline_index_dir=None, lookup_cache=True, skipped_services=(), row_cache=False,
+              max_errors=None, fail_fast=False, phase_workers=1, progress=None):
+    """
+    Validate the files in parallel, each file being validated by one task of a pool of worker processes.
+    At most 'jobs' files are submitted at a time. If a worker process dies (e.g. killed by the OS when running out of memory),
+    the pool is recreated and the files which were being validated are validated again one at a time:
+    the file making a worker die on its own is reported as crashed, and the batch goes on.
+    - skipped_services: external services found unavailable before the batch (e.g. HealthChecker.unavailable_services), whose lookups are not attempted
+    - row_cache: reuse the results of the unchanged rows validated previously (see validator.row_cache), each worker opening the cache database
+    - max_errors, fail_fast, phase_workers: options of the validation of each file (see validate_file).
+      The files are already validated in parallel, so the phases of each file are run sequentially by default (phase_workers=1)
+    - progress: optional function called with (number of validated files, number of files, file result) after each file
+    > Return: aggregated report (dictionary)
+    """
+    start_time = time.perf_counter()
+    jobs = jobs or os.cpu_count() or 1
+    results = []
+    pending = deque(files)
+    # Files which were being validated when a worker process died
+    suspects = deque()
+    running = {}
+    executor = None
+
+    def add_result(result):
+        results.append(result)
+        if progress:
+            progress(len(results), len(files), result)
+
+    def submit(filepath):
+        running[executor.submit(validate_file, filepath, streaming, skipped_services, max_errors, fail_fast, phase_workers)] = filepath
+
+    # File validated alone after a failure of the pool
+    isolated_file = None
+    try:
+        while pending or suspects or running:
+            if executor is None:
+                executor = ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(offline_index_dir, lookup_cache, row_cache))
+            pool_broken = False
+            try:
+                if suspects:
+                    if not running:
+                        isolated_file = suspects.popleft()
+                        submit(isolated_file)
+                else:
+                    while pending and len(running) < jobs:
+                        submit(pending[0])
+                        pending.popleft()
+            except BrokenProcessPool:
+                # The pool failed between 2 validations: the file is submitted again to the new pool
+                pool_broken = True
+                if isolated_file is not None and isolated_file not in running.values():
+                    suspects.appendleft(isolated_file)
+                    isolated_file = None
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            if any(isinstance(future.exception(), BrokenProcessPool) for future in done):
+                # All the files being validated fail with the pool
+                done, _ = wait(running)
+            broken = []
+            for future in done:
+                filepath = running.pop(future)
+                try:
+                    add_result(future.result())
+                except BrokenProcessPool:
+                    broken.append(filepath)
+                except Exception as e:
+                    add_result(crashed_result(filepath, e))
+            if broken or pool_broken:
+                executor.shutdown()
+                executor = None
+            if broken:
+                if isolated_file is not None:
+                    add_result(crashed_result(isolated_file, 'The worker process validating the file terminated abruptly (e.g. out of memory)'))
+                else:
+                    suspects.extend(sorted(broken))
+            isolated_file = None
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    results.sort(key=lambda result: result['file'])
+    return aggregate_results(results, time.perf_counter() - start_time)
+
+
+def crashed_result(filepath, error):
+    """ Result of a file whose validation didn't return (error of the worker process). """
+    exception = f'{error.__class__.__name__}: {error}' if isinstance(error, Exception) else error
+    return {'file': filepath, 'status': 'crashed', 'exception': exception, 'time': 0.0}
+
+
+def aggregate_results(results, wall_time):
+    """ Build the aggregated report of a batch: summary, timings per phase, most frequent errors and results per file. """
+    statuses = Counter(result['status'] for result in results)
+
+    phase_timings = {}
+    for result in results:
+        for phase, duration in result.get('phase_timings', {}).items():
+            phase_timings.setdefault(phase, []).append(duration)
+    phase_summary = {
+        phase: {'total': sum(durations), 'mean': sum(durations) / len(durations), 'max': max(durations)}
+        for phase, durations in phase_timings.items()
+    }
+
+    # Count the files reporting each (normalised) error
+    error_files = Counter()
+    error_rows = Counter()
+    for result in results:
+        file_errors = set()
+        for entry in result.get('error', []):
+            error_key = (entry['spreadsheet'], normalise_message(entry['message']))
+            file_errors.add(error_key)
+            error_rows[error_key] += count_lines(entry.get('lines')) or 1
+        error_files.update(file_errors)
+    top_errors = [
+        {'spreadsheet': spreadsheet, 'message': message, 'files': files_count, 'occurrences': error_rows[(spreadsheet, message)]}
+        for (spreadsheet, message), files_count in error_files.most_common(top_errors_count)
+    ]
+
+    return {
+        'summary': {
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'files': len(results),
+            'success': statuses['success'],
+            'failed': statuses['failed'],
+            'crashed': statuses['crashed'],
+            'wall_time': wall_time,
+            'cpu_time': sum(result['time'] for result in results)
+        },
+        'phase_timings': phase_summary,
+        'top_errors': top_errors,
+        'files': results
+    }
+
+
+def normalise_message(message):
+    """ Replace the data specific to a file (quoted values, numbers) in a message, so the same errors can be grouped. """
+    message = re.sub(r'"[^"]*"', '"..."', message)
+    return re.sub(r'\d+', 'N', message)
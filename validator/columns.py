@@ -0,0 +1,106 @@
+from validator.generic import CheckPlan, GenericValidator
+
+# Value of a column for an object which doesn't have the field
+MISSING = object()
+
+whitespaces = (' ', '\t')
+
+
+class ColumnBatch():
+    """
+    Objects of the same type (e.g. the samples of a spreadsheet), validated column by column once they have all been collected.
+    Each field of the check plan (see GenericValidator) is pulled out of the objects as a column (list of values)
+    and its checks run in bulk over the column: only the failing objects get a report.
+    The messages of an object are in the same order as the ones of the object checks (check_not_null, then check_format).
+    """
+
+    type = None
+
+    def __init__(self, fields_infos, mandatory_fields, type=None, plan=None):
+        self.plan = plan or CheckPlan(fields_infos, mandatory_fields)
+        self.fields_infos = fields_infos
+        if type:
+            self.type = type
+        self.row_ids = []
+        self.objects = []
+
+
+    def __len__(self):
+        return len(self.objects)
+
+
+    def add(self, row_id, object):
+        """ Add an object, from the given spreadsheet row. """
+        self.row_ids.append(row_id)
+        self.objects.append(object)
+
+
+    def column(self, field, default=MISSING):
+        """ Values of a field, for all the objects (default value, MISSING by default, if the object doesn't have it). """
+        return [ object.__dict__.get(field, default) for object in self.objects ]
+
+
+    def check(self):
+        """
+        Run the checks over the columns.
+        > Return: dictionary {object index: {'error': [...], 'warning': [...]}}, for the objects with at least one message
+        """
+        reports = {}
+
+        def add_error(index, msg):
+            report = reports.get(index)
+            if report is None:
+                report = reports[index] = {'error': [], 'warning': []}
+            report['error'].append(msg)
+
+        def add_warning(index, msg):
+            report = reports.get(index)
+            if report is None:
+                report = reports[index] = {'error': [], 'warning': []}
+            report['warning'].append(msg)
+
+        self.check_not_null(add_error)
+        self.check_format(add_error, add_warning)
+        self.check_extra(add_error, add_warning)
+        return reports
+
+
+    def check_not_null(self, add_error):
+        type = self.type
+        for field, column_label in self.plan.mandatory_checks:
+            column = self.column(field)
+            for index in [ index for index, value in enumerate(column) if value is MISSING ]:
+                add_error(index, 'Mandatory data from '+type+" column '"+column_label+"' is missing")
+            for index in [ index for index, value in enumerate(column) if value is None or value == 'None' ]:
+                add_error(index, type+" column '"+column_label+"' can't be null in the "+type+" object")
+
+
+    def check_format(self, add_error, add_warning):
+        type = self.type
+        max_length = GenericValidator.error_value_max_length
+        for field, column_label, column_type_label, is_correct_format in self.plan.format_checks:
+            # Non empty values of the column, as strings
+            values = [ (index, str(value)) for index, value in enumerate(self.column(field)) if value is not MISSING and value is not None ]
+            values = [ (index, value) for index, value in values if value != 'None' ]
+            if not values:
+                continue
+            # Failing rows only
+            for index, value in [ (index, value) for index, value in values if value.startswith(whitespaces) or value.endswith(whitespaces) ]:
+                add_warning(index, f'The content of the {type} column \'{field}\' (i.e.: "{value}") has leading and/or trailing whitespaces.')
+            if is_correct_format:
+                for index, value in [ (index, value) for index, value in values if not is_correct_format(value) ]:
+                    error_value = value
+                    if len(error_value) > max_length:
+                        error_value = error_value[0:max_length]+'...'
+                    add_error(index, f'The content of the {type} column \'{column_label}\' (i.e.: "{error_value}") is not in the required format/type ({column_type_label}) or has unexpected special character(s).')
+
+
+    def check_extra(self, add_error, add_warning):
+        """ Checks specific to the type of objects (implemented in subclasses). """
+        pass
+
+
+    def reports(self):
+        """ Run the checks and return the list of (row ID, check report) of the failing objects, in the order of the objects. """
+        reports = self.check()
+        return [ (self.row_ids[index], reports[index]) for index in sorted(reports) ]
@@ -1,9 +1,10 @@
 from validator.generic import GenericValidator
+from validator.columns import ColumnBatch
 
 class Demographic():
 
-    def check_data(self, fields_infos):
-        validator = DemographicValidator(self, fields_infos, [])
+    def check_data(self, fields_infos, plan=None):
+        validator = DemographicValidator(self, fields_infos, (), plan=plan)
         validator.check_not_null()
         validator.check_format()
         return validator.report
@@ -11,5 +12,14 @@ class Demographic():
 
 class DemographicValidator(GenericValidator):
 
-    def __init__(self, object, fields_infos, mandatory_fields, type="Demographic"):
-        super().__init__(object, fields_infos, mandatory_fields, type)
+    def __init__(self, object, fields_infos, mandatory_fields, type="Demographic", plan=None):
+        super().__init__(object, fields_infos, mandatory_fields, type, plan)
+
+
+class DemographicColumns(ColumnBatch):
+    """ Demographic objects of a spreadsheet, validated column by column (see ColumnBatch). """
+
+    type = 'Demographic'
+
+    def __init__(self, fields_infos, plan=None):
+        super().__init__(fields_infos, (), plan=plan)
@@ -1,4 +1,4 @@
-from validator.request.connector import Connector, ConnectorException
+from validator.request.connector import Connector, ConnectorException, ServiceNotWorking
 
 
 class EFOTrait():
@@ -8,10 +8,13 @@ class EFOTrait():
         self.label = None
 
     def populate_from_efo(self, connector: Connector):
+        """ Fetch the trait label from EFO. A ServiceNotWorking exception is raised if the trait can't be checked. """
         try:
             response = connector.get_efo_trait(self.id)
             self.label = response['label']
             return True
+        except ServiceNotWorking:
+            raise
         except ConnectorException as e:
             connector.logger.debug(e, __name__)
             return False
@@ -1,11 +1,24 @@
+import logging
 import re
 
+from openpyxl.utils.cell import column_index_from_string
+
+# Maximum number of cells read to calculate a formula (including the cells of the ranges and of the nested formulas)
+MAX_FORMULA_CELLS = 100000
+
+# Tokens of the supported formulas: numbers, cell IDs (e.g. B2, AB12, $B$2), functions (e.g. SUM), operators and separators
+formula_token = re.compile(r'\s*(?:(?P<number>\d+(?:\.\d*)?)|(?P<function>[A-Z]+)\(|\$?(?P<column>[A-Z]{1,3})\$?(?P<row>\d+)|(?P<symbol>[-+:,;)]))')
+
+
+class FormulaError(Exception):
+    """ Formula which can't be calculated (unsupported syntax, circular reference, non numeric cell...). """
+    pass
+
 
 class Formula():
-    """ Class parsing and calculating simple Excel formulas (sum). """
+    """ Class calculating simple Excel formulas (additions, subtractions and sums), with the formula evaluator of its spreadsheet. """
 
     is_parsed = False
-    alpha = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
 
     def __init__(self, spreadsheet, cell_data):
         self.spreadsheet = spreadsheet
@@ -14,143 +27,306 @@ class Formula():
 
 
     def formula2number(self):
-        """ 
-        Use different parser to find and calculate the formula
-        Return: calculated value (integer)
         """
-        self.parse_numeric_formula()
-        if not self.is_parsed:
-            self.parse_simple_formula()
-        if not self.is_parsed:
-            self.parse_sum_formula()
-
+        Calculate the formula (the formula is returned unchanged if it can't be calculated)
+        Return: calculated value (number)
+        """
+        try:
+            self.calculated_value = get_formula_evaluator(self.spreadsheet).evaluate(self.cell_data)
+            self.is_parsed = True
+        except FormulaError:
+            # Logged by the evaluator, the value is reported as not parsable by the validator
+            pass
         return self.calculated_value
 
 
-    def parse_numeric_formula(self):
-        """ Parse the formulas of the type: =251+42, =251-42, =251+42-25 """
-        try:
-            cells = re.split(r'[+-]', self.cell_data)
-            regex_base = r'^\=(?P<cell_1>\d+)'
-            regex_formula = regex_base
-            if len(cells) > 1:
-                regex_formula = regex_formula+r'(?P<operator_1>\-|\+)(?P<cell_2>\d+)'
-                # e.g. =251+42-25
-                if len(cells) > 2:
-                    for idx in range(2,len(cells)):
-                        next_idx = idx + 1
-                        regex_formula = regex_formula+fr'(?P<operator_{idx}>\-|\+)(?P<cell_{next_idx}>\d+)'
-            regex_formula = regex_formula+'$'
-            m = re.match(regex_formula, self.cell_data)
-
-            if m:
-                val_a = 0
-                if len(cells) == 1:
-                    val_a = int(m.group(f'cell_1'))
-                else:
-                    last_idx = None
-                    for idx in range(1,len(cells)):
-                        next_cell = idx+1
-                        operator = m.group(f'operator_{idx}')
-                        if last_idx != idx:
-                            val_a = m.group(f'cell_{idx}')
-                        val_b = m.group(f'cell_{next_cell}')
-                        last_idx = next_cell
-                        if operator == '-':
-                            val_a = int(val_a) - int(val_b)
-                        elif operator == '+':
-                            val_a = int(val_a) + int(val_b)
-                self.calculated_value = val_a
-                if isinstance(self.calculated_value, int):
-                    self.is_parsed = True
-        except Exception as e:
-            print(f"###### Cell value '{self.cell_data}' is not numeric: {e}")
-
-
-
-    def parse_simple_formula(self):
-        """ Parse the formulas of the type: =B1+C1, =B1-C1, =B1+C1+D1 """
-        print(f"!!!! {self.cell_data} -> parse_simple_formula")
-        cells = re.split(r'[+-]', self.cell_data)
-        regex_base = r'^\=(?P<first_cell>\w\d+)(?P<operator>\-|\+)(?P<second_cell>\w\d+)'
-        m = None
-        # e.g. =B1+C1
-        if len(cells) == 2:
-            m = re.match(regex_base+'$', self.cell_data)
-        # e.g. =B1+C1+D1
-        elif len(cells) == 3:
-            m = re.match(regex_base+r'(?P<operator2>[-+])(?P<third_cell>\w\d+)$', self.cell_data)
-
-        if m:
-            first_cell  = self.get_cell_value(m.group('first_cell'))
-            second_cell = self.get_cell_value(m.group('second_cell'))
-            operator = m.group('operator')
-            if operator == '-':
-                self.calculated_value = int(first_cell) - int(second_cell)
-            elif operator == '+':
-                self.calculated_value = int(first_cell) + int(second_cell)
-            # e.g. =B1+C1+D1
-            if len(cells) == 3:
-                third_cell = self.get_cell_value(m.group('third_cell'))
-                operator2 = m.group('operator2')
-                if operator2 == '-':
-                    self.calculated_value = self.calculated_value - int(third_cell)
-                else:
-                    self.calculated_value = self.calculated_value + int(third_cell)
-            if isinstance(self.calculated_value, int):
-                self.is_parsed = True
-
-
-    def parse_sum_formula(self):
-        """ Parse the formulas of the type: =SUM(B1:C1), =SUM(B1:C2), =SUM(B1-C2), =SUM(B1+C2) """
-        m = re.match(r'^=SUM\((?P<first_col>\w)(?P<first_row>\d+)(?P<operator>[-+:])(?P<last_col>\w)(?P<last_row>\d+)\)$', self.cell_data)
-        if m:
-            first_col = m.group('first_col')
-            last_col = m.group('last_col')
-            first_index = self.alpha.index(first_col)
-            last_index = self.alpha.index(last_col)
-            first_row = int(m.group('first_row'))
-            last_row = int(m.group('last_row'))
-            operator = m.group('operator')
-            # Range of cells
-            if operator == ':':
-                current_col = self.alpha[first_index]
-                current_index = first_index
-                tmp_calculated_value = 0
-                while current_index <= last_index:
-                    current_row = first_row
-                    while current_row <= last_row:
-                        cell_val = self.get_cell_value(current_col+str(current_row))
-                        if cell_val:
-                            tmp_calculated_value += cell_val
-                        current_row += 1
-                    current_index = self.alpha.index(current_col)+1
-                    if current_index <= last_index:
-                        current_col = self.alpha[current_index]
-                self.calculated_value = tmp_calculated_value
-            # Operation between 2 cells (addition of substraction)
-            else:
-                first_cell  = self.get_cell_value(f'{first_col}{first_row}')
-                second_cell = self.get_cell_value(f'{last_col}{last_row}')
-                if operator == '-':
-                    self.calculated_value = int(first_cell) - int(second_cell)
-                elif operator == '+':
-                    self.calculated_value = int(first_cell) + int(second_cell)
-            if isinstance(self.calculated_value, int):
-                self.is_parsed = True
+class FormulaEvaluator():
+    """
+    Calculate the formulas of a spreadsheet, with the syntax: =251+42-25, =B1+C1-D1, =SUM(B1:C2), =SUM(B1-C2), =SUM(A1,AB3:AC4)+B2
+    - Each formula is tokenized in a single pass and its result is cached, as well as the value of each formula cell.
+    - The cells referenced by each formula cell are stored (dependency graph), to calculate the nested formulas
+      without recursion (dependencies first) and to detect the circular references.
+    - The number of cells read to calculate a formula is capped (max_cells).
+    As with the previous parsers, a formula can't be calculated if one of its cells is empty (the empty cells of the ranges are skipped),
+    and the whole number results are integers. Unlike them, the decimal values are kept (they were truncated to integers).
+    """
+
+    def __init__(self, spreadsheet, max_cells=MAX_FORMULA_CELLS):
+        self.spreadsheet = spreadsheet
+        self.max_cells = max_cells
+        # Parsed expressions and results, indexed by formula
+        self.expressions = {}
+        self.results = {}
+        # Values (or FormulaError) of the cells, indexed by (row, column)
+        self.cell_values = {}
+        # Cells referenced by the formula cells
+        self.dependencies = {}
 
 
-    def get_cell_value(self,cell_id):
+    def evaluate(self, formula):
+        """ Calculate a formula (string starting with '='). Raise a FormulaError if it can't be calculated. """
+        result = self.results.get(formula)
+        if result is None:
+            try:
+                expression = self.parse(formula)
+                self.resolve(references(expression))
+                result = compute(expression, self.cell_values)
+                if isinstance(result, float) and result.is_integer():
+                    result = int(result)
+            except FormulaError as e:
+                logger = logging.getLogger(__name__)
+                logger.warning(f"Can't calculate the formula '{formula}' of the spreadsheet '{self.spreadsheet.title}': {e}")
+                result = e
+            self.results[formula] = result
+        if isinstance(result, FormulaError):
+            raise result
+        return result
+
+
+    def parse(self, formula):
         """
-        Extract the cell value, using a workbook spreadsheet and a cell ID (e.g. B2).
-        Make recursive calls to 'formula2number()' if the cell's value is a formula itself.
+        Parse a formula into an expression: list of (sign, operand), the operand being a number, a cell (row, column),
+        a range of cells (first row, first column, last row, last column) or a SUM (list of expressions).
         """
-        if re.search(r'^\w\d+$', cell_id):
-            cell_value = self.spreadsheet[cell_id].value
-            # Check if the cell value is also a formula. If so, we calculate the value.
-            if re.search(r'^=', str(cell_value)):
-                cell_subformula = Formula(self.spreadsheet, cell_value)
-                cell_value = cell_subformula.formula2number()
-            return cell_value
+        expression = self.expressions.get(formula)
+        if expression is None:
+            expression = FormulaParser(str(formula), self.max_cells).parse()
+            self.expressions[formula] = expression
+        return expression
+
+
+    def resolve(self, cells):
+        """ Calculate the value of the given cells and of all the formula cells they depend on, dependencies first. """
+        cell_values = self.cell_values
+        read_cells = 0
+        # Formula cells whose dependencies are being calculated
+        in_progress = set()
+        stack = [ cell for cell in reversed(cells) if cell not in cell_values ]
+        while stack:
+            cell = stack[-1]
+            if cell in cell_values:
+                stack.pop()
+                continue
+            if cell in in_progress:
+                # All the dependencies have been calculated
+                stack.pop()
+                in_progress.discard(cell)
+                try:
+                    cell_values[cell] = compute(self.parse(self.spreadsheet.get_value(*cell)), cell_values)
+                except FormulaError as e:
+                    cell_values[cell] = e
+                continue
+
+            read_cells += 1
+            if read_cells > self.max_cells:
+                raise FormulaError(f'more than {self.max_cells} cells are needed to calculate the formula')
+            value = self.spreadsheet.get_value(*cell)
+            if not is_formula(value):
+                stack.pop()
+                cell_values[cell] = value
+                continue
+            try:
+                cell_references = references(self.parse(value))
+            except FormulaError as e:
+                stack.pop()
+                cell_values[cell] = e
+                continue
+            self.dependencies[cell] = cell_references
+            in_progress.add(cell)
+            for dependency in cell_references:
+                if dependency in in_progress:
+                    error = FormulaError(f'circular reference between the cells {cell_id(cell)} and {cell_id(dependency)}')
+                    # All the cells being calculated depend on the circular reference
+                    for cell_in_progress in in_progress:
+                        cell_values[cell_in_progress] = error
+                    raise error
+                if dependency not in cell_values:
+                    stack.append(dependency)
+
+
+class FormulaParser():
+    """ Recursive descent parser of a formula, from its tokens. """
+
+    def __init__(self, formula, max_cells=MAX_FORMULA_CELLS):
+        self.formula = formula
+        self.max_cells = max_cells
+        self.tokens = tokenize(formula)
+        self.position = 0
+
+
+    def parse(self):
+        expression = self.parse_expression()
+        if self.position < len(self.tokens):
+            raise FormulaError(f"unexpected '{self.tokens[self.position][1]}' in the formula")
+        return expression
+
+
+    def next_token(self):
+        if self.position < len(self.tokens):
+            token = self.tokens[self.position]
+            self.position += 1
+            return token
+        raise FormulaError('incomplete formula')
+
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return (None, None)
+
+
+    def parse_expression(self):
+        """ expression: [+-] operand ([+-] operand)* """
+        expression = []
+        sign = 1
+        if self.peek() in (('symbol', '+'), ('symbol', '-')):
+            sign = 1 if self.next_token()[1] == '+' else -1
+        expression.append((sign, self.parse_operand()))
+        while self.peek() in (('symbol', '+'), ('symbol', '-')):
+            sign = 1 if self.next_token()[1] == '+' else -1
+            expression.append((sign, self.parse_operand()))
+        return expression
+
+
+    def parse_operand(self):
+        """ operand: number | cell | SUM(argument (, argument)*), an argument being a range of cells or an expression """
+        token_type, value = self.next_token()
+        if token_type == 'number':
+            return value
+        if token_type == 'cell':
+            if self.peek() == ('symbol', ':'):
+                raise FormulaError('ranges of cells are only supported in the SUM function')
+            return ('cell', value)
+        if token_type == 'function':
+            if value != 'SUM':
+                raise FormulaError(f"unsupported function '{value}'")
+            arguments = [self.parse_argument()]
+            while self.peek() in (('symbol', ','), ('symbol', ';')):
+                self.next_token()
+                arguments.append(self.parse_argument())
+            if self.next_token() != ('symbol', ')'):
+                raise FormulaError('missing closing parenthesis')
+            return ('sum', arguments)
+        raise FormulaError(f"unexpected '{value}' in the formula")
+
+
+    def parse_argument(self):
+        token_type, value = self.peek()
+        if token_type == 'cell' and self.tokens[self.position+1:self.position+2] == [('symbol', ':')]:
+            self.position += 2
+            token_type, last_cell = self.next_token()
+            if token_type != 'cell':
+                raise FormulaError('incomplete range of cells')
+            first_row, last_row = sorted((value[0], last_cell[0]))
+            first_col, last_col = sorted((value[1], last_cell[1]))
+            if (last_row - first_row + 1) * (last_col - first_col + 1) > self.max_cells:
+                raise FormulaError(f'the range of cells has more than {self.max_cells} cells')
+            return [(1, ('range', (first_row, first_col, last_row, last_col)))]
+        return self.parse_expression()
+
+
+def tokenize(formula):
+    """ Split a formula (e.g. '=SUM(B1:C2)+D2') into a list of (token type, value) in a single pass. """
+    if not formula.startswith('='):
+        raise FormulaError('not a formula')
+    formula = formula.upper()
+    tokens = []
+    position = 1
+    length = len(formula.rstrip())
+    while position < length:
+        m = formula_token.match(formula, position)
+        if not m:
+            raise FormulaError(f"unsupported syntax '{formula[position:].strip()}'")
+        position = m.end()
+        if m.group('number'):
+            number = m.group('number')
+            tokens.append(('number', float(number) if '.' in number else int(number)))
+        elif m.group('function'):
+            tokens.append(('function', m.group('function')))
+        elif m.group('column'):
+            tokens.append(('cell', (int(m.group('row')), column_index_from_string(m.group('column')))))
         else:
-            return None
\ No newline at end of file
+            tokens.append(('symbol', m.group('symbol')))
+    if not tokens:
+        raise FormulaError('empty formula')
+    return tokens
+
+
+def references(expression):
+    """ List of the cells (row, column) referenced by an expression. """
+    cells = []
+    for _, operand in expression:
+        if type(operand) is tuple:
+            operand_type, value = operand
+            if operand_type == 'cell':
+                cells.append(value)
+            elif operand_type == 'range':
+                first_row, first_col, last_row, last_col = value
+                cells.extend((row, col) for row in range(first_row, last_row+1) for col in range(first_col, last_col+1))
+            else:
+                for argument in value:
+                    cells.extend(references(argument))
+    return cells
+
+
+def compute(expression, cell_values):
+    """ Calculate an expression, the values of the referenced cells being already calculated. """
+    result = 0
+    for sign, operand in expression:
+        if type(operand) is tuple:
+            operand_type, value = operand
+            if operand_type == 'cell':
+                operand = to_number(cell_values.get(value), value)
+            elif operand_type == 'range':
+                first_row, first_col, last_row, last_col = value
+                # The empty cells of a range are skipped
+                operand = 0
+                for row in range(first_row, last_row+1):
+                    for col in range(first_col, last_col+1):
+                        cell_value = cell_values.get((row, col))
+                        if cell_value is not None and cell_value != '':
+                            operand += to_number(cell_value, (row, col))
+            else:
+                operand = sum(compute(argument, cell_values) for argument in value)
+        result += sign * operand
+    return result
+
+
+def to_number(value, cell):
+    """ Numeric value of a cell. """
+    if isinstance(value, (int, float)):
+        return value
+    if value is None or value == '':
+        raise FormulaError(f'the cell {cell_id(cell)} is empty')
+    if isinstance(value, FormulaError):
+        raise value
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise FormulaError(f"the cell {cell_id(cell)} is not numeric (i.e.: '{value}')")
+
+
+def is_formula(value):
+    return isinstance(value, str) and value.startswith('=')
+
+
+def cell_id(cell):
+    """ Cell ID (e.g. B2) from its (row, column). """
+    row, col = cell
+    letters = ''
+    while col > 0:
+        col, remainder = divmod(col - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return f'{letters}{row}'
+
+
+def get_formula_evaluator(spreadsheet):
+    """ Return the formula evaluator of a spreadsheet (created on the first request). """
+    evaluator = spreadsheet.formula_evaluator
+    if evaluator is None:
+        evaluator = spreadsheet.formula_evaluator = FormulaEvaluator(spreadsheet)
+    return evaluator
@@ -13,11 +13,13 @@ class GenericValidator():
 
     error_value_max_length = 25
 
-    def __init__(self, object, fields_infos, mandatory_fields, type):
+    def __init__(self, object, fields_infos, mandatory_fields, type, plan=None):
         self.object = object
         self.type = type
         self.fields_infos = fields_infos
         self.mandatory_fields = mandatory_fields
+        # Compiled checks of the fields (e.g. TemplateSchema.check_plans), compiled here if not provided
+        self.plan = plan or CheckPlan(fields_infos, mandatory_fields)
         self.report = {'error': [], 'warning': []}
 
 
@@ -28,57 +30,26 @@ class GenericValidator():
         self.report['warning'].append(msg)
 
     def check_not_null(self):
-        object_attrs = self.object.__dict__.keys()
-        for field in self.mandatory_fields:
-            if field.startswith('__'):
-                continue
-            column_label = self.fields_infos[field]['label']
+        object_attrs = self.object.__dict__
+        for field, column_label in self.plan.mandatory_checks:
             if not field in object_attrs:
                 self.add_error_report('Mandatory data from '+self.type+" column '"+column_label+"' is missing")
-            else:
-                column_data = str(getattr(self.object, field))
-                if column_data is None or column_data == 'None':
-                    self.add_error_report(self.type+" column '"+column_label+"' can't be null in the "+self.type+" object")
+            elif str(object_attrs[field]) == 'None':
+                self.add_error_report(self.type+" column '"+column_label+"' can't be null in the "+self.type+" object")
 
 
     def check_format(self):
-        object_attrs = self.object.__dict__.keys()
-        for field in self.fields_infos.keys():
-            column_label = self.fields_infos[field]['label']
+        object_attrs = self.object.__dict__
+        for field, column_label, column_type_label, is_correct_format in self.plan.format_checks:
             if field in object_attrs:
-                column_data = str(getattr(self.object, field))
-                #print("COLUMN "+column+": "+str(column_data)+" | TYPE: "+str(type(column_data)))
+                column_data = str(object_attrs[field])
                 # Skip empty columns
-                if column_data is not None and column_data != 'None':
-                    field_type = self.fields_infos[field]['type']
-                    is_correct_format = 0
-
+                if column_data != 'None':
                     # Check trailing spaces
                     column_data = self.check_whitespaces(field,column_data)
 
-                    if field_type in self.column_types:
-                        column_type_label = self.column_types[field_type]
-                    else:
-                        column_type_label = field_type
-
-                    if field_type == 'integer':
-                        # Also allow float finishing by .0 and .00
-                        if re.search(r'^-?\d+(?:\.0+)?$', column_data):
-                            is_correct_format = 1
-                    elif field_type == 'float':
-                        try:
-                            column_data = float(column_data)
-                            is_correct_format = 1
-                        except ValueError:
-                            is_correct_format = 0
-                    elif field_type == 'string':
-                        is_correct_format = 1
-                    else:
-                        if re.search(field_type, column_data):
-                            is_correct_format = 1
-
-                    if is_correct_format == 0:
-                        error_value = str(column_data)
+                    if is_correct_format and not is_correct_format(column_data):
+                        error_value = column_data
                         if len(error_value) > self.error_value_max_length:
                             error_value = error_value[0:self.error_value_max_length]+'...'
                         self.add_error_report(f'The content of the {self.type} column \'{column_label}\' (i.e.: "{error_value}") is not in the required format/type ({column_type_label}) or has unexpected special character(s).')
@@ -96,7 +67,52 @@ class GenericValidator():
 
     def check_whitespaces(self, label, c_data):
         """ Check trailing spaces/tabs and remove them """
-        if str(c_data).startswith((' ','\t')) or str(c_data).endswith((' ','\t')):
+        if c_data.startswith((' ','\t')) or c_data.endswith((' ','\t')):
             self.add_warning_report(f'The content of the {self.type} column \'{label}\' (i.e.: "{c_data}") has leading and/or trailing whitespaces.')
             c_data.strip(' \t')
         return c_data
+
+
+class CheckPlan():
+    """
+    Checks of a validator compiled from the schema of a spreadsheet or object (fields information and mandatory fields).
+    The type of each field is resolved once into a format check function, with its regular expression compiled,
+    so the validation of each object only runs the precomputed list of checks.
+    - mandatory_checks: list of (field, column label) of the mandatory fields
+    - format_checks: list of (field, column label, type label, format check function), the function being None when any value is accepted
+    """
+
+    __slots__ = ('mandatory_checks', 'format_checks')
+
+    def __init__(self, fields_infos, mandatory_fields):
+        self.mandatory_checks = tuple(
+            (field, fields_infos[field]['label']) for field in mandatory_fields if not field.startswith('__')
+        )
+        self.format_checks = tuple(
+            (field, infos['label'], GenericValidator.column_types.get(infos['type'], infos['type']), format_check(infos['type']))
+            for field, infos in fields_infos.items()
+        )
+
+
+integer_format = re.compile(r'^-?\d+(?:\.0+)?$')
+
+def is_float(value):
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
+
+def format_check(field_type):
+    """ Return the function checking the format of a value (string) for the given field type, or None for the strings. """
+    if field_type == 'string':
+        return None
+    if field_type == 'integer':
+        # Also allow float finishing by .0 and .00
+        return lambda value: integer_format.search(value) is not None
+    if field_type == 'float':
+        return is_float
+    # The type is a regular expression
+    field_format = re.compile(field_type)
+    return lambda value: field_format.search(value) is not None
+
@@ -0,0 +1,113 @@
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobQueueFull(Exception):
+    """The job can't be submitted: the maximum number of queued and running jobs has been reached."""
+
+
+class ResultStore():
+    """ Thread-safe store of the jobs. The finished jobs expire 'ttl' seconds after their completion. """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def add(self, job, max_active=None):
+        """ Add a job, unless there are already 'max_active' queued and running jobs. Return True if the job has been added. """
+        with self.lock:
+            self.purge()
+            if max_active is not None and self.count_active() >= max_active:
+                return False
+            self.jobs[job['job_id']] = job
+            return True
+
+    def get(self, job_id):
+        """ Return a copy of the job, or None if it doesn't exist or has expired. """
+        with self.lock:
+            self.purge()
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def update(self, job_id, **fields):
+        with self.lock:
+            if job_id in self.jobs:
+                self.jobs[job_id].update(fields)
+
+    def count(self, status):
+        """ Number of jobs with the given status. """
+        with self.lock:
+            return sum(1 for job in self.jobs.values() if job['status'] == status)
+
+    def count_active(self):
+        """ Number of queued and running jobs (the lock must be held). """
+        return sum(1 for job in self.jobs.values() if job['status'] in ('queued', 'running'))
+
+    def purge(self):
+        """ Delete the expired jobs (the lock must be held). """
+        expiry_time = time.time() - self.ttl
+        for job_id in [ job_id for job_id, job in self.jobs.items() if job.get('finished') and job['finished'] < expiry_time ]:
+            del self.jobs[job_id]
+
+
+class JobManager():
+    """
+    Run the validation jobs on a bounded pool of worker threads.
+    - max_workers: number of jobs running at the same time
+    - max_jobs: maximum number of queued and running jobs (new jobs are rejected above this limit)
+    - result_ttl: number of seconds the results are kept after the end of a job
+    """
+
+    def __init__(self, max_workers=2, max_jobs=20, result_ttl=3600):
+        self.max_jobs = max_jobs
+        self.store = ResultStore(result_ttl)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='validation')
+        self.events = {}
+        self.events_lock = threading.Lock()
+
+    def submit(self, function, *args):
+        """
+        Submit a job running function(*args). The result of the function must be JSON serialisable.
+        > Return: job ID
+        > Raise: JobQueueFull if the maximum number of jobs has been reached
+        """
+        job_id = uuid.uuid4().hex
+        if not self.store.add({'job_id': job_id, 'status': 'queued', 'submitted': time.time()}, max_active=self.max_jobs):
+            raise JobQueueFull(f'Too many validations in progress ({self.max_jobs}), try again later')
+        with self.events_lock:
+            self.events[job_id] = threading.Event()
+        self.executor.submit(self.run, job_id, function, args)
+        return job_id
+
+    def run(self, job_id, function, args):
+        self.store.update(job_id, status='running', started=time.time())
+        try:
+            result = function(*args)
+            self.store.update(job_id, status='done', result=result, finished=time.time())
+        except Exception as e:
+            self.store.update(job_id, status='error', error=f'{e.__class__.__name__}: {e}', traceback=traceback.format_exc(), finished=time.time())
+        finally:
+            with self.events_lock:
+                event = self.events.pop(job_id, None)
+            if event:
+                event.set()
+
+    def get(self, job_id):
+        """ Return the job (status, timestamps and result when finished), or None if it doesn't exist or has expired. """
+        return self.store.get(job_id)
+
+    def count(self, status):
+        """ Number of jobs with the given status (e.g. 'queued'). """
+        return self.store.count(status)
+
+    def wait(self, job_id, timeout):
+        """ Wait for the end of the job, at most 'timeout' seconds, and return the job. """
+        with self.events_lock:
+            event = self.events.get(job_id)
+        if event:
+            event.wait(timeout)
+        return self.get(job_id)
@@ -1,21 +1,34 @@
 import logging
-import os
 import re
+import threading
+import time
 import urllib.request
-from io import BytesIO
+from contextlib import contextmanager
 from urllib.error import HTTPError
 
 from openpyxl import load_workbook
 
-from validator.demographic import Demographic
+from validator.demographic import Demographic, DemographicColumns
 from validator.efotrait import EFOTrait
 from validator.formula import Formula
-from validator.metric import Metric
-from validator.performance import PerformanceMetric
+from validator.generic import CheckPlan
+from validator.metric import Metric, MetricColumns
+from validator.parsers import interval_format, parse_demographic, parse_metric
+from validator.performance import PerformanceColumns, PerformanceMetric
+from validator.phases import PHASE_WORKERS, Phase, PhaseScheduler
+from validator.preflight import PreflightError, inspect_workbook
+from validator.profiler import null_profiler
 from validator.publication import Publication
-from validator.request.connector import DefaultConnector, ConnectorException
-from validator.sample import Sample
+from validator.request.config import SERVICE_LABELS
+from validator.request.connector import DefaultConnector, ServiceNotWorking
+from validator.report import REPORT_CATEGORIES, ValidationReport
+from validator.request.prefetch import PrefetchedConnector, PREFETCH_WORKERS
+from validator.row_cache import ROW_CACHE_MIN_ROWS, has_formula
+from validator.sample import Sample, SampleColumns
+from validator.schema import file_checksum, freeze, get_template_schema, template_columns_schema_file, trim_column_label
 from validator.score import Score
+from validator.spreadsheet import RowSource
+from validator.storage import FileTooLarge, get_storage
 
 logger = logging.getLogger(__name__)
 
@@ -23,15 +36,8 @@ logger = logging.getLogger(__name__)
 #  General variables  #
 #---------------------#
 
-# Needed for parsing confidence intervals
-insquarebrackets = re.compile(r'\[([^\)]+)\]')  # this regex might give redundant character escape warning, but they are kept for clarity
-interval_format = r'^\-?\d+(e-|\.)?\d*\s\-\s\-?\d+(e-|\.)?\d*$'
-inparentheses = re.compile(r'\((.*)\)')
-
-template_columns_schema_file = os.path.join(os.path.dirname(__file__), '../templates/TemplateColumns2Models.xlsx')
-
-# Extra fields information (not present in the Excel template schema)
-metric_fields_infos = {
+# Extra fields information (not present in the Excel template schema), read-only like the schema
+metric_fields_infos = freeze({
     'name': {'type': 'string', 'label': 'Metric - name'},
     'name_short': {'type': 'string', 'label': 'Metric - short name'},
     'type': {'type': 'string', 'label': 'Metric - type'},
@@ -39,8 +45,8 @@ metric_fields_infos = {
     'unit': {'type': 'string', 'label': 'Metric - Unit data'},
     'se': {'type': 'float', 'label': 'Metric - Standard error value'},
     'ci': {'type': interval_format, 'label': 'Metric - Confidence interval'},
-}
-demographic_age_fields_infos = {
+})
+demographic_age_fields_infos = freeze({
     'estimate': {'type': 'float', 'label': 'Age - Value'},
     'estimate_type': {'type': 'string', 'label': 'Age - Value type'},
     'unit': {'type': 'string', 'label': 'Age - Unit'},
@@ -48,8 +54,8 @@ demographic_age_fields_infos = {
     'range_type': {'type': 'string', 'label': 'Age - Range type'},
     'variability': {'type': 'float', 'label': 'Age - Variablility'},
     'variability_type': {'type': 'string', 'label': 'Age - Variablility type'}
-}
-demographic_followup_fields_infos = {
+})
+demographic_followup_fields_infos = freeze({
     'estimate': {'type': 'float', 'label': 'Follow up Time - Value'},
     'estimate_type': {'type': 'string', 'label': 'Follow up Time - Value type'},
     'unit': {'type': 'string', 'label': 'Follow up Time - Unit'},
@@ -57,7 +63,13 @@ demographic_followup_fields_infos = {
     'range_type': {'type': 'string', 'label': 'Follow up Time - Range type'},
     'variability': {'type': 'float', 'label': 'Follow up Time - Variablility'},
     'variability_type': {'type': 'string', 'label': 'Follow up Time - Variablility type'}
-}
+})
+
+
+# Compiled checks of the extra fields (see validator.generic.CheckPlan)
+metric_check_plan = CheckPlan(metric_fields_infos, Metric.mandatory_fields)
+demographic_age_check_plan = CheckPlan(demographic_age_fields_infos, ())
+demographic_followup_check_plan = CheckPlan(demographic_followup_fields_infos, ())
 
 
 class ReportError(Exception):
@@ -66,10 +78,42 @@ class ReportError(Exception):
 
 class PGSMetadataValidator():
 
-    def __init__(self, filepath, is_remote, connector=DefaultConnector()):
+    def __init__(self, filepath, is_remote, connector=DefaultConnector(), streaming=True, profiler=None, row_cache=None, result_cache=None, reuse_result=True, phase_workers=PHASE_WORKERS, storage=None, max_errors=None, fail_fast=False, skipped_services=()):
         self.filepath = filepath
         self.is_remote = is_remote
+        # Storage of the remote files (default: storage shared by the process, see validator/storage.py)
+        self.storage = storage
         self.connector = connector
+        # Instrumentation of the validation (nothing is recorded by default, see validator/profiler.py)
+        self.profiler = profiler or null_profiler
+        # External lookups of this validation: each identifier is resolved once (see prefetch_external_data).
+        # The lookups of the 'skipped_services' (e.g. known to be down, see validator/request/health.py) are reported as unverified
+        self.lookups = PrefetchedConnector(connector, self.profiler, skipped_services)
+        # Streaming mode: the workbook is loaded in read-only mode and its rows are iterated without being kept in memory
+        self.streaming = streaming
+        # Incremental validation: results of the rows validated previously (see validator/row_cache.py)
+        self.row_cache = row_cache
+        # Results of the files validated previously (see validator/result_cache.py), reused unless 'reuse_result' is False (the new result is still stored)
+        self.result_cache = result_cache
+        self.reuse_result = reuse_result
+        # SHA-256 checksum and alias (e.g. MD5 checksum from the Google Cloud Storage) of the file content, and result read from the cache
+        self.file_checksum = None
+        self.file_alias = None
+        self.cached_result = False
+        # Maximum number of independent validation phases run at the same time (see validate)
+        self.phase_workers = phase_workers
+        # Early stop of the validation (partial report, marked as truncated): after 'max_errors' errors,
+        # or after the first critical error (e.g. empty spreadsheet) in fail-fast mode
+        self.max_errors = max_errors
+        self.fail_fast = fail_fast
+        self.errors_count = 0
+        self.errors_count_lock = threading.Lock()
+        self.truncated = False
+        self.workbook = None
+        # Downloaded remote file, read by the workbook until it is closed
+        self.downloaded_file = None
+        # Description of the workbook read before loading it (see validator/preflight.py), e.g. estimated number of rows per spreadsheet
+        self.workbook_info = None
         self.parsed_publication = None
         self.parsed_scores = {}
         self.parsed_efotraits = {}
@@ -78,35 +122,55 @@ class PGSMetadataValidator():
         self.parsed_performances = {}
         self.parsed_samplesets = []
         self.cohorts_list = []
+        # External services which couldn't be reached during the validation (degraded mode)
+        self.unavailable_services = set()
+        self.unverified_samples_scores = 0
         self.template_columns_schema_file = template_columns_schema_file
+        self.schema = None
         self.table_mapschema = {}
         self.fields_infos = {}
         self.mandatory_fields = {}
-        self.report = { 'error': {}, 'warning': {} }
+        self.report = ValidationReport()
+        # Report of the current thread, when its messages are stored in a separate report (see reporting_to)
+        self.thread_report = threading.local()
         self.spreadsheet_names = {}
+        self.phase_timings = {}
+        self.duration = 0
         self.scores_spreadsheet_onhold = { 'is_empty': False, 'label': '', 'error_msg': None, 'has_pgs_ids': False, 'has_testing_samples': False }
 
 
     def load_workbook_from_url(self):
         """
-        Load the Excel spreadsheet into an openpyxl workbook
+        Load the Excel spreadsheet into an openpyxl workbook, from the storage of the uploaded files (Google Cloud Storage by default)
         > Return type: openpyxl workbooks
         """
-        from google.cloud import storage
         workbook = None
         try:
-            # Google cloud storage
-            storage_client = storage.Client.from_service_account_json(os.environ['GS_SERVICE_ACCOUNT_SETTINGS'])
-            # Fetch the required bucket
-            bucket = storage_client.get_bucket(os.environ['GS_BUCKET_NAME'])
-            # Fetch the data file object ("blob")
-            blob = bucket.get_blob(self.filepath)
+            storage = self.storage or get_storage()
+            # Fetch the metadata of the file
+            stored_file = storage.get_file(self.filepath)
             # Download the file content
-            if blob:
-                data = blob.download_as_bytes()
-                workbook = load_workbook(filename=BytesIO(data))
+            if stored_file:
+                # Result of the same file validated previously, found without downloading the file
+                if stored_file.md5_hash:
+                    self.file_alias = f'{storage.name}_md5:{stored_file.md5_hash}'
+                    if self.load_cached_result():
+                        return None
+                with self.profiler.timer('download'):
+                    self.downloaded_file = storage.download(stored_file)
+                self.profiler.count('workbook_bytes', self.downloaded_file.size)
+                if self.result_cache:
+                    self.file_checksum = self.downloaded_file.sha256
+                    if self.load_cached_result():
+                        return None
+                if not self.inspect_workbook(self.downloaded_file.file):
+                    return None
+                with self.profiler.timer('load_workbook'):
+                    workbook = load_workbook(filename=self.downloaded_file.file, read_only=self.streaming)
             else:
                 self.report_error('General',None,'Can\'t find the uploaded file')
+        except FileTooLarge as e:
+            self.report_error('General',None,str(e))
         except urllib.error.HTTPError as e:
             if e.code == 404:
                 msg = 'The upload of the file failed'
@@ -122,6 +186,106 @@ class PGSMetadataValidator():
     #  Main parsing methods  #
     #========================#
 
+    def validate(self):
+        """
+        Run all the validation phases: loading of the workbook, prefetch of the external data, parsing of the spreadsheets and post parsing checks.
+        Once the workbook is loaded, the phases are run in the order of their inputs, the independent phases being run concurrently (see PhaseScheduler).
+        The messages of each phase are stored in a separate report, merged in the order of the phases, so the report doesn't depend on the scheduling.
+        The duration of each phase is stored in 'phase_timings' (in seconds).
+        If the same file has been validated previously (result cache), its stored report is used instead ('cached_result' is True).
+        > Return: True if the workbook has been loaded and parsed, or its result found in the result cache
+        """
+        phases = [
+            Phase('prefetch', self.prefetch_external_data),
+            Phase('cohorts', self.parse_cohorts),
+            # Publication and EFO traits lookups
+            Phase('publication', self.parse_publication, requires=('prefetch',)),
+            Phase('scores', self.parse_scores, requires=('prefetch',)),
+            # Score names
+            Phase('performances', self.parse_performances, requires=('scores',)),
+            # Score names, cohorts, sample sets (Performance Metrics spreadsheet) and GWAS Studies lookups
+            Phase('samples', self.parse_samples, requires=('prefetch', 'scores', 'cohorts', 'performances')),
+            Phase('post_parsing_checks', self.post_parsing_checks, requires=('scores', 'performances', 'samples'))
+        ]
+        phases_reports = { phase.name: ValidationReport() for phase in phases }
+        # The phases are run sequentially when the validation can be stopped early, so the partial report doesn't depend on the scheduling
+        phase_workers = 1 if self.max_errors or self.fail_fast else self.phase_workers
+
+        def run_phase(phase):
+            # The remaining phases (and their external lookups) are skipped once the validation is stopped
+            if self.truncated:
+                return
+            with self.reporting_to(phases_reports[phase.name]):
+                self.run_phase(phase.name, phase.function)
+
+        # Lookup cache counters (e.g. CachedConnector), to report the cache hits of this validation
+        cache_stats = self.connector.stats() if self.profiler.enabled and hasattr(self.connector, 'stats') else None
+        start_time = time.perf_counter()
+        try:
+            if not self.run_phase('load', self.parse_spreadsheets):
+                return self.cached_result
+            try:
+                PhaseScheduler(phases, phase_workers).run(run_phase)
+            finally:
+                for phase in phases:
+                    self.report.merge(phases_reports[phase.name])
+                self.report.truncated = self.truncated
+                self.phase_timings = { name: self.phase_timings[name] for name in ['load'] + [ phase.name for phase in phases ] if name in self.phase_timings }
+            self.store_result()
+        finally:
+            self.duration = time.perf_counter() - start_time
+            self.close()
+            if cache_stats:
+                # The cache can be shared by concurrent validations: the difference is an upper bound
+                for counter, value in self.connector.stats().items():
+                    if counter in ('hits', 'negative_hits', 'misses', 'errors'):
+                        self.profiler.count(f'lookup_cache.{counter}', value - cache_stats[counter])
+        return True
+
+
+    def load_cached_result(self):
+        """ Look for the result of the file (from its checksum, or its alias if the checksum is unknown) in the result cache. Return True if found. """
+        if not self.result_cache or not self.reuse_result:
+            return False
+        if self.file_checksum:
+            result = self.result_cache.get(self.file_checksum, self.schema.checksum)
+        else:
+            result = self.result_cache.get_by_alias(self.file_alias, self.schema.checksum)
+        if result is None:
+            self.profiler.count('result_cache.misses')
+            return False
+        self.profiler.count('result_cache.hits')
+        self.report = ValidationReport.from_data(result['report'])
+        self.cached_result = True
+        return True
+
+
+    def store_result(self):
+        """ Store the result of the validation in the result cache (not if some checks were skipped: external service unavailable or validation stopped early). """
+        if self.result_cache and self.file_checksum and not self.unavailable_services and not self.truncated:
+            self.result_cache.put(self.file_checksum, self.schema.checksum, {'report': self.report.to_data()}, alias=self.file_alias)
+
+
+    def timings(self):
+        """
+        Instrumentation data of the validation: duration of each phase, timed calls (workbook loading, external lookups, formulas...) and counters.
+        The calls and counters are only recorded when the validator has a profiler (see validator/profiler.py).
+        > Return: dictionary (JSON serialisable)
+        """
+        timings = {'total': self.duration, 'phases': dict(self.phase_timings)}
+        timings.update(self.profiler.to_dict())
+        return timings
+
+
+    def run_phase(self, name, phase):
+        """ Run a validation phase and store its duration. """
+        start_time = time.perf_counter()
+        try:
+            return phase()
+        finally:
+            self.phase_timings[name] = time.perf_counter() - start_time
+
+
     def parse_spreadsheets(self):
         """ReadCuration takes as input the location of a study metadata file"""
 
@@ -134,9 +298,17 @@ class PGSMetadataValidator():
             if self.is_remote:
                 workbook = self.load_workbook_from_url()
             else:
-                workbook = load_workbook(loc_excel, data_only=True)
+                if self.result_cache:
+                    self.file_checksum = file_checksum(loc_excel)
+                    if self.load_cached_result():
+                        return False
+                if not self.inspect_workbook(loc_excel):
+                    return False
+                with self.profiler.timer('load_workbook'):
+                    workbook = load_workbook(loc_excel, read_only=self.streaming, data_only=True)
 
             if workbook:
+                self.workbook = workbook
                 loaded_spreadsheets = True
 
                 #print(str(workbook.sheetnames))
@@ -149,59 +321,118 @@ class PGSMetadataValidator():
                         self.report_error('General',None,msg)
                         return False
 
-                self.workbook_publication = workbook[self.spreadsheet_names['Publication']]
+                self.workbook_publication = RowSource(workbook[self.spreadsheet_names['Publication']], self.profiler)
 
-                self.workbook_scores = workbook[self.spreadsheet_names['Score']]
+                self.workbook_scores = RowSource(workbook[self.spreadsheet_names['Score']], self.profiler)
 
-                self.workbook_samples = workbook[self.spreadsheet_names['Sample']]
+                self.workbook_samples = RowSource(workbook[self.spreadsheet_names['Sample']], self.profiler)
 
-                self.workbook_performances = workbook[self.spreadsheet_names['Performance']]
+                self.workbook_performances = RowSource(workbook[self.spreadsheet_names['Performance']], self.profiler)
 
-                self.workbook_cohorts = workbook[self.spreadsheet_names['Cohort']]
+                self.workbook_cohorts = RowSource(workbook[self.spreadsheet_names['Cohort']], self.profiler)
 
         return loaded_spreadsheets
 
 
+    def inspect_workbook(self, file):
+        """
+        Pre-flight inspection of the file (see validator/preflight.py), to reject in a few milliseconds the files which can't be validated
+        (e.g. not a xlsx file, missing spreadsheet, wrong template) before loading the workbook.
+        > Return: True if the workbook can be loaded, otherwise False (the error is reported)
+        """
+        try:
+            with self.profiler.timer('preflight'):
+                self.workbook_info = inspect_workbook(file, self.schema)
+        except PreflightError as e:
+            self.report_error(e.spreadsheet or 'General', None, str(e))
+            return False
+        self.profiler.count('workbook_uncompressed_bytes', self.workbook_info.uncompressed_size)
+        self.profiler.count('workbook_rows_estimate', sum(rows for rows in self.workbook_info.rows.values() if rows))
+        return True
+
+
+    def estimated_rows(self, spread_sheet_name, default=None):
+        """ Estimated number of rows of a spreadsheet, from the pre-flight inspection (default value if unknown). """
+        rows = self.workbook_info.rows.get(spread_sheet_name) if self.workbook_info else None
+        return default if rows is None else rows
+
+
+    def close(self):
+        """ Release the workbook (the read-only workbooks keep their file open until they are closed) and the downloaded file. """
+        if self.workbook:
+            self.workbook.close()
+            self.workbook = None
+        if self.downloaded_file:
+            self.downloaded_file.close()
+            self.downloaded_file = None
+
+
     def parse_template_schema(self):
-        """ Parse the template2model schema file. The collected and stored data will be used for the validations. """
-        schema_workbook = load_workbook(self.template_columns_schema_file)
-        curation_sheet = schema_workbook["Curation"]
-        schema_columns = get_column_name_index(curation_sheet)
-        for row_cell in curation_sheet.iter_rows(min_row=2, values_only=True):
-            sheet_name = row_cell[0]
-            column_name = row_cell[schema_columns['Column']]
-            model_name = row_cell[schema_columns['Model']]
-            field_name = row_cell[schema_columns['Field']]
-            type_name = row_cell[schema_columns['Type']]
-            mandatory_name = row_cell[schema_columns['Mandatory']]
-
-            if field_name:
-                if not sheet_name in self.table_mapschema:
-                    self.table_mapschema[sheet_name] = {}
-                self.table_mapschema[sheet_name][column_name] = field_name
-                if type_name:
-                    if not sheet_name in self.fields_infos:
-                        self.fields_infos[sheet_name] = {}
-                    column_label = trim_column_label(column_name)
-                    self.fields_infos[sheet_name][field_name] = { 'type': type_name, 'label': column_label }
-                if mandatory_name == 'Y':
-                    if not sheet_name in self.mandatory_fields:
-                        self.mandatory_fields[sheet_name] = []
-                    self.mandatory_fields[sheet_name].append(field_name)
-
-            if not model_name in self.spreadsheet_names and model_name is not None:
-                self.spreadsheet_names[model_name] = sheet_name
+        """ Fetch the template2model schema shared by all the validators. The schema data will be used for the validations. """
+        self.schema = get_template_schema(self.template_columns_schema_file)
+        self.table_mapschema = self.schema.table_mapschema
+        self.fields_infos = self.schema.fields_infos
+        self.mandatory_fields = self.schema.mandatory_fields
+        self.spreadsheet_names = self.schema.spreadsheet_names
+
+
+    def prefetch_external_data(self, max_workers=PREFETCH_WORKERS):
+        """
+        Collect the external identifiers of the spreadsheets (publication DOI/PMID, EFO IDs and GWAS Study IDs)
+        and resolve them concurrently, before the validation of the rows. The parsing methods then only read the results.
+        """
+        publications = []
+        efo_ids = set()
+        gcst_ids = set()
+
+        # Publication (only the first row is used)
+        col_names = self.workbook_publication.column_names()
+        for pinfo in self.workbook_publication.iter_rows(min_row=2, max_row=2):
+            c_doi = pinfo[col_names['doi']] if 'doi' in col_names else None
+            publications.append((strip_whitespaces(c_doi), strip_whitespaces(pinfo[1])))
+
+        # Score EFO IDs
+        score_schema = self.table_mapschema[self.spreadsheet_names['Score']]
+        col_names = self.workbook_scores.column_names(row_index=2)
+        efo_indexes = [ idx for col_name, idx in col_names.items() if score_schema.get(col_name) == 'trait_efo' ]
+        for score_info in self.workbook_scores.iter_rows(min_row=3):
+            if not score_info[0]:
+                break
+            for idx in efo_indexes:
+                val = strip_whitespaces(score_info[idx])
+                if val:
+                    efo_ids.update(strip_whitespaces(x) for x in str(val).split(','))
+
+        # GWAS Studies of the samples without sample numbers
+        sample_schema = self.table_mapschema[self.spreadsheet_names['Sample']]
+        col_names = self.workbook_samples.column_names()
+        sample_indexes = { sample_schema[col_name]: idx for col_name, idx in col_names.items() if col_name in sample_schema }
+        if 'source_GWAS_catalog' in sample_indexes:
+            for sample_info in self.workbook_samples.iter_rows(min_row=2):
+                sample_study_type = sample_info[1]
+                if not sample_study_type:
+                    break
+                if re.search('Testing', str(sample_study_type)):
+                    continue
+                if 'sample_number' in sample_indexes and sample_info[sample_indexes['sample_number']] not in ('', None):
+                    continue
+                gcst_id = strip_whitespaces(sample_info[sample_indexes['source_GWAS_catalog']])
+                if gcst_id:
+                    gcst_ids.add(gcst_id)
+
+        efo_ids.discard('')
+        self.lookups.prefetch(publications=publications, efo_ids=efo_ids, gcst_ids=gcst_ids, max_workers=max_workers)
 
 
     def parse_publication(self):
         """ Parse and validate the Publication spreadsheet. """
         spread_sheet_name = self.spreadsheet_names['Publication']
-        col_names = get_column_name_index(self.workbook_publication)
+        col_names = self.workbook_publication.column_names()
         c_doi = ''
         c_PMID = ''
         row_start = 2
         row_id = row_start
-        for pinfo in self.workbook_publication.iter_rows(min_row=row_start, max_row=row_start, values_only=True):
+        for pinfo in self.workbook_publication.iter_rows(min_row=row_start, max_row=row_start):
             c_doi = pinfo[col_names['doi']]
             c_doi = self.check_and_remove_whitespaces(spread_sheet_name, None, 'doi', c_doi)
             c_PMID = pinfo[1]
@@ -226,7 +457,11 @@ class PGSMetadataValidator():
 
         # Check in EuropePMC
         publication = Publication(c_doi, c_PMID)
-        is_in_eupmc = publication.populate_from_eupmc(self.connector)
+        try:
+            is_in_eupmc = publication.populate_from_eupmc(self.lookups)
+        except ServiceNotWorking as e:
+            self.report_unverified(spread_sheet_name, row_id, 'Publication', e)
+            return
         if not is_in_eupmc:
             doi_label = ''
             if c_doi and c_doi != '':
@@ -236,7 +471,7 @@ class PGSMetadataValidator():
                 PMID_label = f' ("{c_PMID}")'
             self.report_error(spread_sheet_name,row_id,f'Can\'t find the Publication in EuropePMC: DOI{doi_label} and/or PubMed ID{PMID_label} not found')
         else:
-            publication_check_report = publication.check_data(self.fields_infos[spread_sheet_name], self.mandatory_fields[spread_sheet_name])
+            publication_check_report = publication.check_data(self.fields_infos[spread_sheet_name], self.mandatory_fields[spread_sheet_name], self.schema.check_plans[spread_sheet_name])
             self.add_check_report(spread_sheet_name, row_id, publication_check_report)
 
 
@@ -244,13 +479,13 @@ class PGSMetadataValidator():
         """ Parse and validate the Score spreadsheet. """
         spread_sheet_name = self.spreadsheet_names['Score']
         current_schema = self.table_mapschema[spread_sheet_name]
-        col_names = get_column_name_index(self.workbook_scores, row_index=2)
+        col_names = self.workbook_scores.column_names(row_index=2)
 
         row_start = 3
         trait_efo_field = 'trait_efo'
-        for row_id, score_info in enumerate(self.workbook_scores.iter_rows(min_row=row_start, max_row=self.workbook_scores.max_row, values_only=True), start=row_start):
+        for row_id, score_info in enumerate(self.workbook_scores.iter_rows(min_row=row_start), start=row_start):
             score_name = score_info[0]
-            if not score_name or score_name == '':
+            if not score_name or score_name == '' or self.truncated:
                 break
             parsed_score = {}
             for col_name in col_names:
@@ -268,7 +503,11 @@ class PGSMetadataValidator():
                 for trait_efo_id in parsed_score[trait_efo_field]:
                     if not trait_efo_id in self.parsed_efotraits:
                         efo_trait = EFOTrait(trait_efo_id)
-                        efo_id_found = efo_trait.populate_from_efo(self.connector)
+                        try:
+                            efo_id_found = efo_trait.populate_from_efo(self.lookups)
+                        except ServiceNotWorking as e:
+                            self.report_unverified(spread_sheet_name, row_id, f"EFO trait '{trait_efo_id}'", e)
+                            continue
                         if efo_id_found:
                             self.parsed_efotraits[trait_efo_id] = efo_trait
                         else:
@@ -278,7 +517,7 @@ class PGSMetadataValidator():
             score = Score()
             score = populate_object(self.workbook_scores, score, parsed_score, self.fields_infos[spread_sheet_name])
 
-            score_check_report = score.check_data(self.fields_infos[spread_sheet_name], self.mandatory_fields[spread_sheet_name])
+            score_check_report = score.check_data(self.fields_infos[spread_sheet_name], self.mandatory_fields[spread_sheet_name], self.schema.check_plans[spread_sheet_name])
             self.add_check_report(spread_sheet_name, row_id, score_check_report)
 
             self.parsed_scores[score_name] = score
@@ -292,7 +531,7 @@ class PGSMetadataValidator():
     def parse_cohorts(self):
         """ Parse the Cohort reference spreadsheet. """
         row_start = 2
-        for cohort_info in self.workbook_cohorts.iter_rows(min_row=row_start, max_row=self.workbook_cohorts.max_row, values_only=True):
+        for cohort_info in self.workbook_cohorts.iter_rows(min_row=row_start):
             if not cohort_info or len(cohort_info) == 0 or not cohort_info[0]:
                 break
             cohort_id = cohort_info[0].upper()
@@ -317,14 +556,26 @@ class PGSMetadataValidator():
         """ Parse and validate the Performance Metrics spreadsheet. """
         spread_sheet_name = self.spreadsheet_names['Performance']
         current_schema = self.table_mapschema[spread_sheet_name]
-        col_names = get_column_name_index(self.workbook_performances, row_index=2)
+        col_names = self.workbook_performances.column_names(row_index=2)
 
         score_names_list = self.parsed_scores.keys()
 
+        performance_columns = PerformanceColumns(self.fields_infos[spread_sheet_name], self.mandatory_fields[spread_sheet_name], plan=self.schema.check_plans[spread_sheet_name])
+        metric_columns = MetricColumns(metric_fields_infos, metric_check_plan)
+
+        # Incremental validation: the results of the unchanged rows are read from the row cache,
+        # the other rows are reported in a separate report, split by row and stored in the cache at the end of the spreadsheet
+        row_cache = None
+        rows_report = self.current_report()
+        if self.row_cache and self.estimated_rows(spread_sheet_name, ROW_CACHE_MIN_ROWS) >= ROW_CACHE_MIN_ROWS:
+            row_cache = self.row_cache.spreadsheet(self.schema.checksum, spread_sheet_name, col_names)
+            rows_report = ValidationReport()
+        validated_rows = {}
+
         row_start = 3
-        for row_id, performance_info in enumerate(self.workbook_performances.iter_rows(min_row=row_start, max_row=self.workbook_performances.max_row, values_only=True), start=row_start):
+        for row_id, performance_info in enumerate(self.workbook_performances.iter_rows(min_row=row_start), start=row_start):
             score_name = performance_info[0]
-            if not score_name or score_name == '':
+            if not score_name or score_name == '' or self.truncated:
                 break
             # Check that the score name is in the "Score(s)" spreadsheet. Exception if the score is an existing PGS ID.
             if self.scores_spreadsheet_onhold['is_empty'] == False:
@@ -337,67 +588,96 @@ class PGSMetadataValidator():
             if not sampleset in self.parsed_samplesets:
                 self.parsed_samplesets.append(sampleset)
 
-            parsed_performance = {
-                'score_name': score_name,
-                'sampleset': sampleset
-            }
-            parsed_metrics = []
-
-            for col_name in col_names:
-                val = performance_info[col_names[col_name]]
-                val = self.check_and_remove_whitespaces(spread_sheet_name, row_id, col_name, val)
-                if (col_name in current_schema) and (val != '') and val != None:
-                    field = current_schema[col_name]
-                    if field.startswith('metric'):
-                        for x in str(val).split(';'):
-                            if x.isnumeric():
-                                x = float(x)
-                            try:
-                                parsed_metrics.append(self.str2metric(x, row_id, spread_sheet_name, self.workbook_performances, field))
-                            except ReportError as e:
-                                self.report_error(spread_sheet_name, row_id, str(e))
-                            except:  # Unexpected error
-                                error_msg = "Error parsing the metric value '"+str(val)+"'"
-                                self.report_error(spread_sheet_name, row_id, error_msg)
-                    else:
-                        parsed_performance[field] = val
+            performance_id = str(score_name)+'__'+str(sampleset)
+
+            row_key = None
+            if row_cache and not has_formula(performance_info):
+                row_key = row_cache.key(performance_info)
+                row_result = row_cache.get(row_key)
+                if row_result:
+                    self.report_row_result(spread_sheet_name, row_id, row_result)
+                    performance = PerformanceMetric()
+                    performance.__dict__.update(row_result['object'])
+                    self.parsed_performances[performance_id] = performance
+                    continue
 
-            performance = PerformanceMetric()
-            performance = populate_object(self.workbook_performances, performance, parsed_performance, self.fields_infos[spread_sheet_name])
+            with self.reporting_to(rows_report):
+                performance = self.parse_performance_row(row_id, performance_info, spread_sheet_name, current_schema, col_names, performance_columns, metric_columns)
+            self.parsed_performances[performance_id] = performance
+            if row_key:
+                validated_rows[row_id] = (row_key, performance)
 
-            performance_check_report = performance.check_data(self.fields_infos[spread_sheet_name], self.mandatory_fields[spread_sheet_name])
-            self.add_check_report(spread_sheet_name, row_id, performance_check_report)
+        with self.reporting_to(rows_report):
+            self.add_columns_reports(spread_sheet_name, performance_columns, metric_columns)
 
-            performance_id = str(parsed_performance['score_name'])+'__'+str(parsed_performance['sampleset'])
-            self.parsed_performances[performance_id] = performance
+        if row_cache:
+            self.store_rows_results(row_cache, rows_report, spread_sheet_name, validated_rows)
+            self.current_report().merge(rows_report)
 
-            # Metrics data
-            if len(parsed_metrics) > 0:
-                for metric in parsed_metrics:
-                    metric_check_report = metric.check_data(metric_fields_infos)
-                    self.add_check_report(spread_sheet_name, row_id, metric_check_report)
-            else:
-                self.report_error(spread_sheet_name,row_id,"The entry is missing associated Performance Metrics data (Effect size, Classification or Other)")
-        
         if not self.parsed_performances:
-            self.report_error(spread_sheet_name,None,"No data found in this spreadsheet!")
+            self.report_critical_error(spread_sheet_name,None,"No data found in this spreadsheet!")
+        elif self.fail_fast and self.scores_spreadsheet_onhold['is_empty'] and not self.scores_spreadsheet_onhold['has_pgs_ids']:
+            # The Score(s) spreadsheet is empty and the scores are not existing PGS Catalog Scores either (see post_parsing_checks)
+            self.report_critical_error(self.scores_spreadsheet_onhold['label'], None, self.scores_spreadsheet_error(with_testing_samples=False))
+
+
+    def parse_performance_row(self, row_id, performance_info, spread_sheet_name, current_schema, col_names, performance_columns, metric_columns):
+        """ Parse and validate a row of the Performance Metrics spreadsheet (checks depending on the row only). Return the PerformanceMetric object. """
+        parsed_performance = {
+            'score_name': performance_info[0],
+            'sampleset': performance_info[1]
+        }
+        parsed_metrics = []
+
+        for col_name in col_names:
+            val = performance_info[col_names[col_name]]
+            val = self.check_and_remove_whitespaces(spread_sheet_name, row_id, col_name, val)
+            if (col_name in current_schema) and (val != '') and val != None:
+                field = current_schema[col_name]
+                if field.startswith('metric'):
+                    for x in str(val).split(';'):
+                        if x.isnumeric():
+                            x = float(x)
+                        try:
+                            parsed_metrics.append(self.str2metric(x, row_id, spread_sheet_name, self.workbook_performances, field))
+                        except ReportError as e:
+                            self.report_error(spread_sheet_name, row_id, str(e))
+                        except:  # Unexpected error
+                            error_msg = "Error parsing the metric value '"+str(val)+"'"
+                            self.report_error(spread_sheet_name, row_id, error_msg)
+                else:
+                    parsed_performance[field] = val
+
+        performance = PerformanceMetric()
+        performance = populate_object(self.workbook_performances, performance, parsed_performance, self.fields_infos[spread_sheet_name])
+
+        performance_columns.add(row_id, performance)
+
+        # Metrics data
+        if len(parsed_metrics) > 0:
+            for metric in parsed_metrics:
+                metric_columns.add(row_id, metric)
+        else:
+            self.report_error(spread_sheet_name,row_id,"The entry is missing associated Performance Metrics data (Effect size, Classification or Other)")
+
+        return performance
 
 
     def parse_samples(self):
         """ Parse and validate the Sample spreadsheet. """
         spread_sheet_name = self.spreadsheet_names['Sample']
         current_schema = self.table_mapschema[spread_sheet_name]
-        col_names = get_column_name_index(self.workbook_samples)
+        col_names = self.workbook_samples.column_names()
 
         samples_scores = {}
         samples_testing = {}
         # Extract data for training (GWAS + Score Development) sample
         row_start = 2
-        for row_id, sample_info in enumerate(self.workbook_samples.iter_rows(min_row=row_start, max_row=self.workbook_samples.max_row, values_only=True), start=row_start):
+        for row_id, sample_info in enumerate(self.workbook_samples.iter_rows(min_row=row_start), start=row_start):
 
             sample_study_type = sample_info[1]
             # Corresponds to the end of the data
-            if not sample_study_type or sample_study_type == '':
+            if not sample_study_type or sample_study_type == '' or self.truncated:
                 break
             sample_study_type = self.check_and_remove_whitespaces(spread_sheet_name, row_id, self.fields_infos[spread_sheet_name]['__study_stage']['label'], sample_study_type)
 
@@ -416,7 +696,7 @@ class PGSMetadataValidator():
             self.scores_spreadsheet_onhold['has_testing_samples'] = True
 
         if not samples_scores and not samples_testing:
-            self.report_error(spread_sheet_name,None,"No data found in this spreadsheet!")
+            self.report_critical_error(spread_sheet_name,None,"No data found in this spreadsheet!")
         else:
             self.parse_samples_scores(spread_sheet_name, current_schema, samples_scores, col_names)
             if not samples_testing:
@@ -435,7 +715,10 @@ class PGSMetadataValidator():
     def parse_samples_scores(self, spread_sheet_name, current_schema, samples_scores, col_names):
         """ Parse and validate the GWAS and the Score development samples in the Sample spreadsheet. """
         samples = {}
+        sample_columns, sample_age_columns, followup_time_columns = self.sample_columns(spread_sheet_name)
         for row_id, sample_info in samples_scores.items():
+            if self.truncated:
+                break
             sample_remapped = {}
             for col_name in col_names:
                 val = sample_info[col_names[col_name]]
@@ -466,6 +749,9 @@ class PGSMetadataValidator():
                                     samples[row_id] = [c_sample]
                         else:
                             self.report_error(spread_sheet_name, row_id, f'Can\'t fetch the GWAS information for the study {sample_remapped["source_GWAS_catalog"]}')
+                    except ServiceNotWorking as e:
+                        self.unverified_samples_scores += 1
+                        self.report_unverified(spread_sheet_name, row_id, f'GWAS Study \'{sample_remapped["source_GWAS_catalog"]}\' (sample information)', e)
                     except:
                         self.report_error(spread_sheet_name, row_id, f'Can\'t fetch the GWAS information for the study {sample_remapped["source_GWAS_catalog"]}')
                 else:
@@ -490,19 +776,17 @@ class PGSMetadataValidator():
                 sample_object = Sample()
                 sample_object = populate_object(self.workbook_samples, sample_object, sample, self.fields_infos[spread_sheet_name])
 
-                sample_check_report = sample_object.check_data(self.fields_infos[spread_sheet_name], self.mandatory_fields[spread_sheet_name])
-                self.add_check_report(spread_sheet_name, row_id, sample_check_report)
-
+                sample_columns.add(row_id, sample_object)
                 if 'sample_age' in sample:
-                    sa_check_report = sample['sample_age'].check_data(demographic_age_fields_infos)
-                    self.add_check_report(spread_sheet_name, row_id, sa_check_report)
+                    sample_age_columns.add(row_id, sample['sample_age'])
                 if 'followup_time' in sample:
-                    ft_check_report = sample['followup_time'].check_data(demographic_followup_fields_infos)
-                    self.add_check_report(spread_sheet_name, row_id, ft_check_report)
+                    followup_time_columns.add(row_id, sample['followup_time'])
 
                 self.parsed_samples_scores.append(sample_object)
-        
-        if not self.parsed_samples_scores and self.scores_spreadsheet_onhold['is_empty'] == False:
+
+        self.add_columns_reports(spread_sheet_name, sample_columns, sample_age_columns, followup_time_columns)
+
+        if not self.parsed_samples_scores and self.scores_spreadsheet_onhold['is_empty'] == False and not self.unverified_samples_scores:
             self.report_error(spread_sheet_name,None,"No correct Sample Score entries found in this spreadsheet (from GWAS or used in Score Development)")
 
 
@@ -510,8 +794,11 @@ class PGSMetadataValidator():
         """ Parse and validate the testing samples in the Sample spreadsheet. """
         # Extract data Testing samples
         sample_sets_list = []
+        sample_columns, sample_age_columns, followup_time_columns = self.sample_columns(spread_sheet_name)
 
         for row_id, sample_info in samples_testing.items():
+            if self.truncated:
+                break
             sampleset = sample_info[2]
             sampleset = self.check_and_remove_whitespaces(spread_sheet_name, row_id, self.fields_infos[spread_sheet_name]['__sampleset']['label'], sampleset)
 
@@ -553,18 +840,16 @@ class PGSMetadataValidator():
             sample_object = Sample()
             sample_object = populate_object(self.workbook_samples, sample_object, sample_remapped, self.fields_infos[spread_sheet_name])
 
-            sample_check_report = sample_object.check_data(self.fields_infos[spread_sheet_name], self.mandatory_fields[spread_sheet_name])
-            self.add_check_report(spread_sheet_name, row_id, sample_check_report)
-
+            sample_columns.add(row_id, sample_object)
             if 'sample_age' in sample_remapped:
-                sa_check_report = sample_remapped['sample_age'].check_data(demographic_age_fields_infos)
-                self.add_check_report(spread_sheet_name, row_id, sa_check_report)
+                sample_age_columns.add(row_id, sample_remapped['sample_age'])
             if 'followup_time' in sample_remapped:
-                ft_check_report = sample_remapped['followup_time'].check_data(demographic_followup_fields_infos)
-                self.add_check_report(spread_sheet_name, row_id, ft_check_report)
+                followup_time_columns.add(row_id, sample_remapped['followup_time'])
 
             self.parsed_samples_testing.append(sample_object)
 
+        self.add_columns_reports(spread_sheet_name, sample_columns, sample_age_columns, followup_time_columns)
+
         # Check if all the Sample Sets in the Performance Metrics spreadsheet have associated Samples
         for sampleset in self.parsed_samplesets:
             if not sampleset in sample_sets_list:
@@ -585,14 +870,21 @@ class PGSMetadataValidator():
         # Score(s) spreadsheet
         if self.scores_spreadsheet_onhold['is_empty']:
             if self.scores_spreadsheet_onhold['has_pgs_ids'] == False or self.scores_spreadsheet_onhold['has_testing_samples'] == False:
-                error_msg = self.scores_spreadsheet_onhold['error_msg']
-                label = self.scores_spreadsheet_onhold['label']
-                # Missing PGS IDs
-                if self.scores_spreadsheet_onhold['has_pgs_ids'] == False:
-                    error_msg += "If the study uses existing PGS Catalog Scores, they are missing in the Performance Metrics spreadsheet (e.g. PGS000001)."
-                if self.scores_spreadsheet_onhold['has_testing_samples'] == False:
-                    error_msg += "If the study uses existing PGS Catalog Scores, you need to provide Testing sample(s)."
-                self.report_error(label,None,error_msg)
+                self.report_error(self.scores_spreadsheet_onhold['label'],None,self.scores_spreadsheet_error())
+
+
+    def scores_spreadsheet_error(self, with_testing_samples=True):
+        """
+        Error message of an empty Score(s) spreadsheet, depending on what is missing to use existing PGS Catalog Scores instead.
+        - with_testing_samples: check the testing samples (False if the Sample spreadsheet hasn't been parsed yet)
+        """
+        error_msg = self.scores_spreadsheet_onhold['error_msg']
+        # Missing PGS IDs
+        if self.scores_spreadsheet_onhold['has_pgs_ids'] == False:
+            error_msg += "If the study uses existing PGS Catalog Scores, they are missing in the Performance Metrics spreadsheet (e.g. PGS000001)."
+        if with_testing_samples and self.scores_spreadsheet_onhold['has_testing_samples'] == False:
+            error_msg += "If the study uses existing PGS Catalog Scores, you need to provide Testing sample(s)."
+        return error_msg
 
 
     def check_and_remove_whitespaces(self, spread_sheet_name, row_id, label, data):
@@ -611,112 +903,22 @@ class PGSMetadataValidator():
             - val: content of the cell
             - row_id: number of the current row
             - spread_sheet_name: name of the current spreadsheet
-            - wb_spreadsheet: workbook instance of the current spreadsheet
+            - wb_spreadsheet: row source (RowSource) of the current spreadsheet
             - field: corresponding field name of the current column
         > Return: instance of the Metric object
         """
-        _, ftype, fname = field.split('_')
-
-        # Find out what type of metric it is (double checking the field name)
-        ftype_choices = {
-            'other' : 'Other Metric',
-            'beta'  : 'Effect Size',
-            'class' : 'Classification Metric'
-        }
-        current_metric = {'type': ftype_choices[ftype]}
-
-        # Find out if it's a common metric and stucture the information
-        fname_common = {
-            'OR': ('Odds Ratio', 'OR'),
-            'HR': ('Hazard Ratio', 'HR'),
-            'AUROC': ('Area Under the Receiver-Operating Characteristic Curve', 'AUROC'),
-            'Cindex': ('Concordance Statistic', 'C-index'),
-            'R2': ('Proportion of the variance explained', 'R²'),
-        }
-        if fname in fname_common:
-            current_metric['name'] = fname_common[fname][0]
-            current_metric['name_short'] = fname_common[fname][1]
-        elif (ftype == 'beta') and (fname == 'other'):
-            current_metric['name'] = 'Beta'
-            current_metric['name_short'] = 'β'
-        else:
-            if '=' in val:
-                fname, val = val.split('=', 1)
-                current_metric['name'] = fname.strip()
-            else:
+        metric_data, messages = parse_metric(val, field)
+        for level, msg in messages:
+            if metric_data is None:
                 # The metric data can't be extracted. Interrupting the process with critical error.
-                raise ReportError(f'Metric entry "{val}" is not in the expected format (i.e. "metrics_label = metrics_value")')
-
-        # Parse out the confidence interval and estimate
-        if type(val) == float:
-            current_metric['estimate'] = val
-        else:
-            val = str(val)
-            # matches_square = insquarebrackets.findall(val)
-            # # Check if an alternative metric has been declared
-            # if '=' in val:
-            #     mname, val = [x.strip() for x in val.split('=')]
-            #     # Check if it has short + long name
-            #     matches_parentheses = inparentheses.findall(mname)
-            #     if len(matches_parentheses) == 1:
-            #         current_metric['name'] = mname.split('(')[0]
-            #         current_metric['name_short'] = matches_parentheses[0]
-
-            # Check if SE is reported
-            matches_parentheses = inparentheses.findall(val)
-            if len(matches_parentheses) == 1:
-                val = val.split('(')[0].strip()
-                # Check extra character/data after the parenthesis
-                extra = val.strip().split(')')
-                if len(extra) > 1:
-                    self.report_warning(spread_sheet_name,row_id,f'Extra information detected after the parenthesis for: "{val}"')
-                try:
-                    current_metric['estimate'] = float(val)
-                except:
-                     if " " in val:
-                        val, unit = val.split(" ", 1)
-                        try:
-                            current_metric['estimate'] = float(val)
-                        except ValueError:
-                            self.report_error(spread_sheet_name, row_id, f'Failed to extract metric estimate value (Expected float but found "{val}"). Is the correct separator (;) used?')
-                        current_metric['unit'] = unit
-                current_metric['se'] = matches_parentheses[0]
-            # Extract interval
+                raise ReportError(msg)
+            if level == 'error':
+                self.report_error(spread_sheet_name, row_id, msg)
             else:
-                try:
-                    current_metric['estimate'] = float(val.split('[')[0])
-                    # Check extra character/data after the brackets
-                    extra = val.strip().split(']')
-                    if len(extra) > 1:
-                        # Check if second part has content
-                        if (extra[1] != ''):
-                            self.report_warning(spread_sheet_name,row_id,f'Extra information detected after the interval for: "{val}"')
-                except:
-                    self.report_error(spread_sheet_name,row_id,f'Can\'t extract the estimate value from ("{val}")')
-                    current_metric['estimate'] = val
-                
-                matches_square = insquarebrackets.findall(val)
-                if len(matches_square) == 1:
-                    if re.search(interval_format, matches_square[0]):
-                        try:
-                            current_metric['ci'] = matches_square[0]
-                            [min_ci,max_ci] = current_metric['ci'].split(' - ')
-                            min_ci = float(min_ci)
-                            max_ci = float(max_ci)
-                            estimate = float(current_metric['estimate'])
-                            # Check that the estimate is within the interval
-                            if not min_ci <= estimate <= max_ci:
-                                self.report_error(spread_sheet_name,row_id,f'The estimate value ("{estimate}") is not within its the confidence interval "[{min_ci} - {max_ci}]"')
-                        except Exception as e:
-                            self.report_error(spread_sheet_name,row_id,f'Can\'t extract the estimate value and interval from "{val}": {e}')
-                    else:
-                        self.report_error(spread_sheet_name,row_id,f'Confidence interval "{val}" is not in the expected format (e.g. "1.00 [0.80 - 1.20]")')
-
-        if not 'name_short' in current_metric:
-            current_metric['name_short'] = current_metric['name']
+                self.report_warning(spread_sheet_name, row_id, msg)
 
         metric_obj = Metric()
-        metric_obj = populate_object(wb_spreadsheet, metric_obj, current_metric, metric_fields_infos)
+        metric_obj = populate_object(wb_spreadsheet, metric_obj, metric_data, metric_fields_infos)
 
         return metric_obj
 
@@ -728,59 +930,17 @@ class PGSMetadataValidator():
             - val: content of the cell
             - row_id: number of the current row 
             - spread_sheet_name: name of the current spreadsheet
-            - wb_spreadsheet: workbook instance of the current spreadsheet
+            - wb_spreadsheet: row source (RowSource) of the current spreadsheet
             - field: corresponding field name of the current column
             - col_name: full name of the column (i.e. in the header)
         > Return: instance of the Demographic object
         """
-        current_demographic = {}
-        if type(val) == float:
-            current_demographic['estimate'] = val
-        else:
-            # Split by ; in case of multiple sub-fields
-            l = val.split(';')
-            for x in l:
-                values = x.split('=')
-                if len(values) == 2:
-                    name = values[0].strip()
-                    value = values[1].strip()
-                else:
-                    col = col_name.split('\n')[0]
-                    col.strip(' \t\n')
-                    prefix_msg = f"Wrong format in the column '{col}'"
-                    if len(values) > 2:
-                        prefix_msg = f"Too many values in the column '{col}'"
-                    self.report_error(spread_sheet_name,row_id,f'{prefix_msg}. Format expected: "name=value_or_interval unit" (e.g. median=5.2 years).')
-                    continue
-
-                # Check if it contains a range item
-                matches = insquarebrackets.findall(value)
-                if len(matches) == 1:
-                    if re.search(interval_format, matches[0]):
-                        current_demographic['range'] = matches[0]
-                    else:
-                        self.report_error(spread_sheet_name,row_id,f'Data Range for the value "{value}" is not in the expected format (e.g. "1.00 [0.80 - 1.20]")')
-                    current_demographic['range_type'] = name.strip()
-                else:
-                    if name.lower().startswith('m'):
-                        current_demographic['estimate_type'] = name.strip()
-                        with_units = re.match(r"([-+]?\d*\.\d+|\d+) ([a-zA-Z]+)", value, re.I)
-                        if with_units:
-                            items = with_units.groups()
-                            current_demographic['estimate'] = items[0]
-                            current_demographic['unit'] = items[1]
-                        else:
-                            current_demographic['estimate'] = value
-
-                    elif name.lower().startswith('s'):
-                        current_demographic['variability_type'] = name.strip()
-                        with_units = re.match(r"([-+]?\d*\.\d+|\d+) ([a-zA-Z]+)", value, re.I)
-                        if with_units:
-                            items = with_units.groups()
-                            current_demographic['variability']  = items[0]
-                            current_demographic['unit'] = items[1]
-                        else:
-                            current_demographic['variability'] = value
+        demographic_data, messages = parse_demographic(val, col_name)
+        for level, msg in messages:
+            if level == 'error':
+                self.report_error(spread_sheet_name, row_id, msg)
+            else:
+                self.report_warning(spread_sheet_name, row_id, msg)
 
         if field == 'sample_age':
             demographic_fields_infos = demographic_age_fields_infos
@@ -788,7 +948,7 @@ class PGSMetadataValidator():
             demographic_fields_infos = demographic_followup_fields_infos
 
         demographic = Demographic()
-        demographic = populate_object(wb_spreadsheet, demographic, current_demographic, demographic_fields_infos)
+        demographic = populate_object(wb_spreadsheet, demographic, demographic_data, demographic_fields_infos)
 
         return demographic
 
@@ -804,14 +964,19 @@ class PGSMetadataValidator():
         - row_id: row number
         - msg: error message
         """
-        if not spread_sheet_name in self.report['error']:
-            self.report['error'][spread_sheet_name] = {}
-        # Avoid duplicated message
-        if not msg in self.report['error'][spread_sheet_name]:
-            self.report['error'][spread_sheet_name][msg] = []
-        # Avoid duplicated line reports
-        if not row_id in self.report['error'][spread_sheet_name][msg]:
-            self.report['error'][spread_sheet_name][msg].append(row_id)
+        self.current_report().add_error(spread_sheet_name, row_id, msg)
+        if self.max_errors:
+            with self.errors_count_lock:
+                self.errors_count += 1
+                if self.errors_count >= self.max_errors:
+                    self.truncated = True
+
+
+    def report_critical_error(self, spread_sheet_name, row_id, msg):
+        """ Store a reported error which makes the rest of the validation pointless (e.g. empty spreadsheet): the validation is stopped in fail-fast mode. """
+        self.report_error(spread_sheet_name, row_id, msg)
+        if self.fail_fast:
+            self.truncated = True
 
 
     def report_warning(self, spread_sheet_name, row_id, msg):
@@ -821,14 +986,17 @@ class PGSMetadataValidator():
         - row_id: row number
         - msg: warning message
         """
-        if not spread_sheet_name in self.report['warning']:
-            self.report['warning'][spread_sheet_name] = {}
-        # Avoid duplicated message
-        if not msg in self.report['warning'][spread_sheet_name]:
-            self.report['warning'][spread_sheet_name][msg] = []
-        # Avoid duplicated line reports
-        if not row_id in self.report['warning'][spread_sheet_name][msg]:
-            self.report['warning'][spread_sheet_name][msg].append(row_id)
+        self.current_report().add_warning(spread_sheet_name, row_id, msg)
+
+    def report_unverified(self, spread_sheet_name, row_id, label, exception):
+        """
+        Report a check which couldn't be done because an external service is unavailable (degraded mode).
+        It is reported as a warning, as it doesn't mean that the data is wrong.
+        """
+        service = SERVICE_LABELS.get(exception.service, 'external')
+        self.unavailable_services.add(service)
+        self.report_warning(spread_sheet_name, row_id, f'{label} unverified (service unavailable: {service})')
+
 
     def add_check_report(self, spread_sheet_name, row_id, check_report_list):
         """ Store the model check reports (errors and warnings). """
@@ -844,6 +1012,76 @@ class PGSMetadataValidator():
                 self.report_warning(spread_sheet_name,row_id,check_report)
 
 
+    def sample_columns(self, spread_sheet_name):
+        """ Return the column batches of the samples, of their age and of their follow-up time. """
+        return (
+            SampleColumns(self.fields_infos[spread_sheet_name], self.mandatory_fields[spread_sheet_name], plan=self.schema.check_plans[spread_sheet_name]),
+            DemographicColumns(demographic_age_fields_infos, demographic_age_check_plan),
+            DemographicColumns(demographic_followup_fields_infos, demographic_followup_check_plan)
+        )
+
+
+    def add_columns_reports(self, spread_sheet_name, *columns_list):
+        """
+        Run the column checks of the batches (see ColumnBatch) and store their reports.
+        The reports of each row are stored together, in the order of the batches (e.g. sample, then its demographic data).
+        """
+        rows_reports = {}
+        for columns in columns_list:
+            for row_id, check_report in columns.reports():
+                rows_reports.setdefault(row_id, []).append(check_report)
+        for row_id in sorted(rows_reports):
+            for check_report in rows_reports[row_id]:
+                self.add_check_report(spread_sheet_name, row_id, check_report)
+
+
+    def current_report(self):
+        """ Report storing the errors and warnings of the current thread (main report, unless changed with reporting_to). """
+        report = getattr(self.thread_report, 'report', None)
+        return self.report if report is None else report
+
+
+    @contextmanager
+    def reporting_to(self, report):
+        """
+        Store the errors and warnings reported in the context in the given report (e.g. to split them by row or by phase).
+        Only the reports of the current thread are redirected, so the phases run concurrently have their own report.
+        """
+        previous_report = getattr(self.thread_report, 'report', None)
+        self.thread_report.report = report
+        try:
+            yield report
+        finally:
+            self.thread_report.report = previous_report
+
+
+    def store_rows_results(self, row_cache, rows_report, spread_sheet_name, validated_rows):
+        """
+        Store the results of the validated rows of a spreadsheet in the row cache: messages of the rows report and fields of the parsed object.
+        - validated_rows: dictionary {row ID: (row key, parsed object)}
+        """
+        rows_messages = { row_id: [] for row_id in validated_rows }
+        for category in REPORT_CATEGORIES:
+            for msg, rows in rows_report[category].get(spread_sheet_name, {}).items():
+                for row_id in rows:
+                    if row_id in rows_messages:
+                        rows_messages[row_id].append((category, msg))
+        for row_id, (row_key, parsed_object) in validated_rows.items():
+            row_cache.add(row_key, {'messages': rows_messages[row_id], 'object': parsed_object.__dict__})
+        row_cache.store()
+        self.profiler.count('row_cache.hits', row_cache.hits)
+        self.profiler.count('row_cache.misses', row_cache.misses)
+
+
+    def report_row_result(self, spread_sheet_name, row_id, row_result):
+        """ Report the messages of a row result read from the row cache. """
+        for category, msg in row_result['messages']:
+            if category == 'error':
+                self.report_error(spread_sheet_name, row_id, msg)
+            else:
+                self.report_warning(spread_sheet_name, row_id, msg)
+
+
     def get_gwas_study(self, gcst_id):
         """
         Get the GWAS Study information related to the PGS sample.
@@ -851,10 +1089,11 @@ class PGSMetadataValidator():
         > Parameter:
             - gcst_id: GWAS Study ID (e.g. GCST010127)
         > Return: list of dictionnaries (1 per ancestry)
+        > Raise: ServiceNotWorking if the GWAS Catalog can't be reached
         """
         study_data = []
         try:
-            response_data = self.connector.get_gwas(gcst_id)
+            response_data = self.lookups.get_gwas(gcst_id)
             if response_data:
                 source_PMID = response_data['publicationInfo']['pubmedId']
                 for ancestry in response_data['ancestries']:
@@ -893,53 +1132,18 @@ class PGSMetadataValidator():
                     # Not found in the REST API
 
                     study_data.append(ancestry_data)
+        except ServiceNotWorking:
+            raise
         except Exception as e:
             logger.debug(f'Error: can\'t fetch GWAS results for {gcst_id}: {str(e)}')
 
         return study_data
 
-    def test_external_services(self):
-        errors = []
-        error_format_string = '%s returned an unexpected error. Check the service status.'
-        try:
-            self.connector.get_publication(pmid=1)
-        except ConnectorException:
-            errors.append(error_format_string % 'Europe PMC')
-
-        try:
-            self.connector.get_efo_trait('EFO_0001645')
-        except ConnectorException:
-            errors.append(error_format_string % 'Ontology Lookup Service')
-
-        try:
-            self.connector.get_gwas('GCST90132222')
-        except ConnectorException:
-            errors.append(error_format_string % 'GWAS Catalog')
-
-        return errors
-
 
 #=======================#
 #  Independent methods  #
 #=======================#
 
-def get_column_name_index(worksheet, row_index=1):
-    """ Get the list of column names and theirs indexes from a spreadsheet header.
-        This is tricky sometimes as the header is spread on 2 rows for some of them. """
-    col_names = {}
-    col_indexes = {}
-    for row in worksheet.iter_rows(min_row=1, max_row=row_index):
-        for col in row:
-            col_name = col.value
-            if col_name:
-                index = col.col_idx - 1 # 0 Based arrays in the python code
-                col_indexes[index] = col_name
-    for idx in col_indexes:
-        col_name = col_indexes[idx]
-        col_names[col_name] = idx
-    return col_names
-
-
 def populate_object(wb_spreadsheet, object, object_dict, object_fields):
     """ Generic method to populate a validator object. """
     for field in object_fields:
@@ -955,16 +1159,17 @@ def populate_object(wb_spreadsheet, object, object_dict, object_fields):
     return object
 
 
+def strip_whitespaces(data):
+    """ Remove the leading and trailing spaces/tabs of a text value (without reporting them). """
+    if isinstance(data, str):
+        return data.strip(' \t')
+    return data
+
+
 def calculate_formula(spreadsheet,data):
     """ Calculate the Excel formula if there is one """
     cell_formula = Formula(spreadsheet,data)
-    calculated_value = cell_formula.formula2number()
+    with spreadsheet.profiler.timer('formula'):
+        calculated_value = cell_formula.formula2number()
     return calculated_value
 
-
-def trim_column_label(label):
-    """ Shorten the column labels in the report if it is too long. """
-    column_label = label.split('\n')[0].strip(' \t')
-    if len(column_label) > 40:
-        column_label = column_label[:40]+'...'
-    return column_label
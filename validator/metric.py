@@ -1,15 +1,17 @@
 from validator.generic import GenericValidator
+from validator.columns import ColumnBatch
 
 class Metric():
 
-    def check_data(self, fields_infos):
-        mandatory_fields = [
-            'name',
-            'name_short',
-            'type',
-            'estimate'
-        ]
-        validator = MetricValidator(self, fields_infos, mandatory_fields)
+    mandatory_fields = (
+        'name',
+        'name_short',
+        'type',
+        'estimate'
+    )
+
+    def check_data(self, fields_infos, plan=None):
+        validator = MetricValidator(self, fields_infos, self.mandatory_fields, plan=plan)
         validator.check_not_null()
         validator.check_format()
         return validator.report
@@ -17,5 +19,14 @@ class Metric():
 
 class MetricValidator(GenericValidator):
 
-    def __init__(self, object, fields_infos, mandatory_fields, type="Metric"):
-        super().__init__(object, fields_infos, mandatory_fields, type)
+    def __init__(self, object, fields_infos, mandatory_fields, type="Metric", plan=None):
+        super().__init__(object, fields_infos, mandatory_fields, type, plan)
+
+
+class MetricColumns(ColumnBatch):
+    """ Metric objects of a spreadsheet, validated column by column (see ColumnBatch). """
+
+    type = 'Metric'
+
+    def __init__(self, fields_infos, plan=None):
+        super().__init__(fields_infos, Metric.mandatory_fields, plan=plan)
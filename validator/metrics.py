@@ -0,0 +1,162 @@
+import math
+import threading
+
+# Default buckets of the histograms (in seconds)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Metric():
+    """ Base class of the metrics: a value (or set of values) per combination of label values. """
+
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def label_key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f'The metric {self.name} has the labels {self.labels}, got {tuple(labels)}')
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def format_labels(self, key, extra=()):
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{label}="{escape_label_value(value)}"' for label, value in pairs) + '}'
+
+    def samples(self):
+        """ Return the list of (suffix, labels, value) of the metric. """
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        for suffix, labels, value in self.samples():
+            lines.append(f'{self.name}{suffix}{labels} {format_value(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """ Value which can only increase (e.g. number of requests). """
+
+    type = 'counter'
+
+    def inc(self, value=1, **labels):
+        key = self.label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def samples(self):
+        with self.lock:
+            return [ ('', self.format_labels(key), value) for key, value in sorted(self.values.items()) ]
+
+
+class Gauge(Metric):
+    """ Value which can go up and down (e.g. number of validations in progress), or computed when the metrics are collected. """
+
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labels=(), function=None):
+        super().__init__(name, documentation, labels)
+        self.function = function
+
+    def inc(self, value=1, **labels):
+        key = self.label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def dec(self, value=1, **labels):
+        self.inc(-value, **labels)
+
+    def set(self, value, **labels):
+        key = self.label_key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def samples(self):
+        if self.function:
+            return [ ('', '', self.function()) ]
+        with self.lock:
+            return [ ('', self.format_labels(key), value) for key, value in sorted(self.values.items()) ]
+
+
+class Histogram(Metric):
+    """ Distribution of observed values (e.g. durations), counted in cumulative buckets. """
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self.label_key(labels)
+        with self.lock:
+            histogram = self.values.get(key)
+            if histogram is None:
+                histogram = self.values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0, 'count': 0}
+            for index, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    histogram['buckets'][index] += 1
+                    break
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for key, histogram in sorted(self.values.items()):
+                cumulative_count = 0
+                for upper_bound, count in zip(self.buckets, histogram['buckets']):
+                    cumulative_count += count
+                    samples.append(('_bucket', self.format_labels(key, [('le', format_value(upper_bound))]), cumulative_count))
+                samples.append(('_bucket', self.format_labels(key, [('le', '+Inf')]), histogram['count']))
+                samples.append(('_sum', self.format_labels(key), histogram['sum']))
+                samples.append(('_count', self.format_labels(key), histogram['count']))
+        return samples
+
+
+class MetricsRegistry():
+    """ Set of metrics of the process, rendered in the Prometheus text format. """
+
+    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f'The metric {metric.name} is already registered')
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=(), function=None):
+        return self.register(Gauge(name, documentation, labels, function))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+def format_value(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
+
+
+def escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
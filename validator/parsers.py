@@ -0,0 +1,200 @@
+import functools
+import re
+
+# Needed for parsing confidence intervals
+insquarebrackets = re.compile(r'\[([^\)]+)\]')  # this regex might give redundant character escape warning, but they are kept for clarity
+interval_format = r'^\-?\d+(e-|\.)?\d*\s\-\s\-?\d+(e-|\.)?\d*$'
+inparentheses = re.compile(r'\((.*)\)')
+
+# Number of parsed cell values kept in memory, for each parser
+PARSER_CACHE_SIZE = 10000
+
+metric_types = {
+    'other' : 'Other Metric',
+    'beta'  : 'Effect Size',
+    'class' : 'Classification Metric'
+}
+
+common_metrics = {
+    'OR': ('Odds Ratio', 'OR'),
+    'HR': ('Hazard Ratio', 'HR'),
+    'AUROC': ('Area Under the Receiver-Operating Characteristic Curve', 'AUROC'),
+    'Cindex': ('Concordance Statistic', 'C-index'),
+    'R2': ('Proportion of the variance explained', 'R²'),
+}
+
+# Most common formats of the metric values, parsed in a single pass: "1.23", "0.5 (0.02)" and "1.23 [1.10 - 1.40]"
+# (the standard error is on a single line, as in parse_metric_value)
+metric_value_format = re.compile(r'^\s*(?P<estimate>-?\d+(?:\.\d+)?)\s*(?:\((?P<se>[^()\n]*)\)|\[(?P<ci>[^\[\]()]+)\])?\s*$')
+
+value_with_unit = re.compile(r"([-+]?\d*\.\d+|\d+) ([a-zA-Z]+)", re.I)
+
+
+@functools.lru_cache(maxsize=PARSER_CACHE_SIZE)
+def parse_metric(val, field):
+    """
+    Parse a metric value from the Performance Metrics spreadsheet (e.g. "1.23 [1.10 - 1.40]", "0.5 (0.02)", "name = 0.5").
+    The result only depends on the value and the column, so it is memoized: the same values are very common across the rows
+    (the returned dictionary is shared by the calls with the same value, it must not be modified).
+    > Parameters:
+        - val: metric value (a metric of the cell)
+        - field: corresponding field name of the column
+    > Return: dictionary of the metric fields, or None if the value is not in the expected format,
+      and tuple of reported messages (error or warning, message)
+    """
+    _, ftype, fname = field.split('_')
+    messages = []
+
+    # Find out what type of metric it is (double checking the field name)
+    current_metric = {'type': metric_types[ftype]}
+
+    # Find out if it's a common metric and stucture the information
+    if fname in common_metrics:
+        current_metric['name'] = common_metrics[fname][0]
+        current_metric['name_short'] = common_metrics[fname][1]
+    elif (ftype == 'beta') and (fname == 'other'):
+        current_metric['name'] = 'Beta'
+        current_metric['name_short'] = 'β'
+    else:
+        if '=' in val:
+            fname, val = val.split('=', 1)
+            current_metric['name'] = fname.strip()
+        else:
+            # The metric data can't be extracted
+            return None, (('error', f'Metric entry "{val}" is not in the expected format (i.e. "metrics_label = metrics_value")'),)
+
+    # Parse out the confidence interval and estimate
+    if type(val) == float:
+        current_metric['estimate'] = val
+    else:
+        val = str(val)
+        m = metric_value_format.match(val)
+        if m:
+            current_metric['estimate'] = float(m.group('estimate'))
+            if m.group('se') is not None:
+                current_metric['se'] = m.group('se')
+            elif m.group('ci') is not None:
+                check_interval(current_metric, m.group('ci'), val, messages)
+        else:
+            parse_metric_value(current_metric, val, messages)
+
+    if not 'name_short' in current_metric:
+        current_metric['name_short'] = current_metric['name']
+
+    return current_metric, tuple(messages)
+
+
+def parse_metric_value(current_metric, val, messages):
+    """ Parse the metric values which are not in the most common formats (see metric_value_format). """
+    # Check if SE is reported
+    matches_parentheses = inparentheses.findall(val)
+    if len(matches_parentheses) == 1:
+        val = val.split('(')[0].strip()
+        # Check extra character/data after the parenthesis
+        extra = val.strip().split(')')
+        if len(extra) > 1:
+            messages.append(('warning', f'Extra information detected after the parenthesis for: "{val}"'))
+        try:
+            current_metric['estimate'] = float(val)
+        except:
+             if " " in val:
+                val, unit = val.split(" ", 1)
+                try:
+                    current_metric['estimate'] = float(val)
+                except ValueError:
+                    messages.append(('error', f'Failed to extract metric estimate value (Expected float but found "{val}"). Is the correct separator (;) used?'))
+                current_metric['unit'] = unit
+        current_metric['se'] = matches_parentheses[0]
+    # Extract interval
+    else:
+        try:
+            current_metric['estimate'] = float(val.split('[')[0])
+            # Check extra character/data after the brackets
+            extra = val.strip().split(']')
+            if len(extra) > 1:
+                # Check if second part has content
+                if (extra[1] != ''):
+                    messages.append(('warning', f'Extra information detected after the interval for: "{val}"'))
+        except:
+            messages.append(('error', f'Can\'t extract the estimate value from ("{val}")'))
+            current_metric['estimate'] = val
+
+        matches_square = insquarebrackets.findall(val)
+        if len(matches_square) == 1:
+            check_interval(current_metric, matches_square[0], val, messages)
+
+
+def check_interval(current_metric, interval, val, messages):
+    """ Store the confidence interval of a metric and check that the estimate is within the interval. """
+    if re.search(interval_format, interval):
+        try:
+            current_metric['ci'] = interval
+            [min_ci,max_ci] = current_metric['ci'].split(' - ')
+            min_ci = float(min_ci)
+            max_ci = float(max_ci)
+            estimate = float(current_metric['estimate'])
+            # Check that the estimate is within the interval
+            if not min_ci <= estimate <= max_ci:
+                messages.append(('error', f'The estimate value ("{estimate}") is not within its the confidence interval "[{min_ci} - {max_ci}]"'))
+        except Exception as e:
+            messages.append(('error', f'Can\'t extract the estimate value and interval from "{val}": {e}'))
+    else:
+        messages.append(('error', f'Confidence interval "{val}" is not in the expected format (e.g. "1.00 [0.80 - 1.20]")'))
+
+
+@functools.lru_cache(maxsize=PARSER_CACHE_SIZE)
+def parse_demographic(val, col_name):
+    """
+    Parse a sample age or follow-up time value from the Sample spreadsheet (e.g. "median=5.2 years;IQR=[1 - 9]").
+    The result only depends on the value and the column, so it is memoized (the returned dictionary must not be modified).
+    > Parameters:
+        - val: content of the cell
+        - col_name: full name of the column (i.e. in the header)
+    > Return: dictionary of the demographic fields and tuple of reported messages (error or warning, message)
+    """
+    messages = []
+    current_demographic = {}
+    if type(val) == float:
+        current_demographic['estimate'] = val
+    else:
+        # Split by ; in case of multiple sub-fields
+        for x in val.split(';'):
+            values = x.split('=')
+            if len(values) == 2:
+                name = values[0].strip()
+                value = values[1].strip()
+            else:
+                col = col_name.split('\n')[0]
+                prefix_msg = f"Wrong format in the column '{col}'"
+                if len(values) > 2:
+                    prefix_msg = f"Too many values in the column '{col}'"
+                messages.append(('error', f'{prefix_msg}. Format expected: "name=value_or_interval unit" (e.g. median=5.2 years).'))
+                continue
+
+            # Check if it contains a range item
+            matches = insquarebrackets.findall(value) if '[' in value else None
+            if matches and len(matches) == 1:
+                if re.search(interval_format, matches[0]):
+                    current_demographic['range'] = matches[0]
+                else:
+                    messages.append(('error', f'Data Range for the value "{value}" is not in the expected format (e.g. "1.00 [0.80 - 1.20]")'))
+                current_demographic['range_type'] = name
+            else:
+                name_initial = name[:1].lower()
+                if name_initial == 'm':
+                    value_field = 'estimate'
+                    current_demographic['estimate_type'] = name
+                elif name_initial == 's':
+                    value_field = 'variability'
+                    current_demographic['variability_type'] = name
+                else:
+                    continue
+                with_units = value_with_unit.match(value)
+                if with_units:
+                    items = with_units.groups()
+                    current_demographic[value_field] = items[0]
+                    current_demographic['unit'] = items[1]
+                else:
+                    current_demographic[value_field] = value
+
+    return current_demographic, tuple(messages)
@@ -1,9 +1,10 @@
 from validator.generic import GenericValidator
+from validator.columns import ColumnBatch
 
 class PerformanceMetric():
 
-    def check_data(self, fields_infos, mandatory_fields):
-        validator = PerformanceValidator(self, fields_infos, mandatory_fields)
+    def check_data(self, fields_infos, mandatory_fields, plan=None):
+        validator = PerformanceValidator(self, fields_infos, mandatory_fields, plan=plan)
         validator.check_not_null()
         validator.check_format()
         return validator.report
@@ -11,5 +12,11 @@ class PerformanceMetric():
 
 class PerformanceValidator(GenericValidator):
 
-    def __init__(self, object, fields_infos, mandatory_fields, type="Performance"):
-        super().__init__(object, fields_infos, mandatory_fields, type)
+    def __init__(self, object, fields_infos, mandatory_fields, type="Performance", plan=None):
+        super().__init__(object, fields_infos, mandatory_fields, type, plan)
+
+
+class PerformanceColumns(ColumnBatch):
+    """ Performance objects of a spreadsheet, validated column by column (see ColumnBatch). """
+
+    type = 'Performance'
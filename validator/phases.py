@@ -0,0 +1,68 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Maximum number of validation phases run at the same time
+PHASE_WORKERS = 4
+
+
+class Phase():
+    """ Validation phase: function to run and names of the phases providing its inputs (e.g. parsed scores, sample sets, cohorts). """
+
+    def __init__(self, name, function, requires=()):
+        self.name = name
+        self.function = function
+        self.requires = tuple(requires)
+
+
+class PhaseScheduler():
+    """
+    Run the validation phases in the order of their dependencies: a phase starts once all the phases it requires are done,
+    so the independent phases (e.g. Publication and Cohort spreadsheets) are run concurrently.
+    The phases must be declared in a valid order (each phase after the phases it requires), which is also the order
+    used to run them sequentially (max_workers=1).
+    The results of the phases don't depend on the scheduling: the callers keep the outputs of each phase separate
+    (e.g. one report per phase) and combine them in the declared order.
+    """
+
+    def __init__(self, phases, max_workers=PHASE_WORKERS):
+        self.phases = list(phases)
+        self.max_workers = max_workers
+        declared = set()
+        for phase in self.phases:
+            for required in phase.requires:
+                if required not in declared:
+                    raise ValueError(f"The phase '{phase.name}' requires the phase '{required}', which is not declared before it")
+            declared.add(phase.name)
+
+
+    def run(self, execute):
+        """
+        Run all the phases with the given function (called with the Phase).
+        If a phase raises an exception, the phases depending on it are not started and the exception is raised
+        once the running phases are done.
+        """
+        if self.max_workers <= 1:
+            for phase in self.phases:
+                execute(phase)
+            return
+
+        done = set()
+        pending = list(self.phases)
+        running = {}
+        error = None
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                if error is None:
+                    for phase in [ phase for phase in pending if all(required in done for required in phase.requires) ]:
+                        pending.remove(phase)
+                        running[executor.submit(execute, phase)] = phase
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    phase = running.pop(future)
+                    if future.exception() is not None:
+                        error = error or future.exception()
+                    else:
+                        done.add(phase.name)
+        if error is not None:
+            raise error
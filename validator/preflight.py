@@ -0,0 +1,203 @@
+import posixpath
+import re
+import zipfile
+from xml.etree.ElementTree import ParseError, fromstring, iterparse
+
+# Maximum total size (in bytes) of the uncompressed content of a workbook (protection against the zip bombs)
+MAX_UNCOMPRESSED_SIZE = 1024 * 1024 * 1024
+# Rows read at the top of each spreadsheet to find the column labels (the header is spread on 2 rows in some spreadsheets)
+HEADER_ROWS = 2
+
+relationship_types = {
+    'officeDocument': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument',
+    'sharedStrings': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings'
+}
+cell_reference = re.compile(r'^\$?([A-Z]{1,3})\$?(\d+)$')
+
+
+class PreflightError(Exception):
+    """ Workbook which can't be validated (not a xlsx file, missing spreadsheet, unknown header...). """
+
+    def __init__(self, message, spreadsheet=None):
+        super().__init__(message)
+        # Spreadsheet of the error, or None for a general error
+        self.spreadsheet = spreadsheet
+
+
+class WorkbookInfo():
+    """
+    Description of a workbook, read without loading it:
+    - uncompressed_size: total size (in bytes) of the uncompressed content
+    - sheet_names: names of the spreadsheets, in the workbook order
+    - rows: estimated number of rows of each spreadsheet (from its dimension record, None if unknown)
+    """
+
+    def __init__(self, uncompressed_size, sheet_names, rows):
+        self.uncompressed_size = uncompressed_size
+        self.sheet_names = sheet_names
+        self.rows = rows
+
+
+def inspect_workbook(file, schema, max_uncompressed_size=MAX_UNCOMPRESSED_SIZE):
+    """
+    Pre-flight inspection of a xlsx file (path or binary file), before its full parsing by openpyxl.
+    Only the zip central directory, the workbook part and the top of the spreadsheets (dimension and header rows) are read,
+    so the files which can't be validated are rejected in a few milliseconds:
+    - not a xlsx file, or uncompressed content larger than max_uncompressed_size
+    - missing spreadsheet (see schema.spreadsheet_names)
+    - spreadsheet header without any of the column labels of the template (e.g. wrong template)
+    > Return: WorkbookInfo (e.g. sizes estimates)
+    > Raise: PreflightError
+    """
+    try:
+        with zipfile.ZipFile(file) as archive:
+            return inspect_archive(archive, schema, max_uncompressed_size)
+    except zipfile.BadZipFile:
+        raise PreflightError('The file is not a valid Excel file (expected format: .xlsx)')
+    except (KeyError, ValueError, ParseError) as e:
+        raise PreflightError(f'The Excel file is corrupted or has an unexpected structure: {e}')
+    finally:
+        if hasattr(file, 'seek'):
+            file.seek(0)
+
+
+def inspect_archive(archive, schema, max_uncompressed_size):
+    uncompressed_size = sum(info.file_size for info in archive.infolist())
+    if uncompressed_size > max_uncompressed_size:
+        raise PreflightError(f'The content of the Excel file is too large ({uncompressed_size} bytes uncompressed, maximum: {max_uncompressed_size} bytes)')
+
+    workbook_path = 'xl/workbook.xml'
+    for target, relationship_type in read_relationships(archive, '').values():
+        if relationship_type == relationship_types['officeDocument']:
+            workbook_path = target
+    workbook_relationships = read_relationships(archive, workbook_path)
+    sheets = {}
+    for element in fromstring(archive.read(workbook_path)).iter():
+        if local_name(element.tag) == 'sheet':
+            relationship_id = [ value for name, value in element.attrib.items() if local_name(name) == 'id' ]
+            if relationship_id and relationship_id[0] in workbook_relationships:
+                sheets[element.get('name')] = workbook_relationships[relationship_id[0]][0]
+
+    # Same error as the full parsing (first missing spreadsheet)
+    for spreadsheet_name in schema.spreadsheet_names.values():
+        if not spreadsheet_name in sheets:
+            raise PreflightError(f'The spreadsheet "{spreadsheet_name}" is missing in the Excel file.')
+
+    shared_strings_path = None
+    for target, relationship_type in workbook_relationships.values():
+        if relationship_type == relationship_types['sharedStrings']:
+            shared_strings_path = target
+
+    rows = {}
+    headers = {}
+    for sheet_name, sheet_path in sheets.items():
+        with_header = sheet_name in schema.table_mapschema
+        rows[sheet_name], headers[sheet_name] = read_sheet_top(archive, sheet_path, with_header)
+
+    # The header cells only store the index of their text in the shared strings
+    string_indexes = { value for header in headers.values() for value in header if type(value) is int }
+    shared_strings = read_shared_strings(archive, shared_strings_path, max(string_indexes)) if string_indexes and shared_strings_path else []
+    for sheet_name, column_labels in schema.table_mapschema.items():
+        if sheet_name not in headers:
+            continue
+        labels = set()
+        for value in headers[sheet_name]:
+            if type(value) is int:
+                value = shared_strings[value] if value < len(shared_strings) else None
+            labels.add(value)
+        if not any(column_label in labels for column_label in column_labels):
+            raise PreflightError(f'The header of the spreadsheet "{sheet_name}" doesn\'t have any of the expected columns: is it the PGS Catalog Curation Template?', sheet_name)
+
+    return WorkbookInfo(uncompressed_size, list(sheets), rows)
+
+
+def read_relationships(archive, part_path):
+    """ Relationships of a part of the package: {ID: (target path, type)} (the root relationships for an empty part path). """
+    directory, filename = posixpath.split(part_path)
+    relationships_path = posixpath.join(directory, '_rels', f'{filename}.rels')
+    if relationships_path not in archive.NameToInfo:
+        return {}
+    relationships = {}
+    for element in fromstring(archive.read(relationships_path)):
+        target = element.get('Target', '')
+        if element.get('TargetMode') == 'External':
+            continue
+        if target.startswith('/'):
+            target = target[1:]
+        else:
+            target = posixpath.normpath(posixpath.join(directory, target))
+        relationships[element.get('Id')] = (target, element.get('Type'))
+    return relationships
+
+
+def read_sheet_top(archive, sheet_path, with_header):
+    """
+    Read the top of a spreadsheet part (stopped at the end of the header).
+    > Return: estimated number of rows (None if unknown) and list of the header values (shared string index or text)
+    """
+    rows = None
+    header = []
+    with archive.open(sheet_path) as sheet:
+        cell_type = None
+        rows_count = 0
+        for event, element in iterparse(sheet, events=('start', 'end')):
+            tag = local_name(element.tag)
+            if event == 'start':
+                if tag == 'sheetData' and not with_header:
+                    break
+                if tag == 'row':
+                    # The row numbers are optional
+                    rows_count += 1
+                    row_number = int(element.get('r') or rows_count)
+                    if rows_count > HEADER_ROWS or row_number > HEADER_ROWS:
+                        break
+                if tag == 'c':
+                    cell_type = element.get('t')
+                continue
+            if tag == 'dimension':
+                rows = dimension_rows(element.get('ref', ''))
+            elif tag == 'v' and element.text is not None:
+                header.append(int(element.text) if cell_type == 's' else element.text)
+            elif tag == 'is':
+                header.append(''.join(text.text or '' for text in element.iter() if local_name(text.tag) == 't'))
+            elif tag == 'sheetData':
+                break
+    return rows, header
+
+
+def read_shared_strings(archive, shared_strings_path, max_index):
+    """ Read the shared strings up to the given index (the header labels are usually the first strings of the workbook). """
+    strings = []
+    with archive.open(shared_strings_path) as shared_strings:
+        for event, element in iterparse(shared_strings, events=('end',)):
+            if local_name(element.tag) != 'si':
+                continue
+            # Text of the string item, or of its rich text runs (the phonetic runs are ignored)
+            text = []
+            for child in element:
+                if local_name(child.tag) == 't':
+                    text.append(child.text or '')
+                elif local_name(child.tag) == 'r':
+                    text.extend(run_text.text or '' for run_text in child if local_name(run_text.tag) == 't')
+            strings.append(''.join(text))
+            element.clear()
+            if len(strings) > max_index:
+                break
+    return strings
+
+
+def dimension_rows(ref):
+    """ Number of rows of a dimension record (e.g. 'A1:K120' has 120 rows), or None if unknown. """
+    cells = ref.split(':')
+    if len(cells) != 2:
+        return None
+    first = cell_reference.match(cells[0].upper())
+    last = cell_reference.match(cells[1].upper())
+    if not first or not last:
+        return None
+    return int(last.group(2)) - int(first.group(2)) + 1
+
+
+def local_name(tag):
+    """ Name of an XML tag without its namespace (the strict and transitional OOXML namespaces are different). """
+    return tag.rsplit('}', 1)[-1]
@@ -0,0 +1,89 @@
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+
+class Profiler():
+    """
+    Collect the instrumentation data of a validation:
+    - timers: number of calls, total and maximum duration of the timed operations (e.g. external lookups, formulas)
+    - counters: number of occurrences of an event (e.g. rows read, cache hits)
+    The same profiler can be used by several threads (e.g. during the prefetch of the external data).
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.timers = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def timer(self, name):
+        """ Time the operation executed in the context (the duration is recorded even if it raises an exception). """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start_time)
+
+    def record(self, name, duration):
+        with self.lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                self.timers[name] = {'calls': 1, 'total': duration, 'max': duration}
+            else:
+                timer['calls'] += 1
+                timer['total'] += duration
+                timer['max'] = max(timer['max'], duration)
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'calls': { name: dict(timer) for name, timer in sorted(self.timers.items()) },
+                'counters': dict(sorted(self.counters.items()))
+            }
+
+
+class NullProfiler():
+    """ Profiler used when the instrumentation is disabled: nothing is recorded. """
+
+    enabled = False
+    _null_context = nullcontext()
+
+    def timer(self, name):
+        return self._null_context
+
+    def record(self, name, duration):
+        pass
+
+    def count(self, name, value=1):
+        pass
+
+    def to_dict(self):
+        return {'calls': {}, 'counters': {}}
+
+
+# Shared by all the objects created without profiler
+null_profiler = NullProfiler()
+
+
+def format_profile(timings):
+    """ Format the timings of a validation (see PGSMetadataValidator.timings) in a human readable text. """
+    text = [f'Total: {timings["total"]:.3f}s']
+    text.append('# Phases')
+    for phase, duration in timings['phases'].items():
+        text.append(f'- {phase}: {duration:.3f}s')
+    if timings['calls']:
+        text.append('# Calls')
+        for name, timer in timings['calls'].items():
+            text.append(f'- {name}: {timer["calls"]} call(s), {timer["total"]:.3f}s (max {timer["max"]:.3f}s)')
+    if timings['counters']:
+        text.append('# Counters')
+        for name, value in timings['counters'].items():
+            text.append(f'- {name}: {value}')
+    return '\n'.join(text)
@@ -1,6 +1,14 @@
 from validator.generic import GenericValidator
 from validator.request.connector import Connector, NotFound
 
+extra_fields_info = {
+    'firstauthor': { 'type': 'string', 'label': 'Remotely fetched first author' },
+    'authors': { 'type': 'string', 'label': 'Remotely fetched author' },
+    'title': { 'type': 'string', 'label': 'Remotely fetched title' },
+    'date_publication' : { 'type': 'string', 'label': 'Remotely fetched publication date' }
+}
+extra_mandatory_fields = ['firstauthor','authors','title','date_publication']
+
 
 class Publication():
 
@@ -33,22 +41,11 @@ class Publication():
             return False
 
 
-    def check_data(self, fields_infos, mandatory_fields):
-        extra_fields_info = {
-            'firstauthor': { 'type': 'string', 'label': 'Remotely fetched first author' },
-            'authors': { 'type': 'string', 'label': 'Remotely fetched author' },
-            'title': { 'type': 'string', 'label': 'Remotely fetched title' },
-            'date_publication' : { 'type': 'string', 'label': 'Remotely fetched publication date' }
-        }
-        extra_mandatory_fields = ['firstauthor','authors','title','date_publication']
-
-        for field in extra_fields_info:
-            fields_infos[field] = extra_fields_info[field]
-        for field in extra_mandatory_fields:
-            if not field in mandatory_fields:
-                mandatory_fields.append(field)
-
-        validator = PublicationValidator(self, fields_infos, mandatory_fields)
+    def check_data(self, fields_infos, mandatory_fields, plan=None):
+        """ The plan compiled with the template schema already includes the remotely fetched fields (see extend_fields). """
+        if plan is None:
+            fields_infos, mandatory_fields = extend_fields(fields_infos, mandatory_fields)
+        validator = PublicationValidator(self, fields_infos, mandatory_fields, plan=plan)
         validator.check_not_null()
         validator.check_format()
         return validator.report
@@ -56,5 +53,19 @@ class Publication():
 
 class PublicationValidator(GenericValidator):
 
-    def __init__(self, object, fields_types, mandatory_fields, type="Publication"):
-        super().__init__(object, fields_types, mandatory_fields, type)
+    def __init__(self, object, fields_types, mandatory_fields, type="Publication", plan=None):
+        super().__init__(object, fields_types, mandatory_fields, type, plan)
+
+
+def extend_fields(fields_infos, mandatory_fields):
+    """
+    Add the remotely fetched fields to the Publication schema data (the schema data is shared between validations: the extended data is a copy).
+    The check plan of the extended data is compiled with the template schema (see TemplateSchema.check_plans).
+    """
+    extended_fields_infos = dict(fields_infos)
+    extended_fields_infos.update(extra_fields_info)
+    extended_mandatory_fields = list(mandatory_fields)
+    for field in extra_mandatory_fields:
+        if not field in extended_mandatory_fields:
+            extended_mandatory_fields.append(field)
+    return extended_fields_infos, extended_mandatory_fields
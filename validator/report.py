@@ -0,0 +1,148 @@
+REPORT_CATEGORIES = ('error', 'warning')
+
+
+class ValidationReport():
+    """
+    Errors and warnings reported during the validation, grouped by spreadsheet and message.
+    The rows of each message are stored as the keys of a dictionary, i.e. an ordered set with constant-time insertion,
+    so a message reported on thousands of rows stays cheap to build.
+    The row None is a global report (i.e. not related to a specific row of the spreadsheet).
+    The report is read like the former nested dictionaries: report['error'][spreadsheet][message] -> rows
+    A truncated report is the partial report of a validation stopped early (fail-fast mode or error budget).
+    """
+
+    def __init__(self):
+        self.categories = { category: {} for category in REPORT_CATEGORIES }
+        self.truncated = False
+
+    def __getitem__(self, category):
+        return self.categories[category]
+
+    def add(self, category, spreadsheet, row_id, message):
+        """ Store a reported message (the duplicated rows are ignored). """
+        messages = self.categories[category].setdefault(spreadsheet, {})
+        message = str(message)
+        rows = messages.get(message)
+        if rows is None:
+            rows = messages[message] = {}
+        rows[row_id] = None
+
+    def add_error(self, spreadsheet, row_id, message):
+        self.add('error', spreadsheet, row_id, message)
+
+    def add_warning(self, spreadsheet, row_id, message):
+        self.add('warning', spreadsheet, row_id, message)
+
+    def merge(self, other):
+        """ Add the messages of another report, keeping the order of the reported messages and rows. """
+        for category in REPORT_CATEGORIES:
+            for spreadsheet, messages in other.categories[category].items():
+                for message, rows in messages.items():
+                    for row_id in rows:
+                        self.add(category, spreadsheet, row_id, message)
+        self.truncated = self.truncated or other.truncated
+
+    def has_errors(self):
+        return bool(self.categories['error'])
+
+    def entries(self, category):
+        """
+        Serialise the messages of a category.
+        > Return: list of (spreadsheet, message, lines) tuples, where lines is the list of compressed row ranges
+          (e.g. [3, '5-2041']), or None for a global message
+        """
+        return [
+            (spreadsheet, message, compress_rows(rows))
+            for spreadsheet, messages in self.categories[category].items()
+            for message, rows in messages.items()
+        ]
+
+    def to_dict(self):
+        """
+        Serialise the report in the format of the REST API response: {category: {spreadsheet: [{'message', 'lines'}]}},
+        with 'truncated': True if the validation has been stopped early.
+        """
+        report = {}
+        for category in REPORT_CATEGORIES:
+            for spreadsheet, message, lines in self.entries(category):
+                entry = { 'message': message }
+                if lines:
+                    entry['lines'] = lines
+                report.setdefault(category, {}).setdefault(spreadsheet, []).append(entry)
+        if self.truncated:
+            report['truncated'] = True
+        return report
+
+    def to_data(self):
+        """ Serialise the full report (uncompressed rows), to store it: {category: {spreadsheet: [[message, rows]]}}. See from_data. """
+        return {
+            category: {
+                spreadsheet: [ [message, list(rows)] for message, rows in messages.items() ]
+                for spreadsheet, messages in self.categories[category].items()
+            }
+            for category in REPORT_CATEGORIES
+        }
+
+    @classmethod
+    def from_data(cls, data):
+        """ Rebuild a report serialised with to_data. """
+        report = cls()
+        for category in REPORT_CATEGORIES:
+            for spreadsheet, messages in data.get(category, {}).items():
+                for message, rows in messages:
+                    for row_id in rows:
+                        report.add(category, spreadsheet, row_id, message)
+        return report
+
+    def to_text(self):
+        """ Serialise the report in a human readable format (command line output). """
+        text = []
+        titles = { 'error': 'Reported error(s)', 'warning': 'Reported warning(s)' }
+        report = self.to_dict()
+        for category in REPORT_CATEGORIES:
+            if category not in report:
+                continue
+            spreadsheets = report[category]
+            text.append(f'\n#### {titles[category]} ####')
+            for spreadsheet, entries in spreadsheets.items():
+                text.append(f"\n# Spreadsheet '{spreadsheet}'")
+                for entry in entries:
+                    if 'lines' in entry:
+                        plural = 's' if count_lines(entry['lines']) > 1 else ''
+                        text.append(f'- Line{plural} {",".join(str(l) for l in entry["lines"])}: {entry["message"]}')
+                    else:
+                        text.append(f'- Global {category}: {entry["message"]}')
+        if self.truncated:
+            text.append('\n#### Validation stopped early: the report is incomplete ####')
+        return '\n'.join(text)
+
+
+def compress_rows(rows):
+    """
+    Compress the row numbers into ranges of consecutive rows, e.g. [3, 5, 6, 7] -> [3, '5-7'].
+    > Return: list of row numbers and ranges (ascending order), or None if there is no row number
+    """
+    row_ids = sorted(row_id for row_id in rows if row_id is not None)
+    if not row_ids:
+        return None
+    lines = []
+    start = end = row_ids[0]
+    for row_id in row_ids[1:]:
+        if row_id != end + 1:
+            lines.append(start if start == end else f'{start}-{end}')
+            start = row_id
+        end = row_id
+    lines.append(start if start == end else f'{start}-{end}')
+    return lines
+
+
+def count_lines(lines):
+    """ Number of rows of a list of compressed row ranges. """
+    count = 0
+    for line in lines or []:
+        if isinstance(line, str):
+            start, end = line.split('-')
+            count += int(end) - int(start) + 1
+        else:
+            count += 1
+    return count
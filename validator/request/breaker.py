@@ -0,0 +1,86 @@
+import threading
+import time
+
+from validator.request.config import CIRCUIT_BREAKER
+
+
+class CircuitBreaker():
+    """Circuit breaker of an external service.
+    - closed: the calls go through, the consecutive failures are counted
+    - open: the failure threshold has been reached, the calls are short-circuited until the reset timeout expires
+    - half-open: the reset timeout has expired, a single trial call goes through to decide whether to close or re-open the circuit"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, name, failure_threshold=CIRCUIT_BREAKER['failure_threshold'], reset_timeout=CIRCUIT_BREAKER['reset_timeout']):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self) -> bool:
+        """Return True if a call to the service can be sent."""
+        with self.lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+    def trip(self):
+        """Open the circuit without waiting for the failure threshold (e.g. after a failed health probe)."""
+        with self.lock:
+            self.failures = max(self.failures, self.failure_threshold)
+            self.opened_at = time.monotonic()
+            self.trial_running = False
+
+
+class CircuitBreakerRegistry():
+    """Circuit breakers indexed by service name."""
+
+    def __init__(self, **settings):
+        self.settings = settings
+        self.breakers = {}
+        self.lock = threading.Lock()
+
+    def get(self, service) -> CircuitBreaker:
+        breaker = self.breakers.get(service)
+        if breaker is None:
+            with self.lock:
+                breaker = self.breakers.setdefault(service, CircuitBreaker(service, **self.settings))
+        return breaker
+
+    def states(self) -> dict:
+        return { service: breaker.state for service, breaker in list(self.breakers.items()) }
+
+
+# Registry shared by all the connectors of the process, so the real traffic and the service probes see the same states
+default_breakers = CircuitBreakerRegistry()
@@ -0,0 +1,163 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from validator.request.config import CACHE_TTLS, CACHE_NEGATIVE_TTL, CACHE_MAX_ENTRIES
+from validator.request.connector import Connector, NotFound
+from validator.request.prefetch import publication_ids
+from validator.schema import schema_cache_dir
+
+
+class CachedConnector(Connector):
+    """Connector wrapper storing the responses of the wrapped connector in a persistent SQLite cache.
+    The cache is shared by all the processes using the same database file (e.g. the Flask workers):
+    - each source (EuropePMC, OLS, GWAS Catalog) has its own time to live
+    - the "not found" responses are cached too (negative caching), with a shorter time to live
+    - the least recently used entries are evicted when the cache exceeds its maximum size.
+    Only the successful and "not found" lookups are cached, the service errors always reach the wrapped connector."""
+
+    # Number of writes between two evictions
+    eviction_interval = 100
+    # Minimum delay (in seconds) between two updates of the access time of an entry
+    access_time_resolution = 60
+
+    def __init__(self, connector: Connector, path, ttls: dict = None, negative_ttl=CACHE_NEGATIVE_TTL, max_entries=CACHE_MAX_ENTRIES):
+        super().__init__(logger=connector.logger)
+        self.connector = connector
+        self.urls = connector.urls
+        self.path = path
+        self.ttls = dict(CACHE_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.local = threading.local()
+        self.counters = {'hits': 0, 'misses': 0, 'negative_hits': 0, 'errors': 0, 'evictions': 0}
+        self.counters_lock = threading.Lock()
+        self.writes = 0
+        self.init_database()
+
+    def init_database(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = self.get_database()
+        with db:
+            db.execute("""CREATE TABLE IF NOT EXISTS lookups (
+                key TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                found INTEGER NOT NULL,
+                response TEXT,
+                expires REAL NOT NULL,
+                accessed REAL NOT NULL)""")
+            db.execute("CREATE INDEX IF NOT EXISTS lookups_accessed ON lookups (accessed)")
+
+    def get_database(self):
+        """Return the SQLite connection of the current thread (SQLite connections can't be shared between threads)."""
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            # Write-ahead logging: the readers of the other processes are not blocked by a writer
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self.local.db = db
+        return db
+
+    def count(self, counter, value=1):
+        with self.counters_lock:
+            self.counters[counter] += value
+
+    def stats(self) -> dict:
+        """Hit/miss counters of the cache since the creation of the connector."""
+        with self.counters_lock:
+            stats = dict(self.counters)
+        lookups = stats['hits'] + stats['negative_hits'] + stats['misses']
+        stats['hit_ratio'] = (stats['hits'] + stats['negative_hits']) / lookups if lookups else 0
+        return stats
+
+    def request(self, url, params=None) -> dict:
+        return self.connector.request(url, params)
+
+    def get_publication(self, doi=None, pmid=None) -> dict:
+        doi, pmid = publication_ids(doi, pmid)
+        return self.cached('europepmc', ['publication', doi, pmid], self.connector.get_publication, doi=doi, pmid=pmid)
+
+    def get_efo_trait(self, efo_id) -> dict:
+        return self.cached('ols_efo', ['efo_trait', efo_id], self.connector.get_efo_trait, efo_id)
+
+    def get_gwas(self, gcst_id) -> dict:
+        return self.cached('gwas', ['gwas', gcst_id], self.connector.get_gwas, gcst_id)
+
+    def cached(self, source, key, method, *args, **kwargs):
+        """Return the cached response of the lookup, or send it to the wrapped connector and cache its response."""
+        key = json.dumps(key)
+        now = time.time()
+        try:
+            entry = self.get_database().execute("SELECT found, response, accessed FROM lookups WHERE key = ? AND expires > ?", (key, now)).fetchone()
+        except sqlite3.Error as e:
+            # The cache is only an optimisation: the lookup is still done if it can't be read
+            self.logger.error(f'Lookup cache error: {e}', __name__)
+            self.count('errors')
+            entry = None
+
+        if entry:
+            found, response, accessed = entry
+            if now - accessed > self.access_time_resolution:
+                self.write("UPDATE lookups SET accessed = ? WHERE key = ?", (now, key))
+            if found:
+                self.count('hits')
+                return json.loads(response)
+            self.count('negative_hits')
+            raise NotFound(response)
+
+        self.count('misses')
+        try:
+            response = method(*args, **kwargs)
+        except NotFound as e:
+            self.store(key, source, False, str(e), now + self.negative_ttl)
+            raise e
+        self.store(key, source, True, json.dumps(response), now + self.ttls.get(source, 0))
+        return response
+
+    def store(self, key, source, found, response, expires):
+        self.write("INSERT OR REPLACE INTO lookups (key, source, found, response, expires, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                   (key, source, int(found), response, expires, time.time()))
+        with self.counters_lock:
+            self.writes += 1
+            evict = self.writes % self.eviction_interval == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Delete the expired entries, then the least recently used ones above the maximum size of the cache."""
+        db = self.get_database()
+        try:
+            with db:
+                deleted = db.execute("DELETE FROM lookups WHERE expires <= ?", (time.time(),)).rowcount
+                extra = db.execute("SELECT COUNT(*) FROM lookups").fetchone()[0] - self.max_entries
+                if extra > 0:
+                    deleted += db.execute("DELETE FROM lookups WHERE key IN (SELECT key FROM lookups ORDER BY accessed LIMIT ?)", (extra,)).rowcount
+            self.count('evictions', deleted)
+        except sqlite3.Error as e:
+            self.logger.error(f'Lookup cache error: {e}', __name__)
+            self.count('errors')
+
+    def write(self, query, params):
+        db = self.get_database()
+        try:
+            with db:
+                db.execute(query, params)
+        except sqlite3.Error as e:
+            self.logger.error(f'Lookup cache error: {e}', __name__)
+            self.count('errors')
+
+
+def lookup_cache_path():
+    """
+    Path of the lookup cache database (can be changed with the environment variable PGS_LOOKUP_CACHE).
+    Return None if the cache is disabled (PGS_LOOKUP_CACHE set to an empty value).
+    """
+    path = os.environ.get('PGS_LOOKUP_CACHE', os.path.join(schema_cache_dir(), 'lookup_cache.sqlite'))
+    return path or None
@@ -3,3 +3,54 @@ URLS = {
     'ols_efo': 'https://www.ebi.ac.uk/ols/api/ontologies/efo/terms',
     'gwas': 'https://www.ebi.ac.uk/gwas/rest/api/studies'
 }
+
+# Timeouts (in seconds) of the HTTP requests
+TIMEOUTS = {
+    'connect': 5,
+    'read': 10
+}
+
+# Retries of the requests failing because of a service error (5xx, timeout or connection error).
+# The delay before the retry N is backoff_factor * 2^(N-1) seconds, capped at max_backoff.
+# With the default timeouts, a lookup to a service which doesn't respond takes at most (5 + 10) * 2 + 0.5 = 30.5 seconds,
+# so it can't hold the synchronous endpoint beyond its timeout (VALIDATION_SYNC_TIMEOUT, see main.py).
+RETRIES = {
+    'max_retries': 1,
+    'backoff_factor': 0.5,
+    'max_backoff': 8
+}
+
+# Maximum number of kept-alive connections per host
+POOL_SIZE = 10
+
+# Time to live (in seconds) of the responses stored in the persistent lookup cache, per source
+CACHE_TTLS = {
+    'europepmc': 7 * 24 * 3600,
+    'ols_efo': 30 * 24 * 3600,
+    'gwas': 30 * 24 * 3600
+}
+# Time to live (in seconds) of the cached "not found" responses
+CACHE_NEGATIVE_TTL = 24 * 3600
+# Maximum number of responses kept in the lookup cache (the least recently used ones are evicted first)
+CACHE_MAX_ENTRIES = 100000
+
+# Labels of the external services
+SERVICE_LABELS = {
+    'europepmc': 'Europe PMC',
+    'ols_efo': 'Ontology Lookup Service',
+    'gwas': 'GWAS Catalog'
+}
+
+# Circuit breaker of the external services: after "failure_threshold" consecutive failures (5xx, timeouts, connection errors),
+# the calls to the service are short-circuited during "reset_timeout" seconds, then a trial call is let through.
+CIRCUIT_BREAKER = {
+    'failure_threshold': 3,
+    'reset_timeout': 30
+}
+
+# Health check of the external services: short timeouts (in seconds) of the probes, and time to live (in seconds) of the services statuses
+HEALTH_CHECK = {
+    'connect_timeout': 2,
+    'read_timeout': 5,
+    'ttl': 60
+}
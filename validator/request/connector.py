@@ -1,13 +1,23 @@
 from abc import abstractmethod, ABC
 import importlib
-from validator.request.config import URLS
+from validator.request.breaker import CircuitBreakerRegistry, default_breakers
+from validator.request.config import URLS, TIMEOUTS, RETRIES, POOL_SIZE, SERVICE_LABELS
 import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+# Functions called after each request sent to an external service, with the parameters (service, duration in seconds, outcome),
+# the outcome being 'success', 'not_found', 'error' (service not working), 'unavailable' (circuit breaker open) or 'unknown_error'.
+# Used to collect metrics (see main.py).
+request_hooks = []
 
 
 class ConnectorException(Exception):
-    def __init__(self, message=None, url=None):
+    def __init__(self, message=None, url=None, service=None):
         super().__init__(message)
         self.url = url
+        self.service = service
 
 
 class NotFound(ConnectorException):
@@ -20,11 +30,24 @@ class ServiceNotWorking(ConnectorException):
     pass
 
 
+class ServiceUnavailable(ServiceNotWorking):
+    """The requested web service is considered as unavailable (circuit breaker open): the request was not sent."""
+    pass
+
+
 class UnknownError(ConnectorException):
     """The request returned an unknown error. For example the response might be valid but the content format is not as expected."""
     pass
 
 
+def notify_request_hooks(service, duration, outcome):
+    for hook in request_hooks:
+        try:
+            hook(service, duration, outcome)
+        except Exception:
+            logging.getLogger(__name__).exception('Request hook failed')
+
+
 class Logger(ABC):
     """Logger abstract class for logging any message related to the Connector."""
     def debug(self, message, name=None):
@@ -52,18 +75,49 @@ class DefaultLogger(Logger):
 
 class Connector(ABC):
     """This class handles connections to external web resources and validate the returned responses.
-    It is abstract, the method "request" must be implemented in subclasses depending on the environment."""
-    def __init__(self, urls: dict = None, logger: Logger = DefaultLogger()):
-        self.urls = URLS
+    It is abstract, the method "request" must be implemented in subclasses depending on the environment.
+    The calls to each service go through a circuit breaker, shared by default by all the connectors of the process."""
+    def __init__(self, urls: dict = None, logger: Logger = DefaultLogger(), breakers: CircuitBreakerRegistry = default_breakers):
+        self.urls = dict(URLS)
         self.logger = logger
+        self.breakers = breakers
         if urls:
-            self.urls = self.urls.update(urls)
+            self.urls.update(urls)
 
     @abstractmethod
     def request(self, url, params=None) -> dict:
         """Method performing the HTTP GET request to the given URL. Returns the JSON response as a dictionary."""
         raise NotImplementedError
 
+    def request_service(self, service, url, params=None) -> dict:
+        """Send the request to the given service (key of the URLS dictionary), through its circuit breaker."""
+        breaker = self.breakers.get(service)
+        if not breaker.allow():
+            notify_request_hooks(service, 0, 'unavailable')
+            raise ServiceUnavailable('%s is unavailable (%s)' % (SERVICE_LABELS.get(service, service), url), url, service)
+        start_time = time.perf_counter()
+        try:
+            response = self.request(url, params)
+        except ServiceNotWorking as e:
+            breaker.record_failure()
+            notify_request_hooks(service, time.perf_counter() - start_time, 'error')
+            e.service = service
+            raise e
+        except ConnectorException as e:
+            # The service is working, even if the entry can't be found
+            breaker.record_success()
+            notify_request_hooks(service, time.perf_counter() - start_time, 'not_found' if isinstance(e, NotFound) else 'unknown_error')
+            e.service = service
+            raise e
+        except BaseException:
+            # Any other error (e.g. in the session setup, or interruption) still ends the trial call of a half-open circuit,
+            # otherwise the circuit would stay half-open with no trial call allowed
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+        notify_request_hooks(service, time.perf_counter() - start_time, 'success')
+        return response
+
     def get_publication(self, doi=None, pmid=None) -> dict:
         params = {'format': 'json'}
         if doi:
@@ -72,7 +126,7 @@ class Connector(ABC):
             params['query'] = 'ext_id:' + str(pmid)
         else:
             return {}
-        response = self.request(self.urls["europepmc"], params)
+        response = self.request_service('europepmc', self.urls["europepmc"], params)
         # EuropePMC request doesn't return 404 if no result but a valid JSON with an empty 'result' list.
         if 'resultList' in response and 'result' in response['resultList'] and len(response['resultList']['result']) == 1:
             return response['resultList']['result'][0]
@@ -91,7 +145,7 @@ class Connector(ABC):
 
     def get_efo_trait(self, efo_id) -> dict:
         url = self.urls["ols_efo"] + '?obo_id=%s' % efo_id.replace('_', ':')
-        response = self.request(url)
+        response = self.request_service('ols_efo', url)
         # If not found the response should return 404.
         if '_embedded' in response and 'terms' in response['_embedded'] and len(response['_embedded']['terms']) == 1:
             return response['_embedded']['terms'][0]
@@ -100,34 +154,100 @@ class Connector(ABC):
 
     def get_gwas(self, gcst_id) -> dict:
         # Returns 404 if not found.
-        return self.request(f'{self.urls["gwas"]}/{gcst_id}')
+        return self.request_service('gwas', f'{self.urls["gwas"]}/{gcst_id}')
 
 
 class DefaultConnector(Connector):
-    """Default implementation of Connector using the standard requests python library."""
+    """Default implementation of Connector using the standard requests python library.
+    The connections are kept alive and pooled in one session per host, the requests have connect/read timeouts
+    and the ones failing because of a service error are retried with an exponential backoff."""
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, urls: dict = None, logger: Logger = DefaultLogger(), connect_timeout=TIMEOUTS['connect'], read_timeout=TIMEOUTS['read'],
+                 max_retries=RETRIES['max_retries'], backoff_factor=RETRIES['backoff_factor'], max_backoff=RETRIES['max_backoff'], pool_size=POOL_SIZE):
+        super().__init__(urls, logger)
         try:
             self.requests = importlib.import_module('requests')
         except ImportError as e:
             print('"requests" module is missing.')
             raise e
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.pool_size = pool_size
+        self.sessions = {}
+        self.sessions_lock = threading.Lock()
+
+    def get_session(self, url):
+        """Return the session of the URL host, creating it on first use."""
+        host = urlsplit(url).netloc
+        session = self.sessions.get(host)
+        if session is None:
+            with self.sessions_lock:
+                session = self.sessions.get(host)
+                if session is None:
+                    session = self.requests.Session()
+                    # The retries are handled in request() as the status codes need to be checked too
+                    adapter = self.requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self.sessions[host] = session
+        return session
+
+    def connection_stats(self) -> dict:
+        """Number of requests sent and of connections opened per host. The difference is the number of reused connections."""
+        stats = {}
+        for host, session in list(self.sessions.items()):
+            requests_count = 0
+            connections_count = 0
+            for adapter in set(session.adapters.values()):
+                pools = adapter.poolmanager.pools
+                for pool_key in pools.keys():
+                    pool = pools.get(pool_key)
+                    if pool:
+                        requests_count += pool.num_requests
+                        connections_count += pool.num_connections
+            stats[host] = {'requests': requests_count, 'connections': connections_count, 'reused': requests_count - connections_count}
+        return stats
+
+    def close(self):
+        """Close all the pooled connections."""
+        with self.sessions_lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions = {}
 
     def __do_request(self, url, params=None) -> dict:
-        r = self.requests.get(url, params=params)
+        try:
+            r = self.get_session(url).get(url, params=params, timeout=self.timeout)
+        except (self.requests.exceptions.ConnectionError, self.requests.exceptions.Timeout) as e:
+            raise ServiceNotWorking('%s (%s)' % (e.__class__.__name__, url), url)
+        except self.requests.exceptions.RequestException as e:
+            raise UnknownError('%s (%s)' % (e.__class__.__name__, url), url)
         if r.status_code == 404:
             raise NotFound('Status code: %d (%s)' % (r.status_code, url), url)
         if 500 <= r.status_code < 600:
             raise ServiceNotWorking('Status code: %d (%s)' % (r.status_code, url), url)
         if r.status_code != 200:
             raise UnknownError('Status code: %d (%s)' % (r.status_code, url), url)
-        return r.json()
-
-    def request(self, url, params=None) -> dict:
         try:
-            return self.__do_request(url, params)
-        except ConnectorException as e:
-            self.logger.debug("Exception: {}. URL: {}".format(str(e), e.url), __name__)
-            raise e
+            return r.json()
+        except ValueError:
+            raise UnknownError('Invalid JSON response (%s)' % url, url)
 
+    def request(self, url, params=None) -> dict:
+        attempt = 0
+        while True:
+            try:
+                return self.__do_request(url, params)
+            except ServiceNotWorking as e:
+                if attempt >= self.max_retries:
+                    self.logger.debug("Exception: {}. URL: {}".format(str(e), e.url), __name__)
+                    raise e
+                delay = min(self.backoff_factor * (2 ** attempt), self.max_backoff)
+                attempt += 1
+                self.logger.debug("Exception: {}. URL: {}. Retry {}/{} in {}s".format(str(e), e.url, attempt, self.max_retries, delay), __name__)
+                time.sleep(delay)
+            except ConnectorException as e:
+                self.logger.debug("Exception: {}. URL: {}".format(str(e), e.url), __name__)
+                raise e
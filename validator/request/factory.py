@@ -0,0 +1,27 @@
+import logging
+import sqlite3
+
+from validator.request.cache import CachedConnector, lookup_cache_path
+from validator.request.connector import Connector, DefaultConnector
+from validator.request.offline import OfflineConnector
+
+logger = logging.getLogger(__name__)
+
+
+def create_connector(offline_index_dir=None, lookup_cache=True) -> Connector:
+    """
+    Create the connector used for the external lookups:
+    - offline_index_dir: directory of the local reference indexes (offline lookups)
+    - lookup_cache: use the persistent lookup cache (see lookup_cache_path), for the online lookups
+    The lookups are done without cache if the cache database can't be opened (e.g. unwritable directory, corrupted file).
+    """
+    if offline_index_dir:
+        return OfflineConnector(offline_index_dir)
+    connector = DefaultConnector()
+    if lookup_cache and lookup_cache_path():
+        try:
+            connector = CachedConnector(connector, lookup_cache_path())
+        except (sqlite3.Error, OSError) as e:
+            # The cache is only an optimisation, the validation can carry on without it
+            logger.warning(f'Can\'t open the lookup cache "{lookup_cache_path()}", the lookups are not cached: {e}')
+    return connector
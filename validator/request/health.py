@@ -0,0 +1,196 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from validator.request.config import HEALTH_CHECK, SERVICE_LABELS
+from validator.request.connector import ConnectorException, DefaultConnector, NotFound, ServiceNotWorking, ServiceUnavailable
+from validator.schema import schema_cache_dir
+
+logger = logging.getLogger(__name__)
+
+# Probe of each external service: a lookup of a known entry
+PROBES = {
+    'europepmc': lambda connector: connector.get_publication(pmid=1),
+    'ols_efo': lambda connector: connector.get_efo_trait('EFO_0001645'),
+    'gwas': lambda connector: connector.get_gwas('GCST90132222')
+}
+
+# Statuses of a service: working, unexpected answer (the checks are still attempted),
+# not working (5xx error, timeout, connection error) or unavailable (circuit breaker open)
+STATUS_OK = 'ok'
+STATUS_ERROR = 'error'
+STATUS_NOT_WORKING = 'not_working'
+STATUS_UNAVAILABLE = 'unavailable'
+
+
+class HealthChecker():
+    """
+    Status of the external services (EuropePMC, OLS, GWAS Catalog), used to decide which checks to attempt.
+    - the services are probed concurrently, with short timeouts and without retries (see create_probe_connector)
+    - the statuses are kept for 'ttl' seconds, in memory and optionally in a file shared by the processes (e.g. command line runs)
+    - in the server, a background thread refreshes the statuses (see start), so the validations never wait for the probes.
+    The probes go through the same circuit breakers as the validation lookups.
+    """
+
+    def __init__(self, connector, ttl=HEALTH_CHECK['ttl'], cache_file=None):
+        self.connector = connector
+        self.ttl = ttl
+        self.cache_file = cache_file
+        # {service: {'status', 'message'}}, and time of the probes (seconds since the epoch)
+        self.statuses = {}
+        self.checked_at = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def probe(self):
+        """ Probe all the services concurrently and store their statuses. Return the statuses. """
+
+        def probe_service(service):
+            try:
+                PROBES[service](self.connector)
+            except ServiceUnavailable as e:
+                return service, {'status': STATUS_UNAVAILABLE, 'message': str(e)}
+            except ServiceNotWorking as e:
+                return service, {'status': STATUS_NOT_WORKING, 'message': str(e)}
+            except NotFound:
+                # The service answers
+                pass
+            except ConnectorException as e:
+                return service, {'status': STATUS_ERROR, 'message': str(e)}
+            return service, {'status': STATUS_OK}
+
+        with ThreadPoolExecutor(max_workers=len(PROBES)) as executor:
+            statuses = dict(executor.map(probe_service, PROBES))
+        with self.lock:
+            self.statuses = statuses
+            self.checked_at = time.time()
+        self.write_cache()
+        return statuses
+
+    def is_fresh(self):
+        return self.checked_at is not None and time.time() - self.checked_at < self.ttl
+
+    def check(self):
+        """ Return the statuses of the services, probed again only if they are older than the time to live. """
+        with self.lock:
+            if self.is_fresh():
+                return dict(self.statuses)
+        if self.read_cache():
+            return dict(self.statuses)
+        return self.probe()
+
+    def unavailable_services(self):
+        """
+        Services which were not working at the last probe (keys of SERVICE_LABELS), without probing them: their checks can be skipped.
+        Empty if the services haven't been probed yet or if their statuses are too old (the checks are attempted).
+        """
+        with self.lock:
+            if not self.is_fresh():
+                return set()
+            return { service for service, status in self.statuses.items() if status['status'] in (STATUS_NOT_WORKING, STATUS_UNAVAILABLE) }
+
+    def warnings(self):
+        """ Warnings about the services which are not working (probed if needed), e.g. for the command line output. """
+        warnings = []
+        for service, status in self.check().items():
+            if status['status'] == STATUS_UNAVAILABLE:
+                warnings.append(f'{SERVICE_LABELS[service]} is unavailable (too many recent failures): the related checks will be reported as unverified.')
+            elif status['status'] == STATUS_NOT_WORKING:
+                warnings.append(f'{SERVICE_LABELS[service]} is not working ({status["message"]}): the related checks will be reported as unverified.')
+            elif status['status'] == STATUS_ERROR:
+                warnings.append(f'{SERVICE_LABELS[service]} returned an unexpected error. Check the service status.')
+        return warnings
+
+    def to_dict(self):
+        """ Statuses of the last probes (e.g. health endpoint): {'checked': time, 'services': {label: status}} """
+        with self.lock:
+            return {
+                'checked': self.checked_at,
+                'services': { SERVICE_LABELS[service]: dict(status) for service, status in self.statuses.items() }
+            }
+
+    def start(self):
+        """ Refresh the statuses in a background thread, every 'ttl' seconds (see stop). Nothing is done if the thread is already started. """
+        if self.thread:
+            return
+
+        def refresh():
+            while not self.stop_event.is_set():
+                try:
+                    self.probe()
+                except Exception:
+                    logger.exception('Health check of the external services failed')
+                # Probed again a bit before the statuses expire
+                self.stop_event.wait(self.ttl * 0.9)
+
+        with self.lock:
+            if self.thread:
+                return
+            self.thread = threading.Thread(target=refresh, name='health-checker', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def read_cache(self):
+        """ Read the statuses of the cache file if they are still valid. Return True if they are. """
+        if not self.cache_file:
+            return False
+        try:
+            with open(self.cache_file) as cache:
+                data = json.load(cache)
+            statuses, checked_at = data['statuses'], data['checked']
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f'Ignoring the unreadable health check cache "{self.cache_file}": {e}')
+            return False
+        if set(statuses) != set(PROBES) or time.time() - checked_at >= self.ttl:
+            return False
+        with self.lock:
+            self.statuses = statuses
+            self.checked_at = checked_at
+        return True
+
+    def write_cache(self):
+        """ Write the statuses in the cache file. The file is written atomically so concurrent processes never read a partial file. """
+        if not self.cache_file:
+            return
+        try:
+            cache_dir = os.path.dirname(self.cache_file)
+            os.makedirs(cache_dir, exist_ok=True)
+            fd, tmp_file = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as tmp:
+                    with self.lock:
+                        json.dump({'statuses': self.statuses, 'checked': self.checked_at}, tmp)
+                os.replace(tmp_file, self.cache_file)
+            except BaseException:
+                os.remove(tmp_file)
+                raise
+        except OSError as e:
+            # The cache is only an optimisation
+            logger.warning(f'Can\'t write the health check cache "{self.cache_file}": {e}')
+
+
+def create_probe_connector():
+    """ Connector of the probes: direct requests (no lookup cache), with short timeouts and without retries. """
+    return DefaultConnector(connect_timeout=HEALTH_CHECK['connect_timeout'], read_timeout=HEALTH_CHECK['read_timeout'], max_retries=0)
+
+
+def health_check_ttl():
+    """ Time to live (in seconds) of the statuses of the external services (can be changed with the environment variable PGS_HEALTH_CHECK_TTL). """
+    return float(os.environ.get('PGS_HEALTH_CHECK_TTL', HEALTH_CHECK['ttl']))
+
+
+def health_cache_path():
+    """ Path of the file sharing the statuses of the external services between the processes (e.g. successive command line runs). """
+    return os.path.join(schema_cache_dir(), 'health.json')
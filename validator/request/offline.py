@@ -0,0 +1,218 @@
+import csv
+import datetime
+import json
+import os
+import sqlite3
+import tempfile
+
+from validator.request.config import SERVICE_LABELS
+from validator.request.connector import Connector, DefaultLogger, Logger, NotFound, ServiceUnavailable, UnknownError
+from validator.schema import file_checksum
+
+# Bump this number when the structure of the index files changes: the indexes must then be rebuilt
+INDEX_FORMAT_VERSION = 1
+
+# Index file name per source (service)
+INDEX_FILES = {
+    'europepmc': 'publications.sqlite',
+    'ols_efo': 'efo.sqlite',
+    'gwas': 'gwas.sqlite'
+}
+
+# Size of the memory map used to read the index files (in bytes)
+INDEX_MMAP_SIZE = 1024 * 1024 * 1024
+
+
+class OfflineConnector(Connector):
+    """Connector answering the lookups from local reference indexes, without any network access.
+    The indexes are SQLite files (one per source, built with build_reference_index.py) opened read-only and memory-mapped,
+    so opening them is cheap whatever their size and each lookup is a single B-tree search.
+    A source without index is reported as unavailable, so the related checks are reported as unverified."""
+
+    def __init__(self, index_dir, logger: Logger = DefaultLogger()):
+        super().__init__(logger=logger)
+        self.index_dir = index_dir
+        self.indexes = {}
+        for source, index_file in INDEX_FILES.items():
+            index_path = os.path.join(index_dir, index_file)
+            if os.path.exists(index_path):
+                self.indexes[source] = open_index(index_path)
+            else:
+                logger.info(f'No offline index for {SERVICE_LABELS[source]} ({index_path})', __name__)
+
+    def request(self, url, params=None) -> dict:
+        raise UnknownError(message="The offline connector can't send HTTP requests (%s)" % url, url=url)
+
+    def lookup(self, source, key):
+        """Return the indexed entry of the given source, or None if there is no entry for this key."""
+        index = self.indexes.get(source)
+        if index is None:
+            raise ServiceUnavailable('%s has no offline index in %s' % (SERVICE_LABELS[source], self.index_dir), service=source)
+        row = index.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        if row:
+            return json.loads(row[0])
+        return None
+
+    def get_publication(self, doi=None, pmid=None) -> dict:
+        if not doi and not pmid:
+            return {}
+        result = None
+        if doi:
+            result = self.lookup('europepmc', publication_key(doi=doi))
+        if not result and pmid:
+            result = self.lookup('europepmc', publication_key(pmid=pmid))
+        if not result:
+            raise NotFound(message="No result found for DOI:{} or PMID:{}".format(doi, pmid), service='europepmc')
+        return result
+
+    def get_efo_trait(self, efo_id) -> dict:
+        result = self.lookup('ols_efo', efo_id.replace(':', '_'))
+        if not result:
+            raise NotFound(message="No result found for the trait %s" % efo_id, service='ols_efo')
+        return result
+
+    def get_gwas(self, gcst_id) -> dict:
+        result = self.lookup('gwas', gcst_id)
+        if not result:
+            raise NotFound(message="No result found for the GWAS Study %s" % gcst_id, service='gwas')
+        return result
+
+    def index_versions(self) -> dict:
+        """Metadata (format version, source file, build date...) of each loaded index."""
+        return { source: dict(index.execute("SELECT name, value FROM metadata").fetchall()) for source, index in self.indexes.items() }
+
+
+def open_index(index_path):
+    """ Open an index file in read-only mode and check its format version. """
+    index = sqlite3.connect(f'file:{index_path}?mode=ro&immutable=1', uri=True, check_same_thread=False)
+    index.execute(f"PRAGMA mmap_size={INDEX_MMAP_SIZE}")
+    metadata = dict(index.execute("SELECT name, value FROM metadata").fetchall())
+    if metadata.get('format_version') != str(INDEX_FORMAT_VERSION):
+        index.close()
+        raise ValueError(f'The index "{index_path}" has the format version {metadata.get("format_version")} '
+                         f'instead of {INDEX_FORMAT_VERSION}: it needs to be rebuilt')
+    return index
+
+
+def publication_key(doi=None, pmid=None):
+    if doi:
+        return 'doi:' + str(doi).strip().lower()
+    return 'pmid:' + str(pmid).strip().removesuffix('.0')
+
+
+#===================#
+#  Index builders   #
+#===================#
+
+def write_index(index_path, source_path, source, entries):
+    """
+    Write the index of a source, from an iterable of (key, entry) tuples.
+    The index is written in a temporary file and then moved, so the connectors never read a partial index.
+    > Return: number of indexed entries
+    """
+    index_dir = os.path.dirname(os.path.abspath(index_path))
+    os.makedirs(index_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=index_dir, suffix='.tmp')
+    os.close(fd)
+    try:
+        index = sqlite3.connect(tmp_path)
+        with index:
+            index.execute("PRAGMA journal_mode=OFF")
+            index.execute("CREATE TABLE entries (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID")
+            index.execute("CREATE TABLE metadata (name TEXT PRIMARY KEY, value TEXT)")
+            index.executemany("INSERT OR REPLACE INTO entries (key, value) VALUES (?, ?)", ((key, json.dumps(entry)) for key, entry in entries))
+            count = index.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            metadata = {
+                'format_version': INDEX_FORMAT_VERSION,
+                'source': source,
+                'source_file': os.path.basename(source_path),
+                'source_sha256': file_checksum(source_path),
+                'built': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+                'entries': count
+            }
+            index.executemany("INSERT INTO metadata (name, value) VALUES (?, ?)", ((name, str(value)) for name, value in metadata.items()))
+        index.execute("VACUUM")
+        index.close()
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return count
+
+
+def build_efo_index(obo_path, index_dir):
+    """ Build the EFO index from an ontology dump in OBO format (e.g. efo.obo). """
+    return write_index(os.path.join(index_dir, INDEX_FILES['ols_efo']), obo_path, 'ols_efo', obo_index_entries(parse_obo_terms(obo_path)))
+
+
+def parse_obo_terms(obo_path):
+    """ Parse the terms ([Term] stanzas) of an OBO file. """
+    term = None
+    with open(obo_path, encoding='utf-8') as obo_file:
+        for line in obo_file:
+            line = line.strip()
+            if line.startswith('['):
+                if term:
+                    yield term
+                term = {} if line == '[Term]' else None
+            elif term is not None and ': ' in line:
+                tag, value = line.split(': ', 1)
+                if tag == 'id':
+                    term['obo_id'] = value
+                elif tag == 'name':
+                    term['label'] = value
+                elif tag == 'is_obsolete':
+                    term['is_obsolete'] = value == 'true'
+    if term:
+        yield term
+
+
+def obo_index_entries(terms):
+    """ Index the terms by short form (e.g. EFO_0001645), in the format of the OLS REST API. """
+    for term in terms:
+        if 'obo_id' in term and 'label' in term:
+            short_form = term['obo_id'].replace(':', '_')
+            yield short_form, {'obo_id': term['obo_id'], 'short_form': short_form, 'label': term['label'], 'is_obsolete': term.get('is_obsolete', False)}
+
+
+def build_gwas_index(ancestry_tsv_path, index_dir):
+    """
+    Build the GWAS Catalog index from the "All ancestry data" export (TSV).
+    The studies are stored in the format of the GWAS Catalog REST API (only the fields used by the validator).
+    """
+    studies = {}
+    with open(ancestry_tsv_path, encoding='utf-8', newline='') as tsv_file:
+        for row in csv.DictReader(tsv_file, delimiter='\t'):
+            gcst_id = row['STUDY ACCESSION'].strip()
+            if gcst_id not in studies:
+                studies[gcst_id] = {'accessionId': gcst_id, 'publicationInfo': {'pubmedId': row.get('PUBMED ID')}, 'ancestries': []}
+            number_of_individuals = row.get('NUMBER OF INDIVIDUALS')
+            studies[gcst_id]['ancestries'].append({
+                'type': row.get('STAGE'),
+                'numberOfIndividuals': int(number_of_individuals) if number_of_individuals and number_of_individuals.isdigit() else None,
+                'ancestralGroups': [ {'ancestralGroup': x} for x in split_list(row.get('BROAD ANCESTRAL CATEGORY')) ],
+                'countryOfOrigin': [ {'countryName': x} for x in split_list(row.get('COUNTRY OF ORIGIN')) ],
+                'countryOfRecruitment': [ {'countryName': x} for x in split_list(row.get('COUNTRY OF RECRUITMENT')) ]
+            })
+    return write_index(os.path.join(index_dir, INDEX_FILES['gwas']), ancestry_tsv_path, 'gwas', studies.items())
+
+
+def build_publication_index(jsonl_path, index_dir):
+    """ Build the publication index from a JSON Lines file of EuropePMC search results (1 result per line). """
+    def entries():
+        with open(jsonl_path, encoding='utf-8') as jsonl_file:
+            for line in jsonl_file:
+                if line.strip():
+                    result = json.loads(line)
+                    if result.get('doi'):
+                        yield publication_key(doi=result['doi']), result
+                    if result.get('pmid'):
+                        yield publication_key(pmid=result['pmid']), result
+    return write_index(os.path.join(index_dir, INDEX_FILES['europepmc']), jsonl_path, 'europepmc', entries())
+
+
+def split_list(value):
+    if not value:
+        return []
+    return [ x.strip() for x in value.split(',') if x.strip() ]
+
@@ -0,0 +1,98 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+from validator.profiler import null_profiler
+from validator.request.config import SERVICE_LABELS
+from validator.request.connector import Connector, ServiceUnavailable
+
+# Maximum number of concurrent requests sent during the prefetch phase
+PREFETCH_WORKERS = 8
+
+# External service of each type of lookup
+LOOKUP_SERVICES = {
+    'publication': 'europepmc',
+    'efo_trait': 'ols_efo',
+    'gwas': 'gwas'
+}
+
+
+class PrefetchedConnector(Connector):
+    """Connector wrapper answering the lookups from the results resolved during the prefetch phase.
+    Each distinct lookup is sent once to the wrapped connector: the response (or the raised exception) is stored
+    and then replayed to the validation steps. Lookups which were not prefetched are resolved on first use.
+    The lookups of the skipped services (e.g. known to be down by the health check) are not sent: they raise ServiceUnavailable."""
+
+    def __init__(self, connector: Connector, profiler=null_profiler, skipped_services=()):
+        super().__init__(logger=connector.logger)
+        self.connector = connector
+        self.profiler = profiler
+        self.skipped_services = set(skipped_services)
+        self.urls = connector.urls
+        self.results = {}
+        self.results_lock = threading.Lock()
+
+    def request(self, url, params=None) -> dict:
+        return self.connector.request(url, params)
+
+    def get_publication(self, doi=None, pmid=None) -> dict:
+        doi, pmid = publication_ids(doi, pmid)
+        return self.lookup(('publication', doi, pmid), self.connector.get_publication, doi=doi, pmid=pmid)
+
+    def get_efo_trait(self, efo_id) -> dict:
+        return self.lookup(('efo_trait', efo_id), self.connector.get_efo_trait, efo_id)
+
+    def get_gwas(self, gcst_id) -> dict:
+        return self.lookup(('gwas', gcst_id), self.connector.get_gwas, gcst_id)
+
+    def lookup(self, key, method, *args, **kwargs):
+        """Return the stored response of the lookup (or raise its stored exception), resolving it first if needed."""
+        service = LOOKUP_SERVICES[key[0]]
+        if key not in self.results and service in self.skipped_services:
+            with self.results_lock:
+                self.results.setdefault(key, (False, ServiceUnavailable(f'{SERVICE_LABELS[service]} is unavailable (health check)', service=service)))
+            self.profiler.count('lookups_skipped')
+        if key not in self.results:
+            try:
+                with self.profiler.timer(f'lookup.{key[0]}'):
+                    result = (True, method(*args, **kwargs))
+            except Exception as e:
+                result = (False, e)
+            with self.results_lock:
+                self.results.setdefault(key, result)
+        else:
+            self.profiler.count('lookups_reused')
+        is_success, response = self.results[key]
+        if not is_success:
+            raise response
+        return response
+
+    def prefetch(self, publications=(), efo_ids=(), gcst_ids=(), max_workers=PREFETCH_WORKERS):
+        """Resolve concurrently all the given identifiers (publications are (DOI, PMID) tuples)."""
+        lookups = []
+        for doi, pmid in set(publication_ids(doi, pmid) for doi, pmid in publications):
+            if doi or pmid:
+                lookups.append((self.get_publication, (doi, pmid)))
+        for efo_id in set(efo_ids):
+            lookups.append((self.get_efo_trait, (efo_id,)))
+        for gcst_id in set(gcst_ids):
+            lookups.append((self.get_gwas, (gcst_id,)))
+        if not lookups:
+            return
+
+        def resolve(lookup):
+            method, args = lookup
+            try:
+                method(*args)
+            except Exception:
+                # Stored and raised again when the validation reads the result
+                pass
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(lookups))) as executor:
+            list(executor.map(resolve, lookups))
+
+
+def publication_ids(doi=None, pmid=None):
+    """Normalise the publication identifiers, so the same publication always gives the same lookup."""
+    doi = str(doi).strip() if doi else None
+    pmid = str(pmid).strip().removesuffix('.0') if pmid else None
+    return doi or None, pmid or None
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from validator import __version__
+from validator.schema import schema_cache_dir
+
+logger = logging.getLogger(__name__)
+
+# Bump this number when the structure of the stored results changes
+RESULT_CACHE_FORMAT = 1
+# Time to live (in seconds) of the validation results
+RESULT_CACHE_TTL = 24 * 3600
+# Maximum number of validation results kept in the cache (the least recently used ones are evicted first)
+RESULT_CACHE_MAX_ENTRIES = 1000
+
+
+class ResultCache():
+    """
+    Persistent SQLite cache of the validation results of whole files, so the same file submitted again (retries, shared links...)
+    gets its result without being validated again.
+    - a result is indexed by the SHA-256 checksum of the file content, the checksum of the template schema and the validator version
+    - the files can also be found by an alias of their content (e.g. MD5 checksum provided by the storage service),
+      so a known file doesn't need to be downloaded to find its result
+    - the results expire after a time to live, and the least recently used ones are evicted above the maximum size of the cache.
+    """
+
+    # Number of writes between two evictions
+    eviction_interval = 10
+
+    def __init__(self, path, ttl=RESULT_CACHE_TTL, max_entries=RESULT_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.init_database()
+
+    def init_database(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = self.get_database()
+        with db:
+            db.execute("""CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                expires REAL NOT NULL,
+                accessed REAL NOT NULL)""")
+            db.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+            db.execute("""CREATE TABLE IF NOT EXISTS aliases (
+                alias TEXT PRIMARY KEY,
+                file_checksum TEXT NOT NULL,
+                expires REAL NOT NULL)""")
+
+    def get_database(self):
+        """Return the SQLite connection of the current thread (SQLite connections can't be shared between threads)."""
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self.local.db = db
+        return db
+
+    def key(self, file_checksum, schema_checksum):
+        return hashlib.sha256(json.dumps([RESULT_CACHE_FORMAT, __version__, schema_checksum, file_checksum]).encode()).hexdigest()
+
+    def get(self, file_checksum, schema_checksum):
+        """ Return the stored result of the file (dictionary), or None. """
+        key = self.key(file_checksum, schema_checksum)
+        now = time.time()
+        db = self.get_database()
+        try:
+            entry = db.execute("SELECT result FROM results WHERE key = ? AND expires > ?", (key, now)).fetchone()
+            if entry:
+                with db:
+                    db.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            # The cache is only an optimisation: the file is validated if it can't be read
+            logger.error(f'Result cache error: {e}')
+            return None
+        return json.loads(entry[0]) if entry else None
+
+    def get_by_alias(self, alias, schema_checksum):
+        """ Return the stored result of the file with the given alias, or None. """
+        try:
+            entry = self.get_database().execute("SELECT file_checksum FROM aliases WHERE alias = ? AND expires > ?", (alias, time.time())).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f'Result cache error: {e}')
+            return None
+        return self.get(entry[0], schema_checksum) if entry else None
+
+    def put(self, file_checksum, schema_checksum, result, alias=None):
+        """ Store the result (dictionary, JSON serialisable) of the file, with its optional alias. """
+        now = time.time()
+        db = self.get_database()
+        try:
+            with db:
+                db.execute("INSERT OR REPLACE INTO results (key, result, expires, accessed) VALUES (?, ?, ?, ?)",
+                           (self.key(file_checksum, schema_checksum), json.dumps(result), now + self.ttl, now))
+                if alias:
+                    db.execute("INSERT OR REPLACE INTO aliases (alias, file_checksum, expires) VALUES (?, ?, ?)", (alias, file_checksum, now + self.ttl))
+        except sqlite3.Error as e:
+            logger.error(f'Result cache error: {e}')
+            return
+        with self.lock:
+            self.writes += 1
+            evict = self.writes % self.eviction_interval == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Delete the expired entries, then the least recently used results above the maximum size of the cache."""
+        db = self.get_database()
+        try:
+            with db:
+                now = time.time()
+                db.execute("DELETE FROM results WHERE expires <= ?", (now,))
+                db.execute("DELETE FROM aliases WHERE expires <= ?", (now,))
+                extra = db.execute("SELECT COUNT(*) FROM results").fetchone()[0] - self.max_entries
+                if extra > 0:
+                    db.execute("DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY accessed LIMIT ?)", (extra,))
+        except sqlite3.Error as e:
+            logger.error(f'Result cache error: {e}')
+
+
+def result_cache_path():
+    """
+    Path of the result cache database (can be changed with the environment variable PGS_RESULT_CACHE).
+    Return None if the cache is disabled (PGS_RESULT_CACHE set to an empty value).
+    """
+    path = os.environ.get('PGS_RESULT_CACHE', os.path.join(schema_cache_dir(), 'result_cache.sqlite'))
+    return path or None
+
+
+def open_result_cache():
+    """
+    Open the result cache database (see result_cache_path).
+    Return None if the cache is disabled or if its database can't be opened (e.g. unwritable directory, corrupted file).
+    """
+    path = result_cache_path()
+    if not path:
+        return None
+    try:
+        return ResultCache(path)
+    except (sqlite3.Error, OSError) as e:
+        # The cache is only an optimisation, the files can still be validated without it
+        logger.warning(f'Can\'t open the result cache "{path}", the validation results are not cached: {e}')
+        return None
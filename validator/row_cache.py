@@ -0,0 +1,192 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from validator import __version__
+from validator.schema import schema_cache_dir
+
+logger = logging.getLogger(__name__)
+
+# Bump this number when the structure of the cached results changes (the results of the previous validator versions are also ignored)
+ROW_CACHE_FORMAT = 1
+# Time to live (in seconds) of the row results
+ROW_CACHE_TTL = 7 * 24 * 3600
+# Maximum number of row results kept in the cache (the least recently used ones are evicted first)
+ROW_CACHE_MAX_ENTRIES = 500000
+# Minimum number of rows of a spreadsheet to use the row cache (the small spreadsheets are validated faster than their results are read)
+ROW_CACHE_MIN_ROWS = 50
+
+
+class RowCache():
+    """
+    Persistent SQLite cache of the validation results of the spreadsheet rows (incremental validation).
+    A row result is indexed by the fingerprint of the row content, of the spreadsheet header and of the template schema,
+    so the unchanged rows of a workbook uploaded again are not validated again, even if they moved.
+    Only the checks depending on the row alone are cached: the cross-spreadsheet checks are run at each validation.
+    """
+
+    # Number of writes between two evictions
+    eviction_interval = 20
+
+    def __init__(self, path, ttl=ROW_CACHE_TTL, max_entries=ROW_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.init_database()
+
+    def init_database(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = self.get_database()
+        with db:
+            db.execute("""CREATE TABLE IF NOT EXISTS rows (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                expires REAL NOT NULL,
+                accessed REAL NOT NULL)""")
+            db.execute("CREATE INDEX IF NOT EXISTS rows_accessed ON rows (accessed)")
+
+    def get_database(self):
+        """Return the SQLite connection of the current thread (SQLite connections can't be shared between threads)."""
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self.local.db = db
+        return db
+
+    def spreadsheet(self, schema_checksum, spreadsheet_name, header):
+        """ Return the cache of the rows of a spreadsheet (see SpreadsheetRowCache). """
+        return SpreadsheetRowCache(self, schema_checksum, spreadsheet_name, header)
+
+    def get(self, key):
+        """ Return the cached result of a row, or None. """
+        try:
+            entry = self.get_database().execute("SELECT result FROM rows WHERE key = ? AND expires > ?", (key, time.time())).fetchone()
+        except sqlite3.Error as e:
+            # The cache is only an optimisation: the row is validated if it can't be read
+            logger.error(f'Row cache error: {e}')
+            return None
+        return json.loads(entry[0]) if entry else None
+
+    def touch(self, keys):
+        """ Update the access time of the given keys (used results). """
+        if not keys:
+            return
+        now = time.time()
+        db = self.get_database()
+        try:
+            with db:
+                db.executemany("UPDATE rows SET accessed = ? WHERE key = ?", [ (now, key) for key in keys ])
+        except sqlite3.Error as e:
+            logger.error(f'Row cache error: {e}')
+
+    def put_many(self, results):
+        """ Store the results of the rows: {key: result}. """
+        if not results:
+            return
+        now = time.time()
+        db = self.get_database()
+        try:
+            with db:
+                db.executemany("INSERT OR REPLACE INTO rows (key, result, expires, accessed) VALUES (?, ?, ?, ?)",
+                               [ (key, json.dumps(result, default=str), now + self.ttl, now) for key, result in results.items() ])
+        except sqlite3.Error as e:
+            logger.error(f'Row cache error: {e}')
+            return
+        with self.lock:
+            self.writes += 1
+            evict = self.writes % self.eviction_interval == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Delete the expired entries, then the least recently used ones above the maximum size of the cache."""
+        db = self.get_database()
+        try:
+            with db:
+                db.execute("DELETE FROM rows WHERE expires <= ?", (time.time(),))
+                extra = db.execute("SELECT COUNT(*) FROM rows").fetchone()[0] - self.max_entries
+                if extra > 0:
+                    db.execute("DELETE FROM rows WHERE key IN (SELECT key FROM rows ORDER BY accessed LIMIT ?)", (extra,))
+        except sqlite3.Error as e:
+            logger.error(f'Row cache error: {e}')
+
+
+class SpreadsheetRowCache():
+    """
+    Row results of a spreadsheet, for one validation.
+    The results of the validated rows and the access times of the used results are written at the end of the spreadsheet (store).
+    """
+
+    def __init__(self, cache, schema_checksum, spreadsheet_name, header):
+        self.cache = cache
+        self.context = json.dumps([ROW_CACHE_FORMAT, __version__, schema_checksum, spreadsheet_name, sorted(header.items())], default=str)
+        self.used_keys = set()
+        self.new_results = {}
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, row):
+        """ Fingerprint of a row, in the context of its spreadsheet. """
+        content = json.dumps([ value if value is None or isinstance(value, (str, int, float)) else str(value) for value in row ])
+        return hashlib.sha256(f'{self.context}\n{content}'.encode()).hexdigest()
+
+    def get(self, key):
+        """ Return the cached result of a row, or None. """
+        result = self.cache.get(key)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.used_keys.add(key)
+        return result
+
+    def add(self, key, result):
+        """ Add the result of a validated row (stored with the store method). """
+        self.new_results[key] = result
+
+    def store(self):
+        self.cache.put_many(self.new_results)
+        self.cache.touch(self.used_keys - set(self.new_results))
+        self.new_results = {}
+        self.used_keys = set()
+
+
+def row_cache_path():
+    """
+    Path of the row cache database (can be changed with the environment variable PGS_ROW_CACHE).
+    Return None if the cache is disabled (PGS_ROW_CACHE set to an empty value).
+    """
+    path = os.environ.get('PGS_ROW_CACHE', os.path.join(schema_cache_dir(), 'row_cache.sqlite'))
+    return path or None
+
+
+def has_formula(row):
+    """ True if a cell of the row contains a formula (its value depends on other cells, so the row result can't be cached). """
+    return any(isinstance(value, str) and value.startswith('=') for value in row)
+
+
+def open_row_cache():
+    """
+    Open the row cache database (see row_cache_path).
+    Return None if the cache is disabled or if its database can't be opened (e.g. unwritable directory, corrupted file).
+    """
+    path = row_cache_path()
+    if not path:
+        return None
+    try:
+        return RowCache(path)
+    except (sqlite3.Error, OSError) as e:
+        # The cache is only an optimisation, the validation can carry on without it
+        logger.warning(f'Can\'t open the row cache "{path}", the rows are validated without cache: {e}')
+        return None
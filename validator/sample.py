@@ -1,10 +1,11 @@
 from validator.generic import GenericValidator
+from validator.columns import ColumnBatch
 import logging
 
 class Sample():
 
-    def check_data(self, fields_infos, mandatory_fields):
-        validator = SampleValidator(self, fields_infos, mandatory_fields)
+    def check_data(self, fields_infos, mandatory_fields, plan=None):
+        validator = SampleValidator(self, fields_infos, mandatory_fields, plan=plan)
         validator.check_not_null()
         validator.check_format()
         validator.check_sample_numbers()
@@ -13,55 +14,88 @@ class Sample():
 
 class SampleValidator(GenericValidator):
 
-    def __init__(self, object, fields_infos, mandatory_fields, type="Sample"):
-        super().__init__(object, fields_infos, mandatory_fields, type)
+    def __init__(self, object, fields_infos, mandatory_fields, type="Sample", plan=None):
+        super().__init__(object, fields_infos, mandatory_fields, type, plan)
 
 
     def check_sample_numbers(self):
+        object_attrs = self.object.__dict__
+        errors, warnings = check_sample_numbers(
+            object_attrs.get('sample_number'),
+            object_attrs.get('sample_cases'),
+            object_attrs.get('sample_controls'),
+            object_attrs.get('sample_percent_male')
+        )
+        for msg in errors:
+            self.add_error_report(msg)
+        for msg in warnings:
+            self.add_warning_report(msg)
 
-        sample_total = None
-        if hasattr(self.object, 'sample_number'):
-            sample_total = self.object.sample_number
 
-        sample_cases = None
-        if hasattr(self.object, 'sample_cases'):
-            sample_cases = self.object.sample_cases
+class SampleColumns(ColumnBatch):
+    """ Samples of a spreadsheet, validated column by column (see ColumnBatch). """
 
-        sample_controls = None
-        if hasattr(self.object, 'sample_controls'):
-            sample_controls = self.object.sample_controls
+    type = 'Sample'
 
-        sample_percent_male = None
-        if hasattr(self.object, 'sample_percent_male'):
-            sample_percent_male = self.object.sample_percent_male
+    def check_extra(self, add_error, add_warning):
+        """ Check the sample numbers: the rows passing the bulk checks are skipped, the other ones get the detailed checks. """
+        totals = self.column('sample_number', None)
+        cases = self.column('sample_cases', None)
+        controls = self.column('sample_controls', None)
+        percents = self.column('sample_percent_male', None)
+        failing_indexes = [
+            index for index, (total, nb_cases, nb_controls, percent) in enumerate(zip(totals, cases, controls, percents))
+            if total and not (
+                type(total) is int and
+                (not nb_cases or (type(nb_cases) is int and nb_cases <= total)) and
+                (not nb_controls or (type(nb_controls) is int and nb_controls <= total)) and
+                (not (nb_cases and nb_controls) or nb_cases + nb_controls <= total) and
+                (not isinstance(percent, (int, float)) or 1 <= percent <= 100)
+            )
+        ]
+        for index in failing_indexes:
+            errors, warnings = check_sample_numbers(totals[index], cases[index], controls[index], percents[index])
+            for msg in errors:
+                add_error(index, msg)
+            for msg in warnings:
+                add_warning(index, msg)
 
-        if sample_total:
-            try:
-                sample_total = int(sample_total)
-                if sample_total == 0:
-                    self.add_error_report("The total number of Samples is equals to 0. The minimum value should be 1.")
-                if sample_cases:
-                    sample_cases = int(sample_cases)
-                    if sample_cases == 0:
-                        self.add_error_report("The number of Samples cases is equals to 0. The minimum value should be 1.")
-                    if sample_cases > sample_total:
-                        self.add_error_report(f'The number of Samples cases ({sample_cases}) is greater than the total number of Samples ({sample_total})')
-                if sample_controls:
-                    sample_controls = int(sample_controls)
-                    if sample_controls > sample_total:
-                        self.add_error_report(f'The number of Samples controls ({sample_controls}) is greater than the total number of Samples ({sample_total})')
-                if sample_cases and sample_controls:
-                    combined_samples = sample_cases + sample_controls
-                    if combined_samples > sample_total:
-                        self.add_error_report(f'The combined numbers of Samples cases and controls ({sample_cases} + {sample_controls} = {combined_samples}) is greater than the total number of Samples ({sample_total})')
-                if sample_percent_male and (isinstance(sample_percent_male, int) or isinstance(sample_percent_male, float)):
-                    sample_percent_male = float(sample_percent_male)
-                    if sample_percent_male < 0 or sample_percent_male > 100:
-                        self.add_error_report(f'The percentage should be between 0 and 100.')
-                    if 0 < sample_percent_male < 1:
-                        self.add_warning_report(f'The percentage should be between 0 and 100. Make sure that the value is supposed to be ###% and not ###*100%.')
-            except ValueError as e:
-                # May happen if value of wrong type (eg: int(not_an_integer)). This type of error is already reported in GenericValidator.check_format().
-                # Here we are just preventing the script to crash and allowing it to continue the validation.
-                logger = logging.getLogger(__name__)
-                logger.error(str(e))
+
+def check_sample_numbers(sample_total, sample_cases, sample_controls, sample_percent_male):
+    """
+    Check the consistency of the sample numbers (total, cases, controls and percentage of male participants).
+    > Return: list of error messages and list of warning messages
+    """
+    errors = []
+    warnings = []
+    if sample_total:
+        try:
+            sample_total = int(sample_total)
+            if sample_total == 0:
+                errors.append("The total number of Samples is equals to 0. The minimum value should be 1.")
+            if sample_cases:
+                sample_cases = int(sample_cases)
+                if sample_cases == 0:
+                    errors.append("The number of Samples cases is equals to 0. The minimum value should be 1.")
+                if sample_cases > sample_total:
+                    errors.append(f'The number of Samples cases ({sample_cases}) is greater than the total number of Samples ({sample_total})')
+            if sample_controls:
+                sample_controls = int(sample_controls)
+                if sample_controls > sample_total:
+                    errors.append(f'The number of Samples controls ({sample_controls}) is greater than the total number of Samples ({sample_total})')
+            if sample_cases and sample_controls:
+                combined_samples = sample_cases + sample_controls
+                if combined_samples > sample_total:
+                    errors.append(f'The combined numbers of Samples cases and controls ({sample_cases} + {sample_controls} = {combined_samples}) is greater than the total number of Samples ({sample_total})')
+            if sample_percent_male and (isinstance(sample_percent_male, int) or isinstance(sample_percent_male, float)):
+                sample_percent_male = float(sample_percent_male)
+                if sample_percent_male < 0 or sample_percent_male > 100:
+                    errors.append(f'The percentage should be between 0 and 100.')
+                if 0 < sample_percent_male < 1:
+                    warnings.append(f'The percentage should be between 0 and 100. Make sure that the value is supposed to be ###% and not ###*100%.')
+        except ValueError as e:
+            # May happen if value of wrong type (eg: int(not_an_integer)). This type of error is already reported in GenericValidator.check_format().
+            # Here we are just preventing the script to crash and allowing it to continue the validation.
+            logger = logging.getLogger(__name__)
+            logger.error(str(e))
+    return errors, warnings
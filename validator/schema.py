@@ -0,0 +1,202 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from types import MappingProxyType
+
+from validator.generic import CheckPlan
+from validator.publication import extend_fields
+
+logger = logging.getLogger(__name__)
+
+template_columns_schema_file = os.path.join(os.path.dirname(__file__), '../templates/TemplateColumns2Models.xlsx')
+
+# Bump this number when the structure of the serialized schema changes
+schema_cache_format = 1
+
+# Process-wide compiled schemas, indexed by template file path
+_loaded_schemas = {}
+_loaded_schemas_lock = threading.Lock()
+
+
+class TemplateSchema():
+    """
+    Compiled and immutable version of the template2model schema (TemplateColumns2Models.xlsx).
+    The same instance is shared by all the validators of the process, so none of its content can be modified.
+    The checks of the fields of each spreadsheet (check_plans, see validator.generic.CheckPlan) are compiled with the schema.
+    """
+
+    __slots__ = ('table_mapschema', 'fields_infos', 'mandatory_fields', 'spreadsheet_names', 'checksum', 'check_plans')
+
+    def __init__(self, table_mapschema, fields_infos, mandatory_fields, spreadsheet_names, checksum):
+        object.__setattr__(self, 'table_mapschema', freeze(table_mapschema))
+        object.__setattr__(self, 'fields_infos', freeze(fields_infos))
+        object.__setattr__(self, 'mandatory_fields', freeze(mandatory_fields))
+        object.__setattr__(self, 'spreadsheet_names', freeze(spreadsheet_names))
+        object.__setattr__(self, 'checksum', checksum)
+        check_plans = {}
+        for spreadsheet_name, spreadsheet_fields_infos in self.fields_infos.items():
+            spreadsheet_mandatory_fields = self.mandatory_fields.get(spreadsheet_name, ())
+            # The publications are also checked on the fields fetched from EuropePMC
+            if spreadsheet_name == self.spreadsheet_names.get('Publication'):
+                spreadsheet_fields_infos, spreadsheet_mandatory_fields = extend_fields(spreadsheet_fields_infos, spreadsheet_mandatory_fields)
+            check_plans[spreadsheet_name] = CheckPlan(spreadsheet_fields_infos, spreadsheet_mandatory_fields)
+        object.__setattr__(self, 'check_plans', MappingProxyType(check_plans))
+
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{self.__class__.__name__} is immutable')
+
+
+    @classmethod
+    def from_workbook(cls, filepath, checksum):
+        """ Parse the template2model schema file. The collected data will be used for the validations. """
+        from openpyxl import load_workbook
+        table_mapschema = {}
+        fields_infos = {}
+        mandatory_fields = {}
+        spreadsheet_names = {}
+
+        schema_workbook = load_workbook(filepath)
+        curation_sheet = schema_workbook["Curation"]
+        rows = curation_sheet.iter_rows(values_only=True)
+        header = next(rows)
+        schema_columns = { col_name: idx for idx, col_name in enumerate(header) if col_name }
+        for row_cell in rows:
+            sheet_name = row_cell[0]
+            column_name = row_cell[schema_columns['Column']]
+            model_name = row_cell[schema_columns['Model']]
+            field_name = row_cell[schema_columns['Field']]
+            type_name = row_cell[schema_columns['Type']]
+            mandatory_name = row_cell[schema_columns['Mandatory']]
+
+            if field_name:
+                if not sheet_name in table_mapschema:
+                    table_mapschema[sheet_name] = {}
+                table_mapschema[sheet_name][column_name] = field_name
+                if type_name:
+                    if not sheet_name in fields_infos:
+                        fields_infos[sheet_name] = {}
+                    column_label = trim_column_label(column_name)
+                    fields_infos[sheet_name][field_name] = { 'type': type_name, 'label': column_label }
+                if mandatory_name == 'Y':
+                    if not sheet_name in mandatory_fields:
+                        mandatory_fields[sheet_name] = []
+                    mandatory_fields[sheet_name].append(field_name)
+
+            if not model_name in spreadsheet_names and model_name is not None:
+                spreadsheet_names[model_name] = sheet_name
+
+        return cls(table_mapschema, fields_infos, mandatory_fields, spreadsheet_names, checksum)
+
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['table_mapschema'], data['fields_infos'], data['mandatory_fields'], data['spreadsheet_names'], data['checksum'])
+
+
+    def to_dict(self):
+        return {
+            'table_mapschema': thaw(self.table_mapschema),
+            'fields_infos': thaw(self.fields_infos),
+            'mandatory_fields': thaw(self.mandatory_fields),
+            'spreadsheet_names': thaw(self.spreadsheet_names),
+            'checksum': self.checksum
+        }
+
+
+def get_template_schema(filepath=template_columns_schema_file):
+    """
+    Return the compiled schema of the given template file.
+    The schema is built once per process (and per version of the file) and then shared by all the validators.
+    On a cold start, the serialized schema cached on disk is used if the template file hasn't changed, so openpyxl is not needed.
+    """
+    filepath = os.path.abspath(filepath)
+    file_stat = os.stat(filepath)
+    file_version = (file_stat.st_mtime_ns, file_stat.st_size)
+    with _loaded_schemas_lock:
+        loaded = _loaded_schemas.get(filepath)
+        if loaded and loaded[0] == file_version:
+            return loaded[1]
+        schema = load_template_schema(filepath)
+        _loaded_schemas[filepath] = (file_version, schema)
+        return schema
+
+
+def load_template_schema(filepath):
+    """ Load the schema from the on-disk cache if possible, otherwise parse the template file and cache the result. """
+    checksum = file_checksum(filepath)
+    cache_file = os.path.join(schema_cache_dir(), f'template_schema_{checksum}.json')
+    try:
+        with open(cache_file) as cache:
+            data = json.load(cache)
+        if data.get('format') == schema_cache_format and data['schema']['checksum'] == checksum:
+            return TemplateSchema.from_dict(data['schema'])
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning(f'Ignoring the unreadable template schema cache "{cache_file}": {e}')
+
+    schema = TemplateSchema.from_workbook(filepath, checksum)
+    write_schema_cache(cache_file, schema)
+    return schema
+
+
+def write_schema_cache(cache_file, schema):
+    """ Serialize the schema on disk. The file is written atomically so concurrent processes never read a partial file. """
+    try:
+        cache_dir = os.path.dirname(cache_file)
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_file = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as tmp:
+                json.dump({'format': schema_cache_format, 'schema': schema.to_dict()}, tmp)
+            os.replace(tmp_file, cache_file)
+        except BaseException:
+            os.remove(tmp_file)
+            raise
+    except OSError as e:
+        # The cache is only an optimisation, the validation can carry on without it
+        logger.warning(f'Can\'t write the template schema cache "{cache_file}": {e}')
+
+
+def schema_cache_dir():
+    """ Directory of the on-disk caches (can be changed with the environment variable PGS_VALIDATOR_CACHE_DIR). """
+    return os.environ.get('PGS_VALIDATOR_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'pgs_template_validator'))
+
+
+def file_checksum(filepath):
+    """ SHA-256 checksum of a file. """
+    sha256 = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def freeze(data):
+    """ Recursively convert dictionaries and lists into read-only mappings and tuples. """
+    if isinstance(data, dict):
+        return MappingProxyType({ key: freeze(value) for key, value in data.items() })
+    if isinstance(data, (list, tuple)):
+        return tuple(freeze(value) for value in data)
+    return data
+
+
+def thaw(data):
+    """ Reverse of freeze(): convert read-only mappings and tuples into dictionaries and lists. """
+    if isinstance(data, (dict, MappingProxyType)):
+        return { key: thaw(value) for key, value in data.items() }
+    if isinstance(data, tuple):
+        return [ thaw(value) for value in data ]
+    return data
+
+
+def trim_column_label(label):
+    """ Shorten the column labels in the report if it is too long. """
+    column_label = label.split('\n')[0].strip(' \t')
+    if len(column_label) > 40:
+        column_label = column_label[:40]+'...'
+    return column_label
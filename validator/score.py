@@ -5,8 +5,8 @@ class Score():
 
     genomebuilds = ['GRCh37','GRCh38','hg18','hg19','hg38','NCBI35','NCBI36']
 
-    def check_data(self, fields_infos, mandatory_fields):
-        validator = ScoreValidator(self, fields_infos, mandatory_fields)
+    def check_data(self, fields_infos, mandatory_fields, plan=None):
+        validator = ScoreValidator(self, fields_infos, mandatory_fields, plan=plan)
         validator.check_not_null()
         validator.check_format()
         validator.check_value('variants_genomebuild', self.genomebuilds)
@@ -15,5 +15,5 @@ class Score():
 
 class ScoreValidator(GenericValidator):
 
-    def __init__(self, object, fields_types, mandatory_fields, type="Score"):
-        super().__init__(object, fields_types, mandatory_fields, type)
+    def __init__(self, object, fields_types, mandatory_fields, type="Score", plan=None):
+        super().__init__(object, fields_types, mandatory_fields, type, plan)
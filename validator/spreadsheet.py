@@ -0,0 +1,95 @@
+from openpyxl.utils.cell import column_index_from_string, coordinate_from_string
+
+from validator.profiler import null_profiler
+
+
+class RowSource():
+    """
+    Sequential, values only, access to the rows of a spreadsheet.
+    The rows are streamed from the worksheet, which can be loaded in read-only mode (openpyxl), so a spreadsheet is never fully materialised in memory.
+    Random access to the cells (only needed to calculate the formulas) is done through a compact index built on the first request.
+    """
+
+    def __init__(self, worksheet, profiler=null_profiler):
+        self.worksheet = worksheet
+        self.profiler = profiler
+        self.title = worksheet.title
+        # Rows are padded to this width, as the read-only worksheets skip the empty trailing cells when the dimensions are unknown
+        self.width = worksheet.max_column or 0
+        self.cell_index = None
+        # Created on the first formula to calculate (see validator.formula.get_formula_evaluator)
+        self.formula_evaluator = None
+
+
+    def iter_rows(self, min_row=1, max_row=None, values_only=True):
+        """ Iterate over the values of the rows of the spreadsheet (tuples padded to the known spreadsheet width). """
+        width = self.width
+        rows_count = 0
+        try:
+            for row in self.worksheet.iter_rows(min_row=min_row, max_row=max_row, values_only=True):
+                if len(row) < width:
+                    row = row + (None,) * (width - len(row))
+                rows_count += 1
+                yield row
+        finally:
+            if self.profiler.enabled:
+                self.profiler.count(f'rows_read.{self.title}', rows_count)
+
+
+    def column_names(self, row_index=1):
+        """ Get the column names and their indexes from the spreadsheet header (see get_column_name_index). """
+        col_names = get_column_name_index(self, row_index)
+        if col_names:
+            self.width = max(self.width, max(col_names.values()) + 1)
+        return col_names
+
+
+    def get_cell_value(self, cell_id):
+        """ Get the value of a cell from its ID (e.g. B2). """
+        column_letter, row_id = coordinate_from_string(cell_id)
+        return self.get_value(row_id, column_index_from_string(column_letter))
+
+
+    def get_value(self, row_id, col_id):
+        """ Get the value of a cell from its row and column numbers (1-based). """
+        if self.cell_index is None:
+            with self.profiler.timer(f'cell_index.{self.title}'):
+                self.cell_index = CellIndex(self.worksheet)
+        return self.cell_index.get(row_id, col_id)
+
+
+class CellIndex():
+    """ Compact random access index of the cell values of a spreadsheet, built in a single pass over the rows. """
+
+    def __init__(self, worksheet):
+        # Only the non empty rows are stored, without their trailing empty cells
+        self.rows = {}
+        for row_id, row in enumerate(worksheet.iter_rows(values_only=True), start=1):
+            last_col = len(row)
+            while last_col > 0 and row[last_col-1] is None:
+                last_col -= 1
+            if last_col:
+                self.rows[row_id] = row[:last_col]
+
+
+    def get(self, row_id, col_id):
+        """ Get a cell value from its row and column numbers (1-based). """
+        row = self.rows.get(row_id)
+        if row and col_id <= len(row):
+            return row[col_id-1]
+        return None
+
+
+def get_column_name_index(worksheet, row_index=1):
+    """ Get the list of column names and theirs indexes from a spreadsheet header.
+        This is tricky sometimes as the header is spread on 2 rows for some of them. """
+    col_names = {}
+    col_indexes = {}
+    for row in worksheet.iter_rows(min_row=1, max_row=row_index, values_only=True):
+        for index, col_name in enumerate(row): # 0 Based arrays in the python code
+            if col_name:
+                col_indexes[index] = col_name
+    for idx in col_indexes:
+        col_name = col_indexes[idx]
+        col_names[col_name] = idx
+    return col_names
@@ -0,0 +1,190 @@
+import hashlib
+import os
+import tempfile
+import threading
+from io import BytesIO
+
+# Maximum size (in bytes) of a downloaded file (can be changed with the environment variable PGS_MAX_FILE_SIZE)
+MAX_FILE_SIZE = 50 * 1024 * 1024
+# Size (in bytes) above which a downloaded file is written to a temporary file on disk instead of being kept in memory
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+# Size (in bytes) of the chunks read from the storage
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class FileTooLarge(Exception):
+    """ File larger than the maximum size of the downloaded files. """
+
+    def __init__(self, size, max_size):
+        super().__init__(f'The file is too large ({format_size(size)}, maximum: {format_size(max_size)})')
+        self.size = size
+        self.max_size = max_size
+
+
+class StoredFile():
+    """ Metadata of a file of the storage: name, size (in bytes) and MD5 checksum of the content (if provided by the storage). """
+
+    def __init__(self, name, size=None, md5_hash=None, handle=None):
+        self.name = name
+        self.size = size
+        self.md5_hash = md5_hash
+        # Object of the storage library (e.g. GCS blob)
+        self.handle = handle
+
+
+class DownloadedFile():
+    """
+    Content of a downloaded file: seekable binary file, in memory or in a temporary file on disk for the large files,
+    with its size and SHA-256 checksum (computed during the download).
+    The file must stay open as long as it is read (e.g. read-only workbooks), then closed with close().
+    """
+
+    def __init__(self, file, size, sha256):
+        self.file = file
+        self.size = size
+        self.sha256 = sha256
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Storage():
+    """
+    Storage of the uploaded files (base class).
+    The subclasses implement get_file (metadata, without downloading the content) and open (binary stream of the content).
+    """
+
+    name = None
+
+    def get_file(self, name):
+        """ Return the metadata of the file (StoredFile), or None if it doesn't exist. """
+        raise NotImplementedError
+
+    def open(self, stored_file):
+        """ Open the content of the file as a binary stream. """
+        raise NotImplementedError
+
+    def download(self, stored_file, max_size=None, spool_max_memory=SPOOL_MAX_MEMORY):
+        """
+        Download the file by chunks into a seekable file (see DownloadedFile), kept in memory up to spool_max_memory bytes.
+        > Raise: FileTooLarge if the file is larger than max_size (default: see max_file_size), checked before and during the download
+        """
+        if max_size is None:
+            max_size = max_file_size()
+        if stored_file.size is not None and stored_file.size > max_size:
+            raise FileTooLarge(stored_file.size, max_size)
+        sha256 = hashlib.sha256()
+        file = BytesIO()
+        size = 0
+        try:
+            with self.open(stored_file) as stream:
+                for chunk in iter(lambda: stream.read(DOWNLOAD_CHUNK_SIZE), b''):
+                    size += len(chunk)
+                    if size > max_size:
+                        raise FileTooLarge(size, max_size)
+                    sha256.update(chunk)
+                    if isinstance(file, BytesIO) and size > spool_max_memory:
+                        # Moved to disk: the content is not kept twice in memory
+                        disk_file = tempfile.TemporaryFile()
+                        disk_file.write(file.getbuffer())
+                        file.close()
+                        file = disk_file
+                    file.write(chunk)
+            file.seek(0)
+        except Exception:
+            file.close()
+            raise
+        return DownloadedFile(file, size, sha256.hexdigest())
+
+
+class GCSStorage(Storage):
+    """
+    Google Cloud Storage bucket. The client and the bucket handle are created on the first request (authentication)
+    and then shared by all the downloads of the process.
+    """
+
+    name = 'gcs'
+
+    def __init__(self, service_account_settings=None, bucket_name=None):
+        self.service_account_settings = service_account_settings
+        self.bucket_name = bucket_name
+        self.bucket = None
+        self.lock = threading.Lock()
+
+    def get_bucket(self):
+        if self.bucket is None:
+            with self.lock:
+                if self.bucket is None:
+                    from google.cloud import storage
+                    service_account_settings = self.service_account_settings or os.environ['GS_SERVICE_ACCOUNT_SETTINGS']
+                    client = storage.Client.from_service_account_json(service_account_settings)
+                    # Handle of the bucket, without request (the files are requested with get_blob)
+                    self.bucket = client.bucket(self.bucket_name or os.environ['GS_BUCKET_NAME'])
+        return self.bucket
+
+    def get_file(self, name):
+        blob = self.get_bucket().get_blob(name)
+        if blob is None:
+            return None
+        return StoredFile(name, blob.size, blob.md5_hash, handle=blob)
+
+    def open(self, stored_file):
+        return stored_file.handle.open('rb', chunk_size=DOWNLOAD_CHUNK_SIZE)
+
+
+class LocalStorage(Storage):
+    """ Directory standing in for the Google Cloud Storage bucket (e.g. tests, benchmarks, local deployment). """
+
+    name = 'local'
+
+    def __init__(self, directory):
+        self.directory = os.path.realpath(directory)
+
+    def path(self, name):
+        path = os.path.realpath(os.path.join(self.directory, name))
+        # The files outside of the directory are not accessible
+        if os.path.commonpath([self.directory, path]) != self.directory:
+            return None
+        return path
+
+    def get_file(self, name):
+        path = self.path(name)
+        if not path or not os.path.isfile(path):
+            return None
+        return StoredFile(name, os.path.getsize(path), handle=path)
+
+    def open(self, stored_file):
+        return open(stored_file.handle, 'rb')
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """
+    Return the storage of the uploaded files shared by the process (created on the first request):
+    local directory if the environment variable PGS_STORAGE_DIR is set, otherwise the Google Cloud Storage bucket.
+    """
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                storage_dir = os.environ.get('PGS_STORAGE_DIR')
+                _storage = LocalStorage(storage_dir) if storage_dir else GCSStorage()
+    return _storage
+
+
+def max_file_size():
+    """ Maximum size (in bytes) of the downloaded files (can be changed with the environment variable PGS_MAX_FILE_SIZE). """
+    return int(os.environ.get('PGS_MAX_FILE_SIZE', MAX_FILE_SIZE))
+
+
+def format_size(size):
+    return f'{size / (1024 * 1024):.1f} MB'